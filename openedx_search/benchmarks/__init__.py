@@ -0,0 +1,5 @@
+"""
+Benchmarks of the token endpoint and of index loads against a local Meilisearch stand-in.
+
+Run them with ``python -m openedx_search.benchmarks --output results.json``.
+"""
@@ -0,0 +1,7 @@
+"""
+Entry point of ``python -m openedx_search.benchmarks``.
+"""
+
+from .runner import main
+
+main()
@@ -0,0 +1,333 @@
+"""
+Benchmark runner writing machine-readable results.
+
+It measures, against the local Meilisearch stand-in:
+
+* ``/token/`` latency percentiles and database queries per request on the cache hit path
+  and on the miss path (no cached token, stored token nor engine key for the user),
+* ``load_indexes`` documents per second and peak RSS for every dataset size and batch size,
+  each load running in a forked process so its memory peak is its own.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+import django
+from django.conf import settings
+from django.test.utils import override_settings
+
+from openedx_search_api.testing import FakeMeilisearch
+
+DEFAULT_SETTINGS_MODULE = 'openedx_search.settings.benchmark'
+BENCHMARK_INDEX = 'benchmark_users'
+USERNAME_PREFIX = 'benchmark-user-'
+
+
+def percentile(values, pct):
+    """
+    Returns the ``pct`` percentile of values with linear interpolation.
+
+    :param values: List of numbers.
+    :param pct: Percentile between 0 and 100.
+    :return: Number, None for an empty list.
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def summarize(latencies, queries):
+    """
+    Returns latency percentiles in milliseconds and queries per request of a series.
+
+    :param latencies: Seconds taken by every request.
+    :param queries: Number of database queries of every request.
+    :return: Dict of metrics.
+    """
+    milliseconds = [latency * 1000 for latency in latencies]
+    return {
+        'requests': len(latencies),
+        'p50_ms': round(percentile(milliseconds, 50), 3),
+        'p99_ms': round(percentile(milliseconds, 99), 3),
+        'mean_ms': round(sum(milliseconds) / len(milliseconds), 3),
+        'queries_per_request': round(sum(queries) / len(queries), 2),
+    }
+
+
+def peak_rss_mb():
+    """
+    Returns peak resident set size of the current process in MiB
+    :return:
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 2)
+
+
+def create_users(count):
+    """
+    Make sure the benchmark dataset holds at least ``count`` users.
+
+    :param count: Number of users.
+    """
+    from django.contrib.auth import get_user_model  # pylint: disable=import-outside-toplevel
+    user_model = get_user_model()
+    existing = user_model.objects.filter(username__startswith=USERNAME_PREFIX).count()
+    user_model.objects.bulk_create(
+        [
+            user_model(
+                username=f'{USERNAME_PREFIX}{number}', email=f'user{number}@example.com',
+                password='!'
+            )
+            for number in range(existing, count)
+        ],
+        batch_size=1000,
+    )
+    return list(user_model.objects.filter(username__startswith=USERNAME_PREFIX)[:count])
+
+
+def bench_token(requests, users):
+    """
+    Measure ``/token/`` on the cache hit and cache miss paths.
+
+    :param requests: Number of measured requests per path.
+    :param users: Number of distinct users the requests are spread over.
+    :return: Dict of the hit and miss metrics.
+    """
+    # pylint: disable=import-outside-toplevel
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import CaptureQueriesContext
+
+    from openedx_search_api.cache import token_cache
+    from openedx_search_api.models import SearchApiKeyModel, SearchEngineToken
+
+    clients = []
+    for user in create_users(users):
+        client = Client()
+        client.force_login(user)
+        clients.append((user, client))
+
+    def measure(reset):
+        latencies, queries = [], []
+        for number in range(requests):
+            user, client = clients[number % len(clients)]
+            if reset:
+                token_cache.invalidate(user.id)
+                SearchEngineToken.objects.filter(user=user).delete()
+                SearchApiKeyModel.objects.filter(user=user).delete()
+            with CaptureQueriesContext(connection) as captured:
+                started_at = time.perf_counter()
+                response = client.get('/token/')
+                latencies.append(time.perf_counter() - started_at)
+            if response.status_code != 200:
+                raise RuntimeError(f"/token/ answered {response.status_code}")
+            queries.append(len(captured))
+        return summarize(latencies, queries)
+
+    miss = measure(reset=True)
+    measure(reset=False)
+    return {'users': len(clients), 'miss': miss, 'hit': measure(reset=False)}
+
+
+def _load_in_child(connection, options):
+    # pylint: disable=import-outside-toplevel
+    from django.core import management
+    from django.db import connections
+
+    connections.close_all()
+    rss_at_start = peak_rss_mb()
+    started_at = time.perf_counter()
+    try:
+        with open(os.devnull, 'w', encoding='utf-8') as devnull:
+            management.call_command(
+                'load_indexes', index=[BENCHMARK_INDEX], wait=True, stdout=devnull, **options
+            )
+        connection.send({
+            'elapsed_s': time.perf_counter() - started_at,
+            'peak_rss_mb': peak_rss_mb(),
+            'rss_at_start_mb': rss_at_start,
+        })
+    except Exception as error:  # pylint: disable=broad-exception-caught
+        connection.send({'error': repr(error)})
+    finally:
+        connections.close_all()
+        connection.close()
+
+
+def bench_load(engine, dataset_size, batch_size, workers, upload_format):
+    """
+    Measure one ``load_indexes`` run of the benchmark index in a forked process.
+
+    :param engine: Running FakeMeilisearch.
+    :param dataset_size: Number of users loaded.
+    :param batch_size: Batch size of the index.
+    :param workers: Number of uploader threads.
+    :param upload_format: Upload format of the index.
+    :return: Dict of metrics.
+    """
+    # pylint: disable=import-outside-toplevel
+    from django.db import connections
+
+    create_users(dataset_size)
+    config = dict(settings.INDEX_CONFIGURATIONS[BENCHMARK_INDEX])
+    config.update(batch_size=batch_size, upload_format=upload_format)
+    index_configurations = {BENCHMARK_INDEX: config}
+    requests_before = engine.state.requests
+    connections.close_all()
+    context = multiprocessing.get_context('fork')
+    receiver, sender = context.Pipe(duplex=False)
+    with override_settings(INDEX_CONFIGURATIONS=index_configurations):
+        process = context.Process(target=_load_in_child, args=(sender, {
+            'workers': workers, 'filters': f'username__startswith={USERNAME_PREFIX}',
+        }))
+        process.start()
+        sender.close()
+        result = receiver.recv()
+        process.join()
+    if 'error' in result:
+        raise RuntimeError(f"load_indexes failed: {result['error']}")
+    result.update(
+        dataset_size=dataset_size, batch_size=batch_size, workers=workers,
+        upload_format=upload_format, engine_requests=engine.state.requests - requests_before,
+        docs_per_sec=round(dataset_size / result['elapsed_s'], 1),
+        elapsed_s=round(result['elapsed_s'], 4),
+    )
+    return result
+
+
+def git_commit():
+    """
+    Returns commit of the working tree, None outside of a git checkout
+    :return:
+    """
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, check=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline):
+    """
+    Returns relative change of every metric present in both result sets.
+
+    :param results: Results of this run.
+    :param baseline: Results of a previous run.
+    :return: Dict of dotted metric names to percentage changes.
+    """
+    def flatten(data, prefix=''):
+        if isinstance(data, dict):
+            for key, value in data.items():
+                yield from flatten(value, f'{prefix}{key}.')
+        elif isinstance(data, list):
+            for item in data:
+                if isinstance(item, dict) and 'dataset_size' in item:
+                    name = (
+                        f"{item['dataset_size']}x{item['batch_size']}"
+                        f"/w{item['workers']}/{item['upload_format']}"
+                    )
+                    yield from flatten(item, f'{prefix}{name}.')
+        elif isinstance(data, (int, float)) and not isinstance(data, bool):
+            yield prefix.rstrip('.'), data
+
+    previous = dict(flatten({'token': baseline.get('token'), 'load': baseline.get('load')}))
+    return {
+        name: round((value - previous[name]) * 100 / previous[name], 2)
+        for name, value in flatten({'token': results.get('token'), 'load': results.get('load')})
+        if previous.get(name)
+    }
+
+
+def parse_args(argv=None):
+    """
+    Returns parsed command line arguments
+    :param argv:
+    :return:
+    """
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('-o', '--output', help='Write the JSON results to this file')
+    parser.add_argument('--baseline', help='JSON results of a previous run to compare with')
+    parser.add_argument('--latency-ms', type=float, default=1.0,
+                        help='Latency added to every request of the stand-in')
+    parser.add_argument('--token-requests', type=int, default=200,
+                        help='Measured /token/ requests per path')
+    parser.add_argument('--token-users', type=int, default=20,
+                        help='Distinct users of the /token/ requests')
+    parser.add_argument('--dataset-sizes', type=int, nargs='+', default=[1000, 10000],
+                        help='Number of users loaded by load_indexes')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[500, 1000, 5000],
+                        help='Batch sizes of load_indexes')
+    parser.add_argument('-w', '--workers', type=int, default=1,
+                        help='Uploader threads of load_indexes')
+    parser.add_argument('--upload-format', default='json',
+                        help='Upload format of load_indexes')
+    parser.add_argument('--skip-token', action='store_true', help='Skip the /token/ benchmark')
+    parser.add_argument('--skip-load', action='store_true', help='Skip the load benchmark')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """
+    Run the benchmarks and write their results.
+
+    :param argv: Command line arguments, sys.argv by default.
+    :return: Results dict.
+    """
+    args = parse_args(argv)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', DEFAULT_SETTINGS_MODULE)
+    django.setup()
+    # pylint: disable=import-outside-toplevel
+    from django.db import connection
+    from django.test.utils import setup_test_environment, teardown_test_environment
+
+    setup_test_environment()
+    test_database = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    results = {
+        'meta': {
+            'timestamp': datetime.now(tz=timezone.utc).isoformat(),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'platform': platform.platform(),
+            'latency_ms': args.latency_ms,
+        },
+    }
+    try:
+        with FakeMeilisearch(latency=args.latency_ms / 1000) as engine, override_settings(
+                MEILISEARCH_URL=engine.url, MEILISEARCH_PUBLIC_URL=engine.url
+        ):
+            if not args.skip_token:
+                results['token'] = bench_token(args.token_requests, args.token_users)
+            if not args.skip_load:
+                results['load'] = [
+                    bench_load(engine, dataset_size, batch_size, args.workers, args.upload_format)
+                    for dataset_size in sorted(args.dataset_sizes)
+                    for batch_size in args.batch_sizes
+                ]
+    finally:
+        connection.creation.destroy_test_db(test_database, verbosity=0)
+        teardown_test_environment()
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as baseline:
+            results['changes_pct'] = compare(results, json.load(baseline))
+    payload = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output:
+            output.write(payload + '\n')
+    else:
+        sys.stdout.write(payload + '\n')
+    return results
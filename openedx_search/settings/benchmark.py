@@ -0,0 +1,32 @@
+import os
+import tempfile
+
+from .test import *
+
+
+"""
+################### Benchmarks ###################
+"""
+# The benchmark database lives in a file so forked load runs can open their own connection.
+DATABASES['default']['TEST'] = {
+    'NAME': os.path.join(tempfile.gettempdir(), 'openedx_search_benchmark.sqlite3'),
+}
+# MEILISEARCH_URL and MEILISEARCH_PUBLIC_URL are pointed at the local stand-in at runtime.
+INDEX_CONFIGURATIONS = {
+    "benchmark_users": {
+        "options": {
+            "primaryKey": "id"
+        },
+        "search_rules": [
+            "is_staff = false"
+        ],
+        "settings": {
+            "filterableAttributes": [
+                "is_staff",
+                "username"
+            ]
+        },
+        "model_class": "auth.User",
+        "fields": ["id", "username", "email", "is_staff", "date_joined"]
+    }
+}
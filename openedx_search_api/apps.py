@@ -2,6 +2,7 @@
 App configurations
 """
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class SearchConfig(AppConfig):
@@ -25,3 +26,14 @@ class SearchConfig(AppConfig):
             },
         }
     }
+
+    def ready(self):
+        """
+        Compile search rules and connect token cache invalidation and, when enabled,
+        incremental indexing signal handlers.
+        """
+        from . import signals  # pylint: disable=import-outside-toplevel
+        from .drivers.meilisearch import get_compiled_search_rules  # pylint: disable=import-outside-toplevel
+        get_compiled_search_rules()
+        if getattr(settings, 'SEARCH_INCREMENTAL_INDEXING', False):
+            signals.connect_incremental_indexing()
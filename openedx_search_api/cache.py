@@ -0,0 +1,351 @@
+"""
+Caching of issued search engine tokens in front of the database.
+"""
+
+import asyncio
+import hashlib
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import asynccontextmanager, contextmanager
+from datetime import datetime, timezone
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.redis import RedisCache
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .metrics import TOKEN_CACHE_LOOKUPS
+
+DEFAULT_LOCAL_SIZE = 10000
+DEFAULT_LOCAL_TTL = 60
+DEFAULT_EXPIRY_MARGIN = 300
+DEFAULT_LOCK_TIMEOUT = 10
+LOCK_POLL_INTERVAL = 0.05
+# Deletes the lock only while it is still held by the releasing owner.
+RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+def get_redis_client(cache, key):
+    """
+    Returns the Redis client writing a key of a Redis backed cache, None for other backends.
+
+    Both the Django Redis backend and django-redis are supported.
+
+    :param cache: Django cache backend.
+    :param key: Cache key.
+    :return: redis.Redis client or None.
+    """
+    if isinstance(cache, RedisCache):
+        return cache._cache.get_client(key, write=True)  # pylint: disable=protected-access
+    client = getattr(cache, 'client', None)
+    if hasattr(client, 'get_client'):
+        return client.get_client(write=True)
+    return None
+
+
+class TokenCache:
+    """
+    Two-tier cache of token responses keyed by user id and a hash of the search rules.
+
+    The first tier is an in-process LRU, the second one the Django cache backend shared by
+    every process. Entries expire ``SEARCH_TOKEN_CACHE_EXPIRY_MARGIN`` seconds before the
+    token itself. Invalidating a user bumps a per-user version stored in the shared cache,
+    which other processes notice once their local entry is older than
+    ``SEARCH_TOKEN_LOCAL_CACHE_TTL`` seconds.
+
+    Token generation of a user is single-flight: ``lock`` serializes concurrent requests of
+    the same user within the process and across processes, so only the first one creates an
+    engine key and signs a token while the others wait and read its result. With Redis, the
+    shared lock is released with an atomic compare-and-delete. Other backends check the owner
+    and delete in two steps, so ``SEARCH_TOKEN_LOCK_TIMEOUT`` must stay well above the time
+    a token takes to be issued, or the lock may expire and be taken over in between.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = OrderedDict()
+        self._user_locks = {}
+
+    @property
+    def cache(self):
+        """
+        Returns Django cache backend used as second tier
+        :return:
+        """
+        return caches[getattr(settings, 'SEARCH_TOKEN_CACHE_ALIAS', 'default')]
+
+    @property
+    def expiry_margin(self):
+        """
+        Returns seconds before token expiry at which cached entries expire
+        :return:
+        """
+        return getattr(settings, 'SEARCH_TOKEN_CACHE_EXPIRY_MARGIN', DEFAULT_EXPIRY_MARGIN)
+
+    @staticmethod
+    def rules_hash(search_rules):
+        """
+        Returns stable hash of search rules
+        :param search_rules:
+        :return:
+        """
+        fingerprint = getattr(search_rules, 'fingerprint', '')
+        if fingerprint:
+            return fingerprint
+        payload = json.dumps(search_rules or {}, sort_keys=True, cls=DjangoJSONEncoder)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    @staticmethod
+    def version_key(user_id):
+        """
+        Returns cache key of the user token version
+        :param user_id:
+        :return:
+        """
+        return f"openedx_search_api:token_version:{user_id}"
+
+    def token_key(self, user_id, search_rules, namespace=''):
+        """
+        Returns cache key of the user token issued for search rules
+        :param user_id:
+        :param search_rules:
+        :param namespace: Optional discriminator, e.g. the uid of the signing key
+        :return:
+        """
+        return f"openedx_search_api:token:{user_id}:{namespace}:{self.rules_hash(search_rules)}"
+
+    def _get_local(self, key):
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is None:
+                return None
+            stale_at, expires_at, response = entry
+            now = time.monotonic()
+            if now >= expires_at:
+                del self._local[key]
+                return None
+            if now >= stale_at:
+                return None
+            self._local.move_to_end(key)
+            return response
+
+    def _set_local(self, key, response, timeout):
+        now = time.monotonic()
+        local_ttl = getattr(settings, 'SEARCH_TOKEN_LOCAL_CACHE_TTL', DEFAULT_LOCAL_TTL)
+        local_size = getattr(settings, 'SEARCH_TOKEN_LOCAL_CACHE_SIZE', DEFAULT_LOCAL_SIZE)
+        with self._lock:
+            self._local[key] = (now + min(local_ttl, timeout), now + timeout, response)
+            self._local.move_to_end(key)
+            while len(self._local) > local_size:
+                self._local.popitem(last=False)
+
+    def timeout(self, expires_at):
+        """
+        Returns seconds an entry for a token expiring at expires_at may be cached
+        :param expires_at:
+        :return:
+        """
+        if isinstance(expires_at, str):
+            expires_at = datetime.fromisoformat(expires_at)
+        if expires_at.tzinfo is None:
+            expires_at = expires_at.replace(tzinfo=timezone.utc)
+        return (expires_at - datetime.now(tz=timezone.utc)).total_seconds() - self.expiry_margin
+
+    def _from_shared(self, key, version_key, values):
+        """
+        Returns response of a shared tier lookup and promotes it to the local tier
+        """
+        entry = values.get(key)
+        if entry is None or entry['version'] != values.get(version_key, 0):
+            TOKEN_CACHE_LOOKUPS.inc('miss')
+            return None
+        timeout = self.timeout(entry['response']['expires_at'])
+        if timeout <= 0:
+            TOKEN_CACHE_LOOKUPS.inc('miss')
+            return None
+        self._set_local(key, entry['response'], timeout)
+        TOKEN_CACHE_LOOKUPS.inc('shared_hit')
+        return entry['response']
+
+    def get(self, user_id, search_rules, namespace=''):
+        """
+        Returns cached token response of the user for search rules
+        :param user_id:
+        :param search_rules:
+        :param namespace:
+        :return:
+        """
+        key = self.token_key(user_id, search_rules, namespace)
+        response = self._get_local(key)
+        if response is not None:
+            TOKEN_CACHE_LOOKUPS.inc('local_hit')
+            return response
+        version_key = self.version_key(user_id)
+        return self._from_shared(key, version_key, self.cache.get_many([key, version_key]))
+
+    async def aget(self, user_id, search_rules, namespace=''):
+        """
+        Async variant of get using the async API of the cache backend
+        """
+        key = self.token_key(user_id, search_rules, namespace)
+        response = self._get_local(key)
+        if response is not None:
+            TOKEN_CACHE_LOOKUPS.inc('local_hit')
+            return response
+        version_key = self.version_key(user_id)
+        return self._from_shared(key, version_key, await self.cache.aget_many([key, version_key]))
+
+    def set(self, user_id, search_rules, response, namespace=''):
+        """
+        Cache token response of the user for search rules
+        :param user_id:
+        :param search_rules:
+        :param response:
+        :param namespace:
+        :return:
+        """
+        timeout = self.timeout(response['expires_at'])
+        if timeout <= 0:
+            return
+        key = self.token_key(user_id, search_rules, namespace)
+        version = self.cache.get(self.version_key(user_id), 0)
+        self.cache.set(key, {'version': version, 'response': response}, timeout)
+        self._set_local(key, response, timeout)
+
+    async def aset(self, user_id, search_rules, response, namespace=''):
+        """
+        Async variant of set using the async API of the cache backend
+        """
+        timeout = self.timeout(response['expires_at'])
+        if timeout <= 0:
+            return
+        key = self.token_key(user_id, search_rules, namespace)
+        version = await self.cache.aget(self.version_key(user_id), 0)
+        await self.cache.aset(key, {'version': version, 'response': response}, timeout)
+        self._set_local(key, response, timeout)
+
+    @staticmethod
+    def lock_key(user_id):
+        """
+        Returns cache key of the token generation lock of the user
+        :param user_id:
+        :return:
+        """
+        return f"openedx_search_api:token_lock:{user_id}"
+
+    @property
+    def lock_timeout(self):
+        """
+        Returns seconds after which a token generation lock is considered abandoned
+        :return:
+        """
+        return getattr(settings, 'SEARCH_TOKEN_LOCK_TIMEOUT', DEFAULT_LOCK_TIMEOUT)
+
+    def _acquire_user_lock(self, user_id):
+        with self._lock:
+            entry = self._user_locks.setdefault(user_id, [threading.Lock(), 0])
+            entry[1] += 1
+        return entry[0]
+
+    def _release_user_lock(self, user_id):
+        with self._lock:
+            entry = self._user_locks[user_id]
+            entry[1] -= 1
+            if not entry[1]:
+                del self._user_locks[user_id]
+
+    def _release_shared_lock(self, key, owner):
+        cache = self.cache
+        client = get_redis_client(cache, key)
+        if client is not None:
+            client.eval(RELEASE_LOCK_SCRIPT, 1, cache.make_and_validate_key(key), owner)
+        elif cache.get(key) == owner:
+            cache.delete(key)
+
+    @staticmethod
+    def _lock_owner():
+        # An integer, which Redis backends store unserialized for the release script.
+        return uuid.uuid4().int >> 64
+
+    @contextmanager
+    def lock(self, user_id):
+        """
+        Serialize token generation of a user across threads and processes.
+
+        Waiting for the lock of the process and then the shared one gives up after
+        ``SEARCH_TOKEN_LOCK_TIMEOUT`` seconds in total, when the lock of a crashed holder
+        expires, and the caller then proceeds without it.
+        :param user_id:
+        :return:
+        """
+        user_lock = self._acquire_user_lock(user_id)
+        key, owner = self.lock_key(user_id), self._lock_owner()
+        deadline = time.monotonic() + self.lock_timeout
+        acquired = user_lock.acquire(timeout=self.lock_timeout)
+        try:
+            while not self.cache.add(key, owner, self.lock_timeout):
+                if time.monotonic() >= deadline:
+                    break
+                time.sleep(LOCK_POLL_INTERVAL)
+            try:
+                yield
+            finally:
+                self._release_shared_lock(key, owner)
+        finally:
+            if acquired:
+                user_lock.release()
+            self._release_user_lock(user_id)
+
+    @asynccontextmanager
+    async def alock(self, user_id):
+        """
+        Async variant of lock, waiting on the shared lock without blocking the event loop
+        :param user_id:
+        :return:
+        """
+        key, owner = self.lock_key(user_id), self._lock_owner()
+        deadline = time.monotonic() + self.lock_timeout
+        while not await self.cache.aadd(key, owner, self.lock_timeout):
+            if time.monotonic() >= deadline:
+                break
+            await asyncio.sleep(LOCK_POLL_INTERVAL)
+        try:
+            yield
+        finally:
+            await sync_to_async(self._release_shared_lock)(key, owner)
+
+    def invalidate(self, user_id):
+        """
+        Drop every cached token of the user
+        :param user_id:
+        :return:
+        """
+        prefix = f"openedx_search_api:token:{user_id}:"
+        with self._lock:
+            for key in [key for key in self._local if key.startswith(prefix)]:
+                del self._local[key]
+        version_key = self.version_key(user_id)
+        try:
+            self.cache.incr(version_key)
+        except ValueError:
+            self.cache.set(version_key, 1, None)
+
+    def clear(self):
+        """
+        Drop every entry of the in-process tier
+        :return:
+        """
+        with self._lock:
+            self._local.clear()
+
+
+token_cache = TokenCache()
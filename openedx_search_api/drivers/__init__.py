@@ -2,12 +2,57 @@
 Module for search engine drivers and factory.
 """
 
+from functools import lru_cache
+
+from asgiref.sync import sync_to_async
 from django.conf import settings
 from django.utils.module_loading import import_string
 
+from ..metrics import DRIVER_CALLS, instrument
+
+
+@lru_cache(maxsize=None)
+def get_driver_class(search_driver):
+    """
+    Returns the driver class of a dotted path, resolved once per process.
+
+    :param search_driver: Dotted path of the driver class.
+    :return: Subclass of BaseDriver.
+    """
+    return import_string(search_driver)
+
+
+class SearchError(Exception):
+    """
+    Error of a search served by a driver, carrying the HTTP status and error code to answer.
+    """
+
+    def __init__(self, message, code='invalid_request', status_code=400):
+        super().__init__(message)
+        self.message = message
+        self.code = code
+        self.status_code = status_code
+
 
 class BaseDriver:
-    """Base class for search engine drivers."""
+    """
+    Base class for search engine drivers.
+
+    The methods of this interface implemented by a subclass are wrapped to record the
+    duration of every call in the driver calls metric.
+    """
+    INSTRUMENTED_METHODS = (
+        'get_user_token', 'aget_user_token', 'build_user_token', 'delete_key',
+        'check_connection', 'indexes', 'index', 'add_documents_ndjson', 'get_tasks', 'search',
+        'get_search_rules', 'delete_index', 'swap_indexes',
+    )
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        driver = getattr(cls, 'SEARCH_ENGINE', cls.__name__)
+        for name in cls.INSTRUMENTED_METHODS:
+            if name in cls.__dict__:
+                setattr(cls, name, instrument(cls.__dict__[name], DRIVER_CALLS, driver, name))
 
     def get_user_token(self, index_search_rules=None):
         """
@@ -18,6 +63,37 @@ class BaseDriver:
         """
         raise NotImplementedError("Method 'get_user_token' not implemented")
 
+    async def aget_user_token(self, index_search_rules=None):
+        """
+        Async variant of get_user_token.
+
+        Drivers should override it with a native implementation, the default one runs
+        get_user_token in a worker thread.
+
+        :param index_search_rules: Optional search rules to filter the token retrieval.
+        """
+        return await sync_to_async(self.get_user_token)(index_search_rules)
+
+    def build_user_token(self, token=None, api_key=None, force=False):
+        """
+        Sign the token of the request user without storing it.
+
+        :param token: Active stored token of the user, if any.
+        :param api_key: Active stored api key of the user, if any.
+        :param force: Re-sign even when the stored token can be reused.
+        :raises NotImplementedError: If the method is not implemented in a subclass.
+        """
+        raise NotImplementedError("Method 'build_user_token' not implemented")
+
+    def delete_key(self, key_uid):
+        """
+        Revoke an API key created for a user.
+
+        :param key_uid: Identifier of the key.
+        :raises NotImplementedError: If the method is not implemented in a subclass.
+        """
+        raise NotImplementedError("Method 'delete_key' not implemented")
+
     def check_connection(self):
         """
         Check the connection to the search engine.
@@ -44,6 +120,43 @@ class BaseDriver:
         """
         raise NotImplementedError("Method 'index' not implemented")
 
+    def add_documents_ndjson(self, index_name, payload, content_encoding=None):
+        """
+        Add documents encoded as newline delimited JSON to an index.
+
+        :param index_name: The name of the index.
+        :param payload: NDJSON bytes.
+        :param content_encoding: Optional encoding of the payload, e.g. gzip.
+        :raises NotImplementedError: If the method is not implemented in a subclass.
+        """
+        raise NotImplementedError("Method 'add_documents_ndjson' not implemented")
+
+    def get_tasks(self, task_uids):
+        """
+        Retrieve the current state of the given asynchronous tasks in one request.
+
+        :param task_uids: List of task identifiers.
+        :return: List of tasks.
+        :raises NotImplementedError: If the method is not implemented in a subclass.
+        """
+        raise NotImplementedError("Method 'get_tasks' not implemented")
+
+    def search(self, token, index_name, params):
+        """
+        Search an index on behalf of the holder of a token issued by get_user_token.
+
+        Drivers whose engine is not queried directly by browsers serve searches through the
+        search view with this method.
+
+        :param token: Token sent by the client.
+        :param index_name: The name of the index.
+        :param params: Search parameters, e.g. q, filter, limit and offset.
+        :return: Search response.
+        :raises SearchError: If the token, the index or the parameters are invalid.
+        :raises NotImplementedError: If the method is not implemented in a subclass.
+        """
+        raise NotImplementedError("Method 'search' not implemented")
+
     def get_search_rules(self, search_rules=None):
         """
         Retrieve the search rules based on the provided filters.
@@ -82,5 +195,5 @@ class DriverFactory:
             'SEARCH_ENGINE',
             'openedx_search_api.drivers.meilisearch.MeiliSearchEngine'
         )
-        klass = import_string(search_driver)
+        klass = get_driver_class(search_driver)
         return klass.get_instance(request, *args, **kwargs)
@@ -0,0 +1,325 @@
+"""
+Parser of Meilisearch filter expressions and their compiler into SQLite conditions, used by
+drivers evaluating filters and search rules locally.
+
+Supported syntax: ``=``, ``!=``, ``>``, ``>=``, ``<``, ``<=``, ``IN [...]``, ``NOT IN [...]``,
+``EXISTS``, ``NOT EXISTS``, ``a TO b`` ranges, ``AND``, ``OR``, ``NOT`` and parentheses,
+as well as the array form where the outer list is a conjunction of disjunctions. The legacy
+``attribute: value`` form is read as an equality.
+"""
+
+import re
+
+from . import SearchError
+
+_TOKEN = re.compile(r'''
+    \s*(?:
+        (?P<string>"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')
+        | (?P<operator>!=|>=|<=|=|>|<|:)
+        | (?P<punctuation>[()\[\],])
+        | (?P<word>[^\s()\[\],=!<>:"']+)
+    )
+''', re.VERBOSE)
+_KEYWORDS = ('AND', 'OR', 'NOT', 'IN', 'EXISTS', 'TO')
+
+
+def invalid_filter(message):
+    """
+    Returns error of an unparsable filter
+    :param message:
+    :return:
+    """
+    return SearchError(message, code='invalid_search_filter')
+
+
+def tokenize(expression):
+    """
+    Split a filter expression into (kind, value) tokens.
+
+    :param expression: Filter string.
+    :return: List of tokens, kind being string, operator, punctuation, keyword or word.
+    """
+    tokens = []
+    position = 0
+    expression = expression.rstrip()
+    while position < len(expression):
+        match = _TOKEN.match(expression, position)
+        if not match:
+            raise invalid_filter(f"Unexpected character at {position} in filter {expression!r}")
+        position = match.end()
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == 'string':
+            value = re.sub(r'\\(.)', r'\1', value[1:-1])
+        elif kind == 'word' and value.upper() in _KEYWORDS:
+            kind, value = 'keyword', value.upper()
+        tokens.append((kind, value))
+    return tokens
+
+
+class _Parser:
+    """
+    Recursive descent parser producing filter trees made of tuples:
+
+    ``('and', [nodes])``, ``('or', [nodes])``, ``('not', node)``,
+    ``('cmp', attribute, operator, value)``, ``('in', attribute, [values])``,
+    ``('exists', attribute)`` and ``('to', attribute, low, high)``.
+    """
+
+    def __init__(self, expression):
+        self.expression = expression
+        self.tokens = tokenize(expression)
+        self.position = 0
+
+    def peek(self, kind=None, value=None):
+        """
+        Returns the next token when it matches the given kind and value
+        :return:
+        """
+        if self.position >= len(self.tokens):
+            return None
+        token = self.tokens[self.position]
+        if (kind and token[0] != kind) or (value and token[1] != value):
+            return None
+        return token
+
+    def take(self, kind=None, value=None):
+        """
+        Returns the next token and advances, raising when it does not match
+        :return:
+        """
+        token = self.peek(kind, value)
+        if token is None:
+            found = self.tokens[self.position][1] if self.position < len(self.tokens) else 'end'
+            raise invalid_filter(
+                f"Expected {value or kind} but found {found!r} in filter {self.expression!r}"
+            )
+        self.position += 1
+        return token
+
+    def parse(self):
+        """
+        Returns tree of the whole expression
+        :return:
+        """
+        node = self.parse_or()
+        if self.position != len(self.tokens):
+            raise invalid_filter(
+                f"Unexpected {self.tokens[self.position][1]!r} in filter {self.expression!r}"
+            )
+        return node
+
+    def parse_or(self):  # pylint: disable=missing-function-docstring
+        nodes = [self.parse_and()]
+        while self.peek('keyword', 'OR'):
+            self.take()
+            nodes.append(self.parse_and())
+        return nodes[0] if len(nodes) == 1 else ('or', nodes)
+
+    def parse_and(self):  # pylint: disable=missing-function-docstring
+        nodes = [self.parse_not()]
+        while self.peek('keyword', 'AND'):
+            self.take()
+            nodes.append(self.parse_not())
+        return nodes[0] if len(nodes) == 1 else ('and', nodes)
+
+    def parse_not(self):  # pylint: disable=missing-function-docstring
+        if self.peek('keyword', 'NOT'):
+            self.take()
+            return 'not', self.parse_not()
+        if self.peek('punctuation', '('):
+            self.take()
+            node = self.parse_or()
+            self.take('punctuation', ')')
+            return node
+        return self.parse_condition()
+
+    def value(self):  # pylint: disable=missing-function-docstring
+        if self.peek('string'):
+            return self.take()[1]
+        return self.take('word')[1]
+
+    def values(self):  # pylint: disable=missing-function-docstring
+        self.take('punctuation', '[')
+        values = [] if self.peek('punctuation', ']') else [self.value()]
+        while self.peek('punctuation', ','):
+            self.take()
+            values.append(self.value())
+        self.take('punctuation', ']')
+        return values
+
+    def parse_condition(self):  # pylint: disable=missing-function-docstring
+        attribute = self.value()
+        if self.peek('operator'):
+            operator = self.take()[1].replace(':', '=')
+            node = ('cmp', attribute, '=' if operator == '!=' else operator, self.value())
+            return ('not', node) if operator == '!=' else node
+        if self.peek('keyword', 'NOT'):
+            self.take()
+            if self.peek('keyword', 'EXISTS'):
+                self.take()
+                return 'not', ('exists', attribute)
+            self.take('keyword', 'IN')
+            return 'not', ('in', attribute, self.values())
+        if self.peek('keyword', 'IN'):
+            self.take()
+            return 'in', attribute, self.values()
+        if self.peek('keyword', 'EXISTS'):
+            self.take()
+            return 'exists', attribute
+        low = self.value()
+        self.take('keyword', 'TO')
+        return 'to', attribute, low, self.value()
+
+
+def parse_filter(expression):
+    """
+    Parse a filter given as a string or in the array form.
+
+    :param expression: Filter string, list of filters or None.
+    :return: Filter tree, None when there is nothing to filter on.
+    :raises SearchError: When the filter is invalid.
+    """
+    if expression is None or expression == '' or expression == []:
+        return None
+    if isinstance(expression, str):
+        return _Parser(expression).parse()
+    if not isinstance(expression, (list, tuple)):
+        raise invalid_filter(f"Invalid filter {expression!r}")
+    nodes = []
+    for item in expression:
+        if isinstance(item, (list, tuple)):
+            alternatives = [node for node in map(parse_filter, item) if node is not None]
+            node = ('or', alternatives) if len(alternatives) > 1 else (alternatives or [None])[0]
+        else:
+            node = parse_filter(item)
+        if node is not None:
+            nodes.append(node)
+    if not nodes:
+        return None
+    return nodes[0] if len(nodes) == 1 else ('and', nodes)
+
+
+def combine_filters(*expressions):
+    """
+    Parse every filter on its own and return the conjunction of their trees, so that no
+    filter can unbalance the parentheses of another one.
+
+    :param expressions: Filters in any form accepted by parse_filter.
+    :return: Filter tree, None when there is nothing to filter on.
+    :raises SearchError: When a filter is invalid.
+    """
+    nodes = [node for node in map(parse_filter, expressions) if node is not None]
+    if not nodes:
+        return None
+    return nodes[0] if len(nodes) == 1 else ('and', nodes)
+
+
+class FilterCompiler:
+    """
+    Compile filter trees into SQLite conditions on the documents table of an index.
+
+    The layout maps every filterable attribute to a column of the documents table. Elements
+    of list values live in the ``values`` table, which is only queried for the attributes in
+    ``list_attributes``.
+    """
+
+    def __init__(self, layout, alias='d'):
+        self.layout = layout
+        self.alias = alias
+
+    @staticmethod
+    def literals(value):
+        """
+        Returns values an equality on a filter literal matches, numbers matching both forms
+        :param value:
+        :return:
+        """
+        number = FilterCompiler.number(value)
+        return [value] if number is None else [value, number]
+
+    @staticmethod
+    def number(value):
+        """
+        Returns numeric value of a filter literal, None when it is not a number
+        :param value:
+        :return:
+        """
+        try:
+            number = float(value)
+        except (TypeError, ValueError):
+            return None
+        return int(number) if number.is_integer() else number
+
+    def condition(self, expression, node):
+        """
+        Returns SQL condition and parameters of a leaf node on a value expression
+        :param expression:
+        :param node:
+        :return:
+        """
+        kind = node[0]
+        if kind == 'exists':
+            return f'{expression} IS NOT NULL', []
+        if kind == 'in':
+            values = [literal for value in node[2] for literal in self.literals(value)]
+            if not values:
+                return '0', []
+            return f"{expression} IN ({', '.join('?' * len(values))})", values
+        if kind == 'to':
+            low, high = self.number(node[2]), self.number(node[3])
+            if low is None or high is None:
+                raise SearchError(
+                    f"Range bounds of {node[1]} must be numbers", code='invalid_search_filter'
+                )
+            return (
+                f"(typeof({expression}) IN ('integer', 'real') "
+                f"AND {expression} BETWEEN ? AND ?)", [low, high]
+            )
+        operator, value = node[2], node[3]
+        if operator == '=':
+            return self.condition(expression, ('in', node[1], [value]))
+        number = self.number(value)
+        types = "'text'" if number is None else "'integer', 'real'"
+        return (
+            f"(typeof({expression}) IN ({types}) AND {expression} {operator} ?)",
+            [value if number is None else number]
+        )
+
+    def leaf(self, node):
+        """
+        Returns SQL condition and parameters of a leaf node
+        :param node:
+        :return:
+        """
+        attribute = node[1]
+        if attribute not in self.layout.filterable:
+            raise SearchError(
+                f"Attribute `{attribute}` is not filterable. Available filterable attributes "
+                f"are: {', '.join(self.layout.filterable) or 'none'}.",
+                code='invalid_search_filter'
+            )
+        sql, params = self.condition(f'{self.alias}.{self.layout.column(attribute)}', node)
+        if attribute in self.layout.list_attributes:
+            list_sql, list_params = self.condition('value', node)
+            sql = (
+                f'({sql} OR {self.alias}.rowid IN (SELECT doc FROM {self.layout.values} '
+                f'WHERE attribute = ? AND {list_sql}))'
+            )
+            params = params + [self.layout.columns.index(attribute)] + list_params
+        return sql, params
+
+    def compile(self, node):
+        """
+        Returns SQL condition and parameters of a filter tree
+        :param node:
+        :return:
+        """
+        if node[0] in ('and', 'or'):
+            parts = [self.compile(child) for child in node[1]]
+            joined = f' {node[0].upper()} '.join(sql for sql, _ in parts)
+            return f'({joined})', [param for _, params in parts for param in params]
+        if node[0] == 'not':
+            sql, params = self.compile(node[1])
+            return f'NOT COALESCE({sql}, 0)', params
+        return self.leaf(node)
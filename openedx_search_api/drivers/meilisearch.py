@@ -2,20 +2,436 @@
 Module for MeiliSearch Engine integration with Django.
 """
 
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
 from datetime import datetime, timedelta, timezone
+from functools import lru_cache
 from typing import Any, Dict, List, Mapping, Optional
 
+import httpx
+import requests
 from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.dateparse import parse_datetime
 from django.utils.module_loading import import_string
 from meilisearch import Client as MeilisearchClient
 from meilisearch import errors
-from meilisearch.errors import MeilisearchError
+from meilisearch._httprequests import HttpRequests
+from meilisearch.errors import MeilisearchApiError, MeilisearchError
 from meilisearch.index import Index
 from meilisearch.models.key import Key
 
-from . import BaseDriver
+from . import BaseDriver, SearchError
+from ..cache import token_cache
+from ..metrics import ENGINE_REQUESTS, TOKEN_STAGES, timed
 from ..models import SearchEngineToken, SearchApiKeyModel
 
+log = logging.getLogger(__name__)
+
+
+class PooledHttpRequests(HttpRequests):
+    """
+    Meilisearch HTTP layer sending every request through a shared, pooled requests session.
+
+    The upstream implementation mutates its headers dict for every request, so the headers
+    are kept per thread to let several threads use one instance at the same time.
+    """
+
+    def __init__(self, config, session):
+        self._local = threading.local()
+        self._base_headers = {}
+        super().__init__(config)
+        self.session = session
+
+    @property
+    def headers(self):
+        """
+        Returns headers of the current thread
+        :return:
+        """
+        if not hasattr(self._local, 'headers'):
+            self._local.headers = dict(self._base_headers)
+        return self._local.headers
+
+    @headers.setter
+    def headers(self, value):
+        self._base_headers = dict(value)
+        self._local = threading.local()
+
+    def get(self, path):
+        return self.send_request(self.session.get, path)
+
+    def post(self, path, body=None, content_type="application/json", *, serializer=None):
+        return self.send_request(
+            self.session.post, path, body, content_type, serializer=serializer
+        )
+
+    def patch(self, path, body=None, content_type="application/json"):
+        return self.send_request(self.session.patch, path, body, content_type)
+
+    def put(self, path, body=None, content_type="application/json", *, serializer=None):
+        return self.send_request(
+            self.session.put, path, body, content_type, serializer=serializer
+        )
+
+    def delete(self, path, body=None):
+        return self.send_request(self.session.delete, path, body)
+
+    def send_request(self, http_method, *args, **kwargs):  # pylint: disable=arguments-differ
+        with ENGINE_REQUESTS.time(http_method.__name__.upper()):
+            return super().send_request(http_method, *args, **kwargs)
+
+
+class PooledMeilisearchClient(MeilisearchClient):
+    """
+    Meilisearch client reusing keep-alive connections from a bounded pool.
+    """
+
+    def __init__(
+            self, url, api_key=None, timeout=None, pool_size=10, keep_alive=True
+    ):  # pylint: disable=too-many-arguments, too-many-positional-arguments
+        super().__init__(url, api_key, timeout=timeout)
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        if not keep_alive:
+            self.session.headers['Connection'] = 'close'
+        self.http = self._http()
+        self.task_handler.http = self._http()
+
+    def _http(self):
+        return PooledHttpRequests(self.config, self.session)
+
+    def index(self, uid: str) -> Index:
+        index = super().index(uid)
+        index.http = self._http()
+        index.task_handler.http = self._http()
+        return index
+
+
+_shared_clients = {}
+_shared_clients_lock = threading.Lock()
+
+
+def get_shared_client(url, api_key):
+    """
+    Returns the Meilisearch client shared by every thread of the current process.
+
+    Clients are keyed by process id as well, so a forked worker never reuses the
+    connections of its parent.
+    :param url:
+    :param api_key:
+    :return:
+    """
+    key = (os.getpid(), url, api_key)
+    client = _shared_clients.get(key)
+    if client is None:
+        with _shared_clients_lock:
+            client = _shared_clients.get(key)
+            if client is None:
+                client = PooledMeilisearchClient(
+                    url,
+                    api_key,
+                    timeout=getattr(settings, 'MEILISEARCH_TIMEOUT', None),
+                    pool_size=getattr(settings, 'MEILISEARCH_POOL_SIZE', 10),
+                    keep_alive=getattr(settings, 'MEILISEARCH_KEEP_ALIVE', True),
+                )
+                _shared_clients[key] = client
+    return client
+
+
+UNORDERED_SETTINGS = ('filterableAttributes', 'sortableAttributes', 'stopWords')
+
+
+def _normalize_setting(name, value):
+    if name in UNORDERED_SETTINGS and isinstance(value, list):
+        return sorted(value, key=str)
+    return value
+
+
+def _setting_matches(name, current, desired):
+    if isinstance(desired, dict) and isinstance(current, dict):
+        return all(
+            _setting_matches(key, current.get(key), value) for key, value in desired.items()
+        )
+    return _normalize_setting(name, current) == _normalize_setting(name, desired)
+
+
+def diff_settings(current, desired):
+    """
+    Returns the settings of ``desired`` which differ from the ``current`` index settings.
+
+    Only the keys present in ``desired`` are compared. Attribute lists whose order does not
+    matter to Meilisearch are compared as sets and nested settings, e.g. typoTolerance, are
+    compared on the keys they configure.
+
+    :param current: Settings returned by the engine.
+    :param desired: Configured settings.
+    :return: Dict of the settings to update, empty when the index is up to date.
+    """
+    return {
+        name: value for name, value in (desired or {}).items()
+        if not _setting_matches(name, (current or {}).get(name), value)
+    }
+
+
+def reconcile_settings(index, index_settings):
+    """
+    Update the settings of an existing index which differ from the configured ones.
+
+    Only the changed settings are sent, so unchanged settings never trigger a reindexing
+    of the documents by the engine.
+
+    :param index: MeiliSearch index.
+    :param index_settings: Configured settings.
+    :return: TaskInfo of the update, None when the settings are up to date.
+    """
+    if not index_settings:
+        return None
+    changed = diff_settings(index.get_settings(), index_settings)
+    if not changed:
+        return None
+    log.info("Updating settings %s of index %s", sorted(changed), index.uid)
+    return index.update_settings(changed)
+
+
+class IndexMetadataCache:
+    """
+    Per-process memo of the indexes known to exist with the settings reconciled on them.
+
+    It saves the fetch_info and get_settings round trips of every ``index()`` call made
+    while loading batches. Entries expire after MEILISEARCH_INDEX_CACHE_TTL seconds and are
+    dropped when the driver deletes or swaps the index.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def ttl():
+        """
+        Returns seconds an index stays known without checking it again
+        :return:
+        """
+        return getattr(settings, 'MEILISEARCH_INDEX_CACHE_TTL', 300)
+
+    @staticmethod
+    def _key(url, index_name):
+        return os.getpid(), url, index_name
+
+    @staticmethod
+    def fingerprint(index_settings, options):
+        """
+        Returns fingerprint of the configuration of an index
+        :param index_settings:
+        :param options:
+        :return:
+        """
+        return json.dumps(
+            [index_settings or {}, options or {}], sort_keys=True, cls=DjangoJSONEncoder
+        )
+
+    def is_current(self, url, index_name, fingerprint):
+        """
+        Returns whether the index is known to exist with the given configuration
+        :param url:
+        :param index_name:
+        :param fingerprint:
+        :return:
+        """
+        entry = self._entries.get(self._key(url, index_name))
+        return entry is not None and entry[0] == fingerprint and entry[1] > time.monotonic()
+
+    def set(self, url, index_name, fingerprint):
+        """
+        Remember the index exists with the given configuration.
+        """
+        with self._lock:
+            self._entries[self._key(url, index_name)] = (fingerprint, time.monotonic() + self.ttl())
+
+    def invalidate(self, url, *index_names):
+        """
+        Forget the given indexes, every index when none is given.
+        """
+        with self._lock:
+            if not index_names:
+                self._entries.clear()
+            for index_name in index_names:
+                self._entries.pop(self._key(url, index_name), None)
+
+
+index_metadata_cache = IndexMetadataCache()
+
+
+KEY_MODE_PER_USER = 'per_user'
+KEY_MODE_SHARED = 'shared'
+
+
+def _parse_key_datetime(value):
+    """
+    Returns aware datetime of a parent key setting value
+    :param value:
+    :return:
+    """
+    if value is None or isinstance(value, datetime):
+        return value
+    return parse_datetime(value)
+
+
+def get_parent_keys():
+    """
+    Returns parent keys configured to sign tenant tokens in shared key mode.
+
+    Keys come from MEILISEARCH_PARENT_KEYS, a list of dicts with ``uid``, ``key`` and optional
+    ``active_from``/``expires_at`` datetimes, falling back to MEILISEARCH_API_KEY_ID and
+    MEILISEARCH_API_KEY.
+    :return:
+    """
+    keys = getattr(settings, 'MEILISEARCH_PARENT_KEYS', None)
+    if keys is None:
+        keys = [{
+            'uid': getattr(settings, 'MEILISEARCH_API_KEY_ID', None),
+            'key': getattr(settings, 'MEILISEARCH_API_KEY', None),
+        }]
+    return [
+        {
+            'uid': key['uid'],
+            'key': key['key'],
+            'active_from': _parse_key_datetime(key.get('active_from')),
+            'expires_at': _parse_key_datetime(key.get('expires_at')),
+        }
+        for key in keys
+    ]
+
+
+def get_parent_key(now=None):
+    """
+    Returns the parent key currently signing tenant tokens, the most recently activated one.
+
+    A rotation is planned by adding the new key with a future ``active_from``; from that moment
+    tokens signed by the previous key are lazily re-signed on their next request.
+    :param now:
+    :return:
+    """
+    now = now or datetime.now(tz=timezone.utc)
+    candidates = [
+        key for key in get_parent_keys()
+        if key['uid'] and key['key']
+        and (key['active_from'] is None or key['active_from'] <= now)
+        and (key['expires_at'] is None or key['expires_at'] > now)
+    ]
+    if not candidates:
+        raise ImproperlyConfigured("No active Meilisearch parent key is configured")
+    return max(
+        candidates,
+        key=lambda key: key['active_from'] or datetime.min.replace(tzinfo=timezone.utc)
+    )
+
+
+_shared_async_clients = {}
+
+
+def get_shared_async_client(url, api_key):
+    """
+    Returns the async HTTP client to Meilisearch shared by the running event loop.
+
+    An async client is bound to the loop it was created in, so it is replaced whenever
+    it is requested from another loop.
+    :param url:
+    :param api_key:
+    :return:
+    """
+    loop = asyncio.get_running_loop()
+    key = (os.getpid(), url, api_key)
+    client_loop, client = _shared_async_clients.get(key, (None, None))
+    if client is None or client_loop is not loop or client.is_closed:
+        pool_size = getattr(settings, 'MEILISEARCH_POOL_SIZE', 10)
+        keep_alive = getattr(settings, 'MEILISEARCH_KEEP_ALIVE', True)
+        client = httpx.AsyncClient(
+            base_url=url,
+            headers={'Authorization': f'Bearer {api_key}'},
+            timeout=getattr(settings, 'MEILISEARCH_TIMEOUT', None),
+            limits=httpx.Limits(
+                max_connections=pool_size,
+                max_keepalive_connections=pool_size if keep_alive else 0,
+            ),
+        )
+        _shared_async_clients[key] = (loop, client)
+    return client
+
+
+class SearchRules(dict):
+    """
+    Computed search rules carrying the fingerprint of their content.
+    """
+    fingerprint = ''
+
+
+def fingerprint_search_rules(search_rules):
+    """
+    Returns stable fingerprint of search rules
+    :param search_rules:
+    :return:
+    """
+    fingerprint = getattr(search_rules, 'fingerprint', '')
+    if fingerprint:
+        return fingerprint
+    payload = json.dumps(
+        search_rules or {}, sort_keys=True, separators=(',', ':'), cls=DjangoJSONEncoder
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class CompiledSearchRules:  # pylint: disable=too-few-public-methods
+    """
+    Immutable search rules of every index, compiled once from INDEX_CONFIGURATIONS.
+
+    Rendering is memoized per distinct tuple of dynamic rules so the request path does no
+    string building. Rendered rules are shared between callers and must not be mutated.
+    """
+
+    def __init__(self, index_configurations, memo_size=1024):
+        self.static_rules = tuple(
+            (index, tuple(config.get('search_rules', [])))
+            for index, config in index_configurations.items()
+        )
+        self.render = lru_cache(maxsize=memo_size)(self._render)
+
+    def _render(self, search_rules):
+        rules = SearchRules(
+            (index, {'filter': ' AND '.join(static_rules + search_rules)})
+            for index, static_rules in self.static_rules
+        )
+        rules.fingerprint = fingerprint_search_rules(dict(rules))
+        return rules
+
+
+@lru_cache(maxsize=1)
+def get_compiled_search_rules():
+    """
+    Returns search rules compiled from the current INDEX_CONFIGURATIONS
+    :return:
+    """
+    return CompiledSearchRules(getattr(settings, 'INDEX_CONFIGURATIONS', {}))
+
+
+@lru_cache(maxsize=None)
+def get_index_configuration_class(index_config):
+    """
+    Returns index configuration class of a dotted path, resolved once per process
+    :param index_config:
+    :return:
+    """
+    return import_string(index_config)
+
 
 class BaseIndexConfiguration:
     """
@@ -44,15 +460,10 @@ class BaseIndexConfiguration:
         :param search_rules:
         :return:
         """
-        if search_rules is None:
-            search_rules = []
-        rules = {}
-        for index, config in self.index_configurations.items():
-            rules[index] = {'filter': ' AND '.join(config.get('search_rules', []) + search_rules)}
-        return rules
+        return get_compiled_search_rules().render(tuple(search_rules or ()))
 
 
-class MeiliSearchEngine(BaseDriver):  # pylint disable=too-many-instance-attributes
+class MeiliSearchEngine(BaseDriver):  # pylint: disable=too-many-instance-attributes,too-many-public-methods
     """
     MeiliSearch Engine driver.
     """
@@ -64,14 +475,28 @@ class MeiliSearchEngine(BaseDriver):  # pylint disable=too-many-instance-attribu
             meilisearch_url,
             meilisearch_public_url,
             meilisearch_master_api_key,
-            expiry_days=7
+            expiry_days=7,
+            client=None,
+            async_client=None
     ):  # pylint: disable=too-many-arguments, too-many-positional-arguments
         self._index = None
         self.url = meilisearch_url
         self.public_url = meilisearch_public_url
         self.token_expires_at = datetime.now(tz=timezone.utc) + timedelta(days=expiry_days)
         self.request = request
-        self.client: MeilisearchClient = MeilisearchClient(self.url, meilisearch_master_api_key)
+        self.master_api_key = meilisearch_master_api_key
+        self.client: MeilisearchClient = client or MeilisearchClient(
+            self.url, meilisearch_master_api_key
+        )
+        self._async_client = async_client
+
+    @property
+    def async_client(self) -> httpx.AsyncClient:
+        """
+        Returns async HTTP client to MeiliSearch
+        :return:
+        """
+        return self._async_client or get_shared_async_client(self.url, self.master_api_key)
 
     def check_connection(self):
         """
@@ -84,46 +509,121 @@ class MeiliSearchEngine(BaseDriver):  # pylint disable=too-many-instance-attribu
             self.client = None
             raise ConnectionError("Unable to connect to Meilisearch") from err
 
+    def _key_options(self):
+        """
+        Returns options of the per-user API keys
+        :return:
+        """
+        return {
+            'actions': ['*'],
+            'indexes': ['*'],
+            'expiresAt': str(self.token_expires_at.isoformat().replace("+00:00", "Z")),
+            'description': ''
+        }
+
+    @timed(TOKEN_STAGES, 'create_key')
     def create_key(self) -> Key:
         """
         Create an API key in MeiliSearch.
         """
-        return self.client.create_key(
-            {
-                'actions': ['*'],
-                'indexes': ['*'],
-                'expiresAt': str(self.token_expires_at.isoformat().replace("+00:00", "Z")),
-                'description': ''
-            }
-        )
+        return self.client.create_key(self._key_options())
 
-    def get_api_key(self):
+    def delete_key(self, key_uid):
         """
-        Returns api key pair [api_key_uid, api_key]
+        Revoke an API key in MeiliSearch, a key already gone counts as revoked.
+        """
+        try:
+            self.client.delete_key(key_uid)
+        except errors.MeilisearchApiError as err:
+            if err.code != 'api_key_not_found':
+                raise
+
+    @timed(TOKEN_STAGES, 'create_key')
+    async def acreate_key(self) -> Key:
+        """
+        Create an API key in MeiliSearch without blocking the event loop.
+        """
+        response = await self.async_client.post('/keys', json=self._key_options())
+        if response.is_error:
+            raise MeilisearchApiError(str(response.status_code), response)
+        return Key(**response.json())
+
+    @staticmethod
+    def _api_key_defaults(api_key):
+        """
+        Returns SearchApiKeyModel fields of an engine API key
+        :param api_key:
         :return:
         """
-        api_key_model_object = SearchApiKeyModel.get_active_api_key(self.request.user)
+        return {
+            'uid': api_key.uid,
+            'name': api_key.name,
+            'actions': api_key.actions,
+            'indexes': api_key.indexes,
+            'expires_at': api_key.expires_at,
+            'key': api_key.key,
+            'created_at': api_key.created_at,
+            'updated_at': api_key.updated_at,
+        }
+
+    @property
+    def key_mode(self):
+        """
+        Returns how tenant tokens are signed, per_user creates one engine key per user and
+        shared signs every token in-process with a parent key from settings
+        :return:
+        """
+        return getattr(settings, 'MEILISEARCH_KEY_MODE', KEY_MODE_PER_USER)
+
+    def get_signing_key(self):
+        """
+        Returns key signing the user tokens as [api_key_uid, api_key, expires_at]
+        :return:
+        """
+        if self.key_mode == KEY_MODE_SHARED:
+            parent_key = get_parent_key()
+            return parent_key['uid'], parent_key['key'], parent_key['expires_at']
+        with TOKEN_STAGES.time('get_active_api_key'):
+            api_key_model_object = SearchApiKeyModel.get_active_api_key(self.request.user)
         if not api_key_model_object:
             api_key = self.create_key()
-            SearchApiKeyModel.objects.update_or_create(
-                user=self.request.user,
-                defaults={
-                    'uid': api_key.uid,
-                    'name': api_key.name,
-                    'actions': api_key.actions,
-                    'indexes': api_key.indexes,
-                    'expires_at': api_key.expires_at,
-                    'key': api_key.key,
-                    'created_at': api_key.created_at,
-                    'updated_at': api_key.updated_at,
-                }
-            )
-            return api_key.uid, api_key.key
-        return api_key_model_object.uid, api_key_model_object.key
+            with TOKEN_STAGES.time('store_api_key'):
+                SearchApiKeyModel.objects.update_or_create(
+                    user=self.request.user, defaults=self._api_key_defaults(api_key)
+                )
+            return api_key.uid, api_key.key, api_key.expires_at
+        return api_key_model_object.uid, api_key_model_object.key, api_key_model_object.expires_at
 
-    def get_user_token(self, index_search_rules=None):
+    async def aget_signing_key(self):
         """
-        Generate a user token for MeiliSearch.
+        Async variant of get_signing_key.
+        """
+        if self.key_mode == KEY_MODE_SHARED:
+            return self.get_signing_key()
+        with TOKEN_STAGES.time('get_active_api_key'):
+            api_key_model_object = await SearchApiKeyModel.aget_active_api_key(self.request.user)
+        if not api_key_model_object:
+            api_key = await self.acreate_key()
+            with TOKEN_STAGES.time('store_api_key'):
+                await SearchApiKeyModel.objects.aupdate_or_create(
+                    user=self.request.user, defaults=self._api_key_defaults(api_key)
+                )
+            return api_key.uid, api_key.key, api_key.expires_at
+        return api_key_model_object.uid, api_key_model_object.key, api_key_model_object.expires_at
+
+    def get_api_key(self):
+        """
+        Returns api key pair [api_key_uid, api_key]
+        :return:
+        """
+        api_key_uid, key, _ = self.get_signing_key()
+        return api_key_uid, key
+
+    def _prepare_user_token(self, index_search_rules):
+        """
+        Returns base token response, fingerprint of the rules and uid of the expected signing key
+        :param index_search_rules:
+        :return:
         """
         response = {
             "url": self.public_url,
@@ -132,41 +632,168 @@ class MeiliSearchEngine(BaseDriver):  # pylint disable=too-many-instance-attribu
             "search_engine": self.SEARCH_ENGINE,
             "index_search_rules": index_search_rules
         }
-        token = SearchEngineToken.get_active_token(self.request.user)
-        if not token:
-            api_key_uid, key = self.get_api_key()
+        signing_uid = get_parent_key()['uid'] if self.key_mode == KEY_MODE_SHARED else ''
+        return response, fingerprint_search_rules(index_search_rules), signing_uid
+
+    @staticmethod
+    def _is_reusable(token, fingerprint, signing_uid):
+        """
+        Returns whether a stored token was issued for the same rules by the expected key
+        :param token:
+        :param fingerprint:
+        :param signing_uid:
+        :return:
+        """
+        return bool(token) and token.rules_fingerprint == fingerprint and (
+            not signing_uid or token.api_key_uid == signing_uid
+        )
+
+    def _sign_user_token(self, response, index_search_rules, fingerprint, signing_key):
+        """
+        Sign a new tenant token, update the response and return the fields to store
+        :return:
+        """
+        api_key_uid, key, key_expires_at = signing_key
+        expires_at = self.token_expires_at
+        if key_expires_at is not None:
+            if key_expires_at.tzinfo is None:
+                key_expires_at = key_expires_at.replace(tzinfo=timezone.utc)
+            expires_at = min(expires_at, key_expires_at)
+        with TOKEN_STAGES.time('sign'):
             restricted_api_key = self.client.generate_tenant_token(
                 api_key_uid=api_key_uid,
                 search_rules=index_search_rules or {},
-                expires_at=self.token_expires_at,
+                expires_at=expires_at,
                 api_key=key
             )
-            response.update(token=restricted_api_key)
-            SearchEngineToken.objects.update_or_create(
-                defaults={
-                    'token': restricted_api_key,
-                    'token_type': "Bearer",
-                    'expires_at': self.token_expires_at,
-                    'search_engine': self.SEARCH_ENGINE,
-                    'index_search_rules': index_search_rules or {},
-                },
-                user=self.request.user
+        response.update(token=restricted_api_key, expires_at=expires_at)
+        return {
+            'token': restricted_api_key,
+            'token_type': "Bearer",
+            'expires_at': expires_at,
+            'search_engine': self.SEARCH_ENGINE,
+            'index_search_rules': index_search_rules or {},
+            'api_key_uid': api_key_uid,
+            'rules_fingerprint': fingerprint,
+        }
+
+    @staticmethod
+    def _reuse_user_token(response, token):
+        response.update(
+            expires_at=token.expires_at,
+            token=token.token,
+            index_search_rules=token.index_search_rules
+        )
+
+    def get_user_token(self, index_search_rules=None):
+        """
+        Generate a user token for MeiliSearch.
+
+        A stored token is only reused when it was issued for the same search rules and, in
+        shared key mode, signed by the active parent key. Otherwise it is re-signed. Cache
+        misses of a user are single-flight so concurrent requests create one engine key.
+        """
+        response, fingerprint, signing_uid = self._prepare_user_token(index_search_rules)
+        user = self.request.user
+        with TOKEN_STAGES.time('cache_get'):
+            cached_response = token_cache.get(user.id, index_search_rules, namespace=signing_uid)
+        if cached_response is not None:
+            return cached_response
+        with token_cache.lock(user.id):
+            cached_response = token_cache.get(user.id, index_search_rules, namespace=signing_uid)
+            if cached_response is not None:
+                return cached_response
+            with TOKEN_STAGES.time('get_active_token'):
+                token = SearchEngineToken.get_active_token(user)
+            if self._is_reusable(token, fingerprint, signing_uid):
+                self._reuse_user_token(response, token)
+            else:
+                defaults = self._sign_user_token(
+                    response, index_search_rules, fingerprint, self.get_signing_key()
+                )
+                with TOKEN_STAGES.time('store_token'):
+                    SearchEngineToken.objects.update_or_create(defaults=defaults, user=user)
+
+            with TOKEN_STAGES.time('cache_set'):
+                token_cache.set(user.id, index_search_rules, response, namespace=signing_uid)
+        return response
+
+    async def aget_user_token(self, index_search_rules=None):
+        """
+        Async variant of get_user_token using the async ORM and HTTP client.
+        """
+        response, fingerprint, signing_uid = self._prepare_user_token(index_search_rules)
+        user = self.request.user
+        with TOKEN_STAGES.time('cache_get'):
+            cached_response = await token_cache.aget(
+                user.id, index_search_rules, namespace=signing_uid
             )
-        else:
-            response.update(
-                expires_at=token.expires_at,
-                token=token.token,
-                index_search_rules=token.index_search_rules
+        if cached_response is not None:
+            return cached_response
+        async with token_cache.alock(user.id):
+            cached_response = await token_cache.aget(
+                user.id, index_search_rules, namespace=signing_uid
             )
+            if cached_response is not None:
+                return cached_response
+            with TOKEN_STAGES.time('get_active_token'):
+                token = await SearchEngineToken.aget_active_token(user)
+            if self._is_reusable(token, fingerprint, signing_uid):
+                self._reuse_user_token(response, token)
+            else:
+                defaults = self._sign_user_token(
+                    response, index_search_rules, fingerprint, await self.aget_signing_key()
+                )
+                with TOKEN_STAGES.time('store_token'):
+                    await SearchEngineToken.objects.aupdate_or_create(defaults=defaults, user=user)
 
+            with TOKEN_STAGES.time('cache_set'):
+                await token_cache.aset(
+                    user.id, index_search_rules, response, namespace=signing_uid
+                )
         return response
 
+    def build_user_token(self, token=None, api_key=None, force=False):
+        """
+        Sign the token of the request user without writing it, for callers storing in bulk.
+
+        :param token: Active SearchEngineToken of the user, if any.
+        :param api_key: Active SearchApiKeyModel of the user, if any.
+        :param force: Re-sign even when the stored token can be reused.
+        :return: Tuple of the SearchEngineToken fields and the SearchApiKeyModel fields of a
+            newly created engine key, (None, None) when the stored token can be reused.
+        """
+        index_search_rules = self.get_search_rules()
+        response, fingerprint, signing_uid = self._prepare_user_token(index_search_rules)
+        if not force and self._is_reusable(token, fingerprint, signing_uid):
+            return None, None
+        api_key_defaults = None
+        if self.key_mode == KEY_MODE_SHARED:
+            signing_key = self.get_signing_key()
+        elif api_key is not None:
+            signing_key = api_key.uid, api_key.key, api_key.expires_at
+        else:
+            created_key = self.create_key()
+            api_key_defaults = self._api_key_defaults(created_key)
+            signing_key = created_key.uid, created_key.key, created_key.expires_at
+        token_defaults = self._sign_user_token(
+            response, index_search_rules, fingerprint, signing_key
+        )
+        return token_defaults, api_key_defaults
+
     def indexes(self, parameters: Optional[Mapping[str, Any]] = None) -> Dict[str, List[Index]]:
         """
         Get indexes from MeiliSearch.
         """
         return self.client.get_indexes(parameters=parameters)
 
+    def get_tasks(self, task_uids):
+        """
+        Get the tasks matching the given uids with a single filtered request.
+        """
+        parameters = {'uids': [str(uid) for uid in task_uids], 'limit': len(task_uids)}
+        return self.client.get_tasks(parameters).results
+
     @classmethod
     def get_instance(cls, request):
         """
@@ -179,7 +806,8 @@ class MeiliSearchEngine(BaseDriver):  # pylint disable=too-many-instance-attribu
             request,
             meilisearch_url,
             meilisearch_public_url,
-            meilisearch_master_api_key
+            meilisearch_master_api_key,
+            client=get_shared_client(meilisearch_url, meilisearch_master_api_key)
         )
 
     def _get_search_rules_class(self, *args, **kwargs) -> BaseIndexConfiguration:
@@ -191,9 +819,18 @@ class MeiliSearchEngine(BaseDriver):  # pylint disable=too-many-instance-attribu
             'INDEX_CONFIGURATION_CLASS',
             'openedx_search_api.drivers.meilisearch.BaseIndexConfiguration'
         )
-        klass = import_string(index_config)
+        klass = get_index_configuration_class(index_config)
         return klass(self.request, *args, **kwargs)
 
+    def search(self, token, index_name, params):
+        """
+        Browsers query MeiliSearch at its public URL with their tenant token, searches are
+        not served by this application.
+        """
+        raise SearchError(
+            'Searches are served by MeiliSearch at its public URL.', 'not_found', 404
+        )
+
     def get_search_rules(self, search_rules=None):
         """
         Get search rules for MeiliSearch.
@@ -203,14 +840,49 @@ class MeiliSearchEngine(BaseDriver):  # pylint disable=too-many-instance-attribu
         rules_instance = self._get_search_rules_class()
         return rules_instance.get_search_rules(search_rules=search_rules)
 
+    def delete_index(self, index_name):
+        """
+        Delete an index from MeiliSearch.
+        """
+        index_metadata_cache.invalidate(self.url, index_name)
+        return self.client.delete_index(index_name)
+
+    def swap_indexes(self, index_name, other_index_name):
+        """
+        Atomically swap the documents and settings of two indexes in MeiliSearch.
+        """
+        index_metadata_cache.invalidate(self.url, index_name, other_index_name)
+        return self.client.swap_indexes([{'indexes': [index_name, other_index_name]}])
+
+    def add_documents_ndjson(self, index_name, payload, content_encoding=None):
+        """
+        Add documents encoded as an NDJSON payload to an index in MeiliSearch.
+        """
+        index = self.client.index(index_name)
+        if content_encoding:
+            index.http.headers['Content-Encoding'] = content_encoding
+        try:
+            return index.add_documents_ndjson(payload)
+        finally:
+            index.http.headers.pop('Content-Encoding', None)
+
     def index(self, index_name, index_settings=None, options=None):
         """
-        Get or create an index in MeiliSearch.
+        Get or create an index in MeiliSearch and reconcile its settings.
+
+        Indexes already checked with the same configuration by this process are returned
+        without any request until their metadata cache entry expires.
         """
         self._index = self.client.index(index_name)
+        fingerprint = index_metadata_cache.fingerprint(index_settings, options)
+        if index_metadata_cache.is_current(self.url, index_name, fingerprint):
+            return self._index
         try:
             self._index.fetch_info()
         except errors.MeilisearchApiError:
             self.client.create_index(index_name, options or {})
             self._index.update_settings(index_settings or {})
+        else:
+            reconcile_settings(self._index, index_settings)
+        index_metadata_cache.set(self.url, index_name, fingerprint)
         return self._index
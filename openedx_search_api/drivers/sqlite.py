@@ -0,0 +1,976 @@
+"""
+Module for an embedded search engine driver backed by SQLite FTS5.
+
+Every index is stored in its own set of tables of the SQLITE_SEARCH_DATABASE file:
+
+* ``search_docs_<n>`` holds the documents and one indexed column per filterable or
+  sortable attribute,
+* ``search_values_<n>`` holds the elements of filterable attributes having list values,
+* ``search_fts_<n>`` is the FTS5 table of the searchable attributes, ranked with BM25.
+
+Documents are written synchronously, one transaction per batch, and every write is recorded
+as an already processed task so load_indexes tracks it like a Meilisearch task. Browsers do
+not reach SQLite, they query the search view with a token signed and validated locally.
+"""
+
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+
+from django.conf import settings
+from django.core import signing
+from meilisearch.models.task import Task, TaskInfo
+
+from . import BaseDriver, SearchError
+from .filters import FilterCompiler, combine_filters
+from .meilisearch import diff_settings, fingerprint_search_rules, get_index_configuration_class
+from ..cache import token_cache
+from ..indexers.encoding import decode_ndjson, encode_document
+from ..metrics import TOKEN_STAGES
+from ..models import SearchEngineToken
+
+TOKEN_SALT = 'openedx_search_api.drivers.sqlite'
+DEFAULT_SEARCH_LIMIT = 20
+DEFAULT_MAX_TOTAL_HITS = 1000
+MAX_SQL_VARIABLES = 500
+DATE_FORMAT = '%Y-%m-%dT%H:%M:%S.%fZ'
+LAYOUT_SETTINGS = ('searchableAttributes', 'filterableAttributes', 'sortableAttributes')
+INDEX_CREATING_TASKS = ('documentAdditionOrUpdate', 'settingsUpdate')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS search_indexes (
+    uid TEXT PRIMARY KEY,
+    storage INTEGER NOT NULL,
+    primary_key TEXT,
+    settings TEXT NOT NULL DEFAULT '{}',
+    list_attributes TEXT NOT NULL DEFAULT '[]',
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS search_tasks (
+    uid INTEGER PRIMARY KEY AUTOINCREMENT,
+    index_uid TEXT,
+    status TEXT NOT NULL,
+    type TEXT NOT NULL,
+    details TEXT,
+    error TEXT,
+    enqueued_at TEXT NOT NULL,
+    started_at TEXT,
+    finished_at TEXT
+);
+"""
+
+_connections = threading.local()
+
+
+def _now():
+    return datetime.now(tz=timezone.utc).strftime(DATE_FORMAT)
+
+
+def get_connection(database):
+    """
+    Returns the SQLite connection of the current thread and process to a search database.
+
+    Connections run in autocommit mode, writes open their own transaction with
+    ``transaction``. The schema shared by every index is created on first use.
+
+    :param database: Path of the database file.
+    :return: sqlite3.Connection.
+    """
+    key = (os.getpid(), database)
+    connections = getattr(_connections, 'connections', None)
+    if connections is None:
+        connections = _connections.connections = {}
+    connection = connections.get(key)
+    if connection is None:
+        connection = sqlite3.connect(database, timeout=30, isolation_level=None)
+        if database != ':memory:':
+            connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        connection.executescript(SCHEMA)
+        connections[key] = connection
+    return connection
+
+
+@contextmanager
+def transaction(connection):
+    """
+    Run the block in a write transaction, taking the database write lock upfront.
+    """
+    connection.execute('BEGIN IMMEDIATE')
+    try:
+        yield connection
+    except BaseException:
+        connection.execute('ROLLBACK')
+        raise
+    connection.execute('COMMIT')
+
+
+def get_attribute(document, name):
+    """
+    Returns the value of an attribute of a document, dotted names reaching nested objects
+    :param document:
+    :param name:
+    :return:
+    """
+    if name in document:
+        return document[name]
+    value = document
+    for part in name.split('.'):
+        if not isinstance(value, dict) or part not in value:
+            return None
+        value = value[part]
+    return value
+
+
+def filter_value(value):
+    """
+    Returns value stored in a filter column, booleans being filtered on as strings
+    :param value:
+    :return:
+    """
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, (int, float, str)):
+        return value
+    return None
+
+
+def search_text(value):
+    """
+    Returns searchable text of a value, nested values being flattened
+    :param value:
+    :return:
+    """
+    if value is None:
+        return ''
+    if isinstance(value, dict):
+        return ' '.join(search_text(item) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return ' '.join(search_text(item) for item in value)
+    return str(value)
+
+
+def chunks(values, size=MAX_SQL_VARIABLES):
+    """
+    Yield consecutive slices of at most ``size`` values
+    """
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+class IndexLayout:  # pylint: disable=too-many-instance-attributes
+    """
+    Tables and columns of an index, derived from its searchable, filterable and sortable
+    attributes.
+    """
+
+    def __init__(self, storage, index_settings, list_attributes=()):
+        self.storage = storage
+        self.filterable = list(index_settings.get('filterableAttributes') or [])
+        self.sortable = list(index_settings.get('sortableAttributes') or [])
+        self.columns = list(dict.fromkeys(self.filterable + self.sortable))
+        self.searchable = list(index_settings.get('searchableAttributes') or ['*'])
+        self.displayed = list(index_settings.get('displayedAttributes') or ['*'])
+        self.max_total_hits = (index_settings.get('pagination') or {}).get(
+            'maxTotalHits'
+        ) or DEFAULT_MAX_TOTAL_HITS
+        self.list_attributes = set(list_attributes)
+        self.documents = f'search_docs_{storage}'
+        self.values = f'search_values_{storage}'
+        self.fts = f'search_fts_{storage}'
+
+    @property
+    def search_columns(self):
+        """
+        Returns FTS5 columns, one per searchable attribute
+        :return:
+        """
+        if '*' in self.searchable:
+            return ['content']
+        return [f'c{position}' for position in range(len(self.searchable))]
+
+    def column(self, attribute):
+        """
+        Returns filter column of an attribute
+        :param attribute:
+        :return:
+        """
+        return f'f{self.columns.index(attribute)}'
+
+    def create(self, connection):
+        """
+        Create the tables of the index.
+        """
+        columns = ''.join(f', f{position}' for position in range(len(self.columns)))
+        tokenize = getattr(settings, 'SQLITE_SEARCH_TOKENIZER', 'unicode61 remove_diacritics 2')
+        self.drop(connection)
+        connection.execute(
+            f'CREATE TABLE {self.documents} '
+            f'(rowid INTEGER PRIMARY KEY, doc_id TEXT NOT NULL UNIQUE, body TEXT NOT NULL{columns})'
+        )
+        for position in range(len(self.columns)):
+            connection.execute(
+                f'CREATE INDEX {self.documents}_f{position} ON {self.documents} (f{position})'
+            )
+        connection.execute(
+            f'CREATE TABLE {self.values} (doc INTEGER NOT NULL, attribute INTEGER NOT NULL, value)'
+        )
+        connection.execute(
+            f'CREATE INDEX {self.values}_value ON {self.values} (attribute, value, doc)'
+        )
+        connection.execute(f'CREATE INDEX {self.values}_doc ON {self.values} (doc)')
+        connection.execute(
+            f"CREATE VIRTUAL TABLE {self.fts} USING fts5("
+            f"{', '.join(self.search_columns)}, tokenize={tokenize!r})"
+        )
+
+    def drop(self, connection):
+        """
+        Drop the tables of the index.
+        """
+        for table in (self.fts, self.values, self.documents):
+            connection.execute(f'DROP TABLE IF EXISTS {table}')
+
+    def search_texts(self, document):
+        """
+        Returns FTS5 column values of a document
+        :param document:
+        :return:
+        """
+        if '*' in self.searchable:
+            return [search_text(document)]
+        return [search_text(get_attribute(document, name)) for name in self.searchable]
+
+    def bm25(self):
+        """
+        Returns BM25 rank expression, earlier searchable attributes weighing more
+        :return:
+        """
+        weights = ', '.join(str(float(len(self.search_columns) - position))
+                            for position in range(len(self.search_columns)))
+        return f'bm25({self.fts}, {weights})'
+
+
+def match_query(query):
+    """
+    Returns FTS5 query matching every word of a search query, the last one as a prefix
+    :param query:
+    :return:
+    """
+    words = re.findall(r'\w+', query or '')
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += '*'
+    return ' AND '.join(terms)
+
+
+def sign_search_token(user_id, search_rules, expires_at, secret):
+    """
+    Returns token granting searches restricted by the given rules until it expires.
+
+    :param user_id: Id of the token holder.
+    :param search_rules: Search rules of the token holder per index.
+    :param expires_at: Expiry datetime.
+    :param secret: Signing secret.
+    :return: Signed token.
+    """
+    return signing.dumps(
+        {'uid': user_id, 'searchRules': search_rules or {}, 'exp': int(expires_at.timestamp())},
+        key=secret, salt=TOKEN_SALT, compress=True
+    )
+
+
+def read_search_token(token, secret):
+    """
+    Returns holder and search rules of a token signed by sign_search_token.
+
+    :param token: Token sent by the client.
+    :param secret: Signing secret.
+    :return: Tuple of the user id of the holder and the search rules.
+    :raises SearchError: If the token is missing, invalid or expired.
+    """
+    if not token:
+        raise SearchError(
+            'The Authorization header is missing. It must use the bearer authorization method.',
+            code='missing_authorization_header', status_code=401
+        )
+    try:
+        payload = signing.loads(token, key=secret, salt=TOKEN_SALT)
+    except signing.BadSignature as err:
+        raise SearchError(
+            'The provided API key is invalid.', code='invalid_api_key', status_code=403
+        ) from err
+    if payload.get('exp') is not None and payload['exp'] < time.time():
+        raise SearchError(
+            'The provided API key is expired.', code='invalid_api_key', status_code=403
+        )
+    return payload.get('uid'), payload.get('searchRules') or {}
+
+
+def index_filter(search_rules, index_name):
+    """
+    Returns filter a token enforces on an index.
+
+    :param search_rules: Search rules of the token.
+    :param index_name: Name of the searched index.
+    :return: Filter, None when the index is searchable without restriction.
+    :raises SearchError: If the token does not grant access to the index.
+    """
+    if isinstance(search_rules, list):
+        search_rules = dict.fromkeys(search_rules)
+    for name in (index_name, '*'):
+        if name in search_rules:
+            return (search_rules[name] or {}).get('filter')
+    raise SearchError(
+        'The provided API key is invalid.', code='invalid_api_key', status_code=403
+    )
+
+
+class SqliteIndex:
+    """
+    Index stored in a SQLite search database, exposing the parts of the Meilisearch index
+    API used by the indexers.
+    """
+
+    def __init__(self, engine, uid):
+        self.engine = engine
+        self.uid = uid
+
+    @property
+    def primary_key(self):
+        """
+        Returns primary key of the index
+        :return:
+        """
+        row = self.engine.get_index_row(self.uid)
+        return row['primary_key'] if row else None
+
+    def fetch_info(self):
+        """
+        Returns the index, raising when it does not exist
+        :return:
+        """
+        if self.engine.get_index_row(self.uid) is None:
+            raise SearchError(f'Index `{self.uid}` not found.', 'index_not_found', 404)
+        return self
+
+    def get_settings(self):
+        """
+        Returns settings of the index
+        :return:
+        """
+        row = self.engine.get_index_row(self.uid)
+        if row is None:
+            raise SearchError(f'Index `{self.uid}` not found.', 'index_not_found', 404)
+        return json.loads(row['settings'])
+
+    def update_settings(self, body):
+        """
+        Update the settings of the index, rebuilding its tables when its layout changes.
+
+        :param body: Settings to update.
+        :return: TaskInfo.
+        """
+        return self.engine.run_task(
+            self.uid, 'settingsUpdate', lambda connection: self._update_settings(connection, body)
+        )
+
+    def _update_settings(self, connection, body):
+        row = self.engine.get_index_row(self.uid, connection)
+        current = json.loads(row['settings'])
+        merged = {**current, **(body or {})}
+        if any(current.get(name) != merged.get(name) for name in LAYOUT_SETTINGS):
+            self.engine.rebuild(connection, row, merged)
+        connection.execute(
+            'UPDATE search_indexes SET settings = ?, updated_at = ? WHERE uid = ?',
+            (json.dumps(merged), _now(), self.uid)
+        )
+        return dict(body or {})
+
+    def add_documents(self, documents, primary_key=None):
+        """
+        Add or replace documents in one transaction.
+
+        :param documents: List of documents.
+        :param primary_key: Optional primary key, inferred from the first document when the
+            index has none.
+        :return: TaskInfo.
+        """
+        return self.engine.run_task(
+            self.uid, 'documentAdditionOrUpdate',
+            lambda connection: self.engine.write_documents(
+                connection, self.uid, documents, primary_key
+            )
+        )
+
+    def delete_documents(self, ids):
+        """
+        Delete documents by primary key in one transaction.
+
+        :param ids: List of primary keys.
+        :return: TaskInfo.
+        """
+        return self.engine.run_task(
+            self.uid, 'documentDeletion',
+            lambda connection: self.engine.delete_documents(connection, self.uid, ids)
+        )
+
+    def search(self, query, opt_params=None):
+        """
+        Search the index.
+
+        :param query: Search query.
+        :param opt_params: Optional parameters, e.g. filter, sort, limit and offset.
+        :return: Search response in the Meilisearch format.
+        """
+        return self.engine.search_index(self.uid, dict(opt_params or {}, q=query))
+
+
+class SqliteSearchEngine(BaseDriver):  # pylint: disable=too-many-public-methods
+    """
+    Embedded SQLite FTS5 search engine driver.
+    """
+    SEARCH_ENGINE = 'sqlite'
+
+    def __init__(  # pylint: disable=too-many-arguments, too-many-positional-arguments
+            self, request, database, public_url, secret, expiry_days=7
+    ):
+        self.request = request
+        self.database = database
+        self.public_url = public_url
+        self.secret = secret
+        self.token_expires_at = datetime.now(tz=timezone.utc) + timedelta(days=expiry_days)
+
+    @classmethod
+    def get_instance(cls, request):
+        """
+        Get an instance of SqliteSearchEngine.
+        """
+        return cls(
+            request,
+            getattr(settings, 'SQLITE_SEARCH_DATABASE', 'search.sqlite3'),
+            getattr(settings, 'SQLITE_SEARCH_PUBLIC_URL', '/search'),
+            getattr(settings, 'SQLITE_SEARCH_SECRET', None) or settings.SECRET_KEY,
+        )
+
+    @property
+    def connection(self):
+        """
+        Returns connection of the current thread to the search database
+        :return:
+        """
+        return get_connection(self.database)
+
+    def check_connection(self):
+        """
+        Check the search database opens and supports FTS5.
+        """
+        try:
+            self.connection.execute('CREATE VIRTUAL TABLE temp.search_check USING fts5(content)')
+            self.connection.execute('DROP TABLE temp.search_check')
+            return True
+        except sqlite3.Error as err:
+            raise ConnectionError("Unable to use the SQLite search database") from err
+
+    def get_index_row(self, index_name, connection=None):
+        """
+        Returns stored row of an index, None when it does not exist
+        :param index_name:
+        :param connection:
+        :return:
+        """
+        cursor = (connection or self.connection).execute(
+            'SELECT * FROM search_indexes WHERE uid = ?', (index_name,)
+        )
+        row = cursor.fetchone()
+        return dict(zip((column[0] for column in cursor.description), row)) if row else None
+
+    def get_layout(self, row):
+        """
+        Returns layout of a stored index
+        :param row:
+        :return:
+        """
+        return IndexLayout(
+            row['storage'], json.loads(row['settings']), json.loads(row['list_attributes'])
+        )
+
+    def create_index_row(self, connection, index_name, index_settings=None, options=None):
+        """
+        Create an index and its tables
+        :return: Stored row of the index.
+        """
+        storage = connection.execute(
+            'SELECT COALESCE(MAX(storage), 0) + 1 FROM search_indexes'
+        ).fetchone()[0]
+        now = _now()
+        IndexLayout(storage, index_settings or {}).create(connection)
+        connection.execute(
+            'INSERT INTO search_indexes (uid, storage, primary_key, settings, created_at, '
+            'updated_at) VALUES (?, ?, ?, ?, ?, ?)',
+            (index_name, storage, (options or {}).get('primaryKey'),
+             json.dumps(index_settings or {}), now, now)
+        )
+        return self.get_index_row(index_name, connection)
+
+    def rebuild(self, connection, row, index_settings):
+        """
+        Move the documents of an index to tables laid out for new settings.
+        """
+        old_layout = self.get_layout(row)
+        storage = connection.execute(
+            'SELECT COALESCE(MAX(storage), 0) + 1 FROM search_indexes'
+        ).fetchone()[0]
+        IndexLayout(storage, index_settings).create(connection)
+        connection.execute(
+            'UPDATE search_indexes SET storage = ?, settings = ?, list_attributes = ? '
+            'WHERE uid = ?', (storage, json.dumps(index_settings), '[]', row['uid'])
+        )
+        cursor = connection.execute(f'SELECT body FROM {old_layout.documents} ORDER BY rowid')
+        while True:
+            bodies = cursor.fetchmany(MAX_SQL_VARIABLES)
+            if not bodies:
+                break
+            self.write_documents(
+                connection, row['uid'], [json.loads(body) for body, in bodies], row['primary_key']
+            )
+        old_layout.drop(connection)
+
+    def record_task(  # pylint: disable=too-many-arguments, too-many-positional-arguments
+            self, connection, index_name, task_type, details=None, error=None
+    ):
+        """
+        Record a processed task and return its TaskInfo
+        :return:
+        """
+        now = _now()
+        uid = connection.execute(
+            'INSERT INTO search_tasks (index_uid, status, type, details, error, enqueued_at, '
+            'started_at, finished_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            (index_name, 'failed' if error else 'succeeded', task_type,
+             json.dumps(details or {}), json.dumps(error) if error else None, now, now, now)
+        ).lastrowid
+        return TaskInfo(
+            taskUid=uid, indexUid=index_name, status='enqueued', type=task_type, enqueuedAt=now
+        )
+
+    def run_task(self, index_name, task_type, operation):
+        """
+        Run a write operation in one transaction and record it as a task.
+
+        Invalid operations are recorded as failed tasks, like Meilisearch does, instead of
+        raising.
+
+        :param index_name: Name of the index.
+        :param task_type: Meilisearch type of the task.
+        :param operation: Callable receiving the connection and returning the task details.
+        :return: TaskInfo.
+        """
+        connection = self.connection
+        try:
+            with transaction(connection):
+                if self.get_index_row(index_name, connection) is None:
+                    if task_type not in INDEX_CREATING_TASKS:
+                        raise SearchError(
+                            f'Index `{index_name}` not found.', 'index_not_found', 404
+                        )
+                    self.create_index_row(connection, index_name)
+                details = operation(connection)
+                return self.record_task(connection, index_name, task_type, details)
+        except SearchError as err:
+            error = {'message': err.message, 'code': err.code, 'type': 'invalid_request'}
+            with transaction(connection):
+                return self.record_task(connection, index_name, task_type, error=error)
+
+    def write_documents(self, connection, index_name, documents, primary_key=None):
+        """
+        Add or replace documents within the current transaction.
+
+        :return: Task details.
+        """
+        # pylint: disable=too-many-locals
+        row = self.get_index_row(index_name, connection)
+        documents = [json.loads(encode_document(document)) for document in documents]
+        if not documents:
+            return {'receivedDocuments': 0, 'indexedDocuments': 0}
+        primary_key = row['primary_key'] or primary_key or next(
+            (name for name in documents[0] if name.lower().endswith('id')),
+            None
+        )
+        if primary_key is None:
+            raise SearchError(
+                'The primary key inference failed as the engine did not find any attribute '
+                'containing `id` in its name.', code='index_primary_key_no_candidate_found'
+            )
+        if row['primary_key'] is None:
+            connection.execute(
+                'UPDATE search_indexes SET primary_key = ? WHERE uid = ?', (primary_key, index_name)
+            )
+        layout = self.get_layout(row)
+        prepared = {}
+        for document in documents:
+            doc_id = get_attribute(document, primary_key)
+            if doc_id is None:
+                raise SearchError(
+                    f'Document does not have a `{primary_key}` attribute: {document}.',
+                    code='missing_document_id'
+                )
+            prepared[str(doc_id)] = document
+        list_attributes = {
+            attribute for document in prepared.values() for attribute in layout.columns
+            if isinstance(get_attribute(document, attribute), list)
+        }
+        if not list_attributes <= layout.list_attributes:
+            layout.list_attributes |= list_attributes
+            connection.execute(
+                'UPDATE search_indexes SET list_attributes = ? WHERE uid = ?',
+                (json.dumps(sorted(layout.list_attributes)), index_name)
+            )
+        self._delete_rows(connection, layout, list(prepared), keep_documents=True)
+        columns = ''.join(f', f{position}' for position in range(len(layout.columns)))
+        updates = ''.join(f', f{position} = excluded.f{position}'
+                          for position in range(len(layout.columns)))
+        connection.executemany(
+            f"INSERT INTO {layout.documents} (doc_id, body{columns}) "
+            f"VALUES ({', '.join('?' * (len(layout.columns) + 2))}) "
+            f"ON CONFLICT (doc_id) DO UPDATE SET body = excluded.body{updates}",
+            [
+                (doc_id, json.dumps(document), *(
+                    filter_value(get_attribute(document, attribute))
+                    for attribute in layout.columns
+                ))
+                for doc_id, document in prepared.items()
+            ]
+        )
+        rowids = self._rowids(connection, layout, list(prepared))
+        connection.executemany(
+            f"INSERT INTO {layout.fts} (rowid, {', '.join(layout.search_columns)}) "
+            f"VALUES (?, {', '.join('?' * len(layout.search_columns))})",
+            [(rowids[doc_id], *layout.search_texts(document))
+             for doc_id, document in prepared.items()]
+        )
+        values = []
+        for doc_id, document in prepared.items():
+            for position, attribute in enumerate(layout.columns):
+                value = get_attribute(document, attribute)
+                if isinstance(value, list):
+                    values.extend((rowids[doc_id], position, filter_value(item)) for item in value)
+        connection.executemany(
+            f'INSERT INTO {layout.values} (doc, attribute, value) VALUES (?, ?, ?)', values
+        )
+        connection.execute(
+            'UPDATE search_indexes SET updated_at = ? WHERE uid = ?', (_now(), index_name)
+        )
+        return {'receivedDocuments': len(documents), 'indexedDocuments': len(prepared)}
+
+    @staticmethod
+    def _rowids(connection, layout, doc_ids):
+        rowids = {}
+        for chunk in chunks(doc_ids):
+            rowids.update(connection.execute(
+                f"SELECT doc_id, rowid FROM {layout.documents} "
+                f"WHERE doc_id IN ({', '.join('?' * len(chunk))})", chunk
+            ).fetchall())
+        return rowids
+
+    def _delete_rows(self, connection, layout, doc_ids, keep_documents=False):
+        rowids = list(self._rowids(connection, layout, doc_ids).values())
+        tables = [layout.fts, layout.values] + ([] if keep_documents else [layout.documents])
+        for chunk in chunks(rowids):
+            placeholders = ', '.join('?' * len(chunk))
+            for table in tables:
+                column = 'doc' if table == layout.values else 'rowid'
+                connection.execute(
+                    f'DELETE FROM {table} WHERE {column} IN ({placeholders})', chunk
+                )
+        return len(rowids)
+
+    def delete_documents(self, connection, index_name, ids):
+        """
+        Delete documents by primary key within the current transaction.
+
+        :return: Task details.
+        """
+        layout = self.get_layout(self.get_index_row(index_name, connection))
+        deleted = self._delete_rows(connection, layout, [str(doc_id) for doc_id in ids])
+        return {'providedIds': len(ids), 'deletedDocuments': deleted}
+
+    def indexes(self, parameters=None):
+        """
+        Get the indexes of the search database.
+        """
+        uids = [uid for uid, in self.connection.execute(
+            'SELECT uid FROM search_indexes ORDER BY uid'
+        ).fetchall()]
+        offset = (parameters or {}).get('offset', 0)
+        limit = (parameters or {}).get('limit', len(uids))
+        return {'results': [SqliteIndex(self, uid) for uid in uids[offset:offset + limit]]}
+
+    def index(self, index_name, index_settings=None, options=None):
+        """
+        Get or create an index and reconcile its settings.
+        """
+        index = SqliteIndex(self, index_name)
+        row = self.get_index_row(index_name)
+        if row is None:
+            with transaction(self.connection) as connection:
+                if self.get_index_row(index_name, connection) is None:
+                    self.create_index_row(connection, index_name, index_settings, options)
+        elif index_settings and diff_settings(json.loads(row['settings']), index_settings):
+            index.update_settings(index_settings)
+        return index
+
+    def add_documents_ndjson(self, index_name, payload, content_encoding=None):
+        """
+        Add documents encoded as an NDJSON payload to an index.
+        """
+        documents = decode_ndjson(payload, compressed=content_encoding == 'gzip')
+        return SqliteIndex(self, index_name).add_documents(documents)
+
+    def delete_index(self, index_name):
+        """
+        Delete an index and its tables.
+        """
+        def delete(connection):
+            self.get_layout(self.get_index_row(index_name, connection)).drop(connection)
+            connection.execute('DELETE FROM search_indexes WHERE uid = ?', (index_name,))
+            return {'deletedDocuments': None}
+
+        return self.run_task(index_name, 'indexDeletion', delete)
+
+    def swap_indexes(self, index_name, other_index_name):
+        """
+        Atomically swap the documents and settings of two indexes.
+        """
+        def swap(connection):
+            if self.get_index_row(other_index_name, connection) is None:
+                raise SearchError(
+                    f'Index `{other_index_name}` not found.', 'index_not_found', 404
+                )
+            temporary_name = f'\0{index_name}'
+            for old, new in ((index_name, temporary_name), (other_index_name, index_name),
+                             (temporary_name, other_index_name)):
+                connection.execute('UPDATE search_indexes SET uid = ? WHERE uid = ?', (new, old))
+            return {'swaps': [{'indexes': [index_name, other_index_name]}]}
+
+        return self.run_task(index_name, 'indexSwap', swap)
+
+    def get_tasks(self, task_uids):
+        """
+        Get the tasks matching the given uids.
+        """
+        tasks = []
+        for chunk in chunks(task_uids):
+            rows = self.connection.execute(
+                'SELECT uid, index_uid, status, type, details, error, enqueued_at, started_at, '
+                f"finished_at FROM search_tasks WHERE uid IN ({', '.join('?' * len(chunk))})",
+                chunk
+            ).fetchall()
+            tasks.extend(
+                Task(
+                    uid=uid, indexUid=index_uid, status=status, type=task_type,
+                    details=json.loads(details) if details else None,
+                    error=json.loads(error) if error else None,
+                    enqueuedAt=enqueued_at, startedAt=started_at, finishedAt=finished_at
+                )
+                for uid, index_uid, status, task_type, details, error, enqueued_at, started_at,
+                finished_at in rows
+            )
+        return tasks
+
+    def search_index(self, index_name, params, rule=None):
+        """
+        Search an index with Meilisearch search parameters.
+
+        Supported parameters are q, filter, sort, limit, offset and attributesToRetrieve.
+        Like Meilisearch, only the first ``pagination.maxTotalHits`` hits of the index
+        settings (1000 by default) can be reached.
+
+        :param index_name: The name of the index.
+        :param params: Search parameters.
+        :param rule: Filter enforced on top of the filter of the parameters.
+        :return: Search response in the Meilisearch format.
+        """
+        # pylint: disable=too-many-locals
+        started_at = time.monotonic()
+        row = self.get_index_row(index_name)
+        if row is None:
+            raise SearchError(f'Index `{index_name}` not found.', 'index_not_found', 404)
+        layout = self.get_layout(row)
+        try:
+            limit = int(params.get('limit', DEFAULT_SEARCH_LIMIT))
+            offset = int(params.get('offset', 0))
+        except (TypeError, ValueError) as err:
+            raise SearchError('Invalid limit or offset.', code='invalid_search_limit') from err
+        tree = combine_filters(rule, params.get('filter'))
+        where, where_params = FilterCompiler(layout).compile(tree) if tree else ('1', [])
+        order = self._order_by(layout, params.get('sort'))
+        match = match_query(params.get('q'))
+        if match:
+            source = (
+                f'{layout.fts} JOIN {layout.documents} d ON d.rowid = {layout.fts}.rowid '
+                f'WHERE {layout.fts} MATCH ? AND {where}'
+            )
+            source_params = [match] + where_params
+            order.append(layout.bm25())
+        else:
+            source = f'{layout.documents} d WHERE {where}'
+            source_params = where_params
+        order.append('d.rowid')
+        offset = max(offset, 0)
+        window = max(min(limit, layout.max_total_hits - offset), 0)
+        connection = self.connection
+        total = connection.execute(f'SELECT count(*) FROM {source}', source_params).fetchone()[0]
+        bodies = connection.execute(
+            f"SELECT d.body FROM {source} ORDER BY {', '.join(order)} LIMIT ? OFFSET ?",
+            source_params + [window, offset]
+        ).fetchall()
+        retrieve = params.get('attributesToRetrieve') or ['*']
+        if isinstance(retrieve, str):
+            retrieve = retrieve.split(',')
+        return {
+            'hits': [self._hit(json.loads(body), layout.displayed, retrieve) for body, in bodies],
+            'query': params.get('q') or '',
+            'processingTimeMs': int((time.monotonic() - started_at) * 1000),
+            'limit': limit,
+            'offset': offset,
+            'estimatedTotalHits': min(total, layout.max_total_hits),
+        }
+
+    @staticmethod
+    def _order_by(layout, sort):
+        order = []
+        if isinstance(sort, str):
+            sort = sort.split(',')
+        for criterion in sort or ():
+            attribute, _, direction = criterion.strip().rpartition(':')
+            if attribute not in layout.sortable or direction not in ('asc', 'desc'):
+                raise SearchError(
+                    f"Invalid sort criterion `{criterion}`. Available sortable attributes are: "
+                    f"{', '.join(layout.sortable) or 'none'}.", code='invalid_search_sort'
+                )
+            order.append(f'd.{layout.column(attribute)} {direction.upper()}')
+        return order
+
+    @staticmethod
+    def _hit(document, displayed, retrieve):
+        names = [name for name in retrieve if name == '*' or '*' in displayed or name in displayed]
+        if '*' not in names:
+            return {name: document[name] for name in names if name in document}
+        if '*' in displayed:
+            return document
+        return {name: document[name] for name in displayed if name in document}
+
+    def search(self, token, index_name, params):
+        """
+        Search an index on behalf of the holder of a token, enforcing its search rules.
+
+        The token must still be the stored token of its holder, so deleting or rotating the
+        SearchEngineToken row revokes it before it expires.
+        """
+        user_id, search_rules = read_search_token(token, self.secret)
+        if not SearchEngineToken.objects.filter(
+                user_id=user_id, token=token, search_engine=self.SEARCH_ENGINE
+        ).exists():
+            raise SearchError(
+                'The provided API key is invalid.', code='invalid_api_key', status_code=403
+            )
+        rule = index_filter(search_rules, index_name)
+        return self.search_index(index_name, params, rule=rule)
+
+    def _prepare_user_token(self, index_search_rules):
+        response = {
+            "url": self.public_url,
+            "token_type": "Bearer",
+            "expires_at": self.token_expires_at,
+            "search_engine": self.SEARCH_ENGINE,
+            "index_search_rules": index_search_rules
+        }
+        return response, fingerprint_search_rules(index_search_rules)
+
+    def _is_reusable(self, token, fingerprint):
+        return bool(token) and token.search_engine == self.SEARCH_ENGINE and (
+            token.rules_fingerprint == fingerprint
+        )
+
+    def _sign_user_token(self, response, index_search_rules, fingerprint):
+        with TOKEN_STAGES.time('sign'):
+            token = sign_search_token(
+                self.request.user.id, index_search_rules, self.token_expires_at, self.secret
+            )
+        response.update(token=token)
+        return {
+            'token': token,
+            'token_type': "Bearer",
+            'expires_at': self.token_expires_at,
+            'search_engine': self.SEARCH_ENGINE,
+            'index_search_rules': index_search_rules or {},
+            'api_key_uid': '',
+            'rules_fingerprint': fingerprint,
+        }
+
+    def get_user_token(self, index_search_rules=None):
+        """
+        Generate a user token validated by the search view of this application.
+        """
+        response, fingerprint = self._prepare_user_token(index_search_rules)
+        user = self.request.user
+        with TOKEN_STAGES.time('cache_get'):
+            cached_response = token_cache.get(
+                user.id, index_search_rules, namespace=self.SEARCH_ENGINE
+            )
+        if cached_response is not None:
+            return cached_response
+        with token_cache.lock(user.id):
+            with TOKEN_STAGES.time('get_active_token'):
+                token = SearchEngineToken.get_active_token(user)
+            if self._is_reusable(token, fingerprint):
+                response.update(
+                    expires_at=token.expires_at, token=token.token,
+                    index_search_rules=token.index_search_rules
+                )
+            else:
+                defaults = self._sign_user_token(response, index_search_rules, fingerprint)
+                with TOKEN_STAGES.time('store_token'):
+                    SearchEngineToken.objects.update_or_create(defaults=defaults, user=user)
+            with TOKEN_STAGES.time('cache_set'):
+                token_cache.set(
+                    user.id, index_search_rules, response, namespace=self.SEARCH_ENGINE
+                )
+        return response
+
+    def build_user_token(self, token=None, api_key=None, force=False):
+        """
+        Sign the token of the request user without writing it, no engine key is involved.
+        """
+        index_search_rules = self.get_search_rules()
+        response, fingerprint = self._prepare_user_token(index_search_rules)
+        if not force and self._is_reusable(token, fingerprint):
+            return None, None
+        return self._sign_user_token(response, index_search_rules, fingerprint), None
+
+    def delete_key(self, key_uid):
+        """
+        Tokens are signed locally, there is no engine key to revoke. A token is revoked by
+        deleting its SearchEngineToken row instead.
+        """
+
+    def get_search_rules(self, search_rules=None):
+        """
+        Get search rules of the configured index configuration class.
+        """
+        index_config = getattr(
+            settings,
+            'INDEX_CONFIGURATION_CLASS',
+            'openedx_search_api.drivers.meilisearch.BaseIndexConfiguration'
+        )
+        klass = get_index_configuration_class(index_config)
+        return klass(self.request).get_search_rules(search_rules=search_rules or [])
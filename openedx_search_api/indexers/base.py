@@ -2,19 +2,82 @@
 Base indexer module for MeiliSearch integration with Django.
 """
 
+from django.core.exceptions import ImproperlyConfigured
 from django.db.models import QuerySet
+from rest_framework import serializers
 from rest_framework.serializers import Serializer
 
 from ..drivers.meilisearch import MeiliSearchEngine
+from .checkpoints import CheckpointRecorder
+from .encoding import UPLOAD_FORMAT_JSON, UPLOAD_FORMAT_NDJSON_GZIP, UPLOAD_FORMATS, encode_ndjson
+from .fingerprints import FingerprintStore
+from .pipeline import IndexingPipeline
+from .serializers import (
+    SERIALIZER_DRF,
+    SERIALIZER_VALUES,
+    get_values_serializer,
+    project,
+    row_pk
+)
 
+DEFAULT_BATCH_SIZE = 1000
 
-class BaseIndexer:
+
+def get_model_serializer(model_class, list_fields=None, list_exclude=None):
+    """
+    Create a serializer class for the given model.
+
+    :param model_class: The Django model class.
+    :param list_fields: Fields to include in the serializer.
+    :param list_exclude: Fields to exclude from the serializer.
+    :return: A serializer class for the model.
+    """
+
+    class BaseSerializer(serializers.ModelSerializer):
+        """
+        Serializer class for the model.
+        """
+
+        # pylint: disable=too-few-public-methods
+        class Meta:
+            """
+            Meta class for the serializer.
+            """
+            model = model_class
+            fields = list_fields or []
+            exclude = list_exclude or []
+
+    return BaseSerializer
+
+
+def get_index_serializer(model_class, config):
+    """
+    Create the serializer class of a model_class index configuration.
+
+    :param model_class: The Django model class.
+    :param config: Index configuration, ``serializer`` picks drf (default) or values.
+    :return: A DRF serializer or ValuesSerializer class.
+    """
+    serializer = config.get('serializer', SERIALIZER_DRF)
+    if serializer == SERIALIZER_VALUES:
+        return get_values_serializer(model_class, list_fields=config.get('fields'))
+    if serializer != SERIALIZER_DRF:
+        raise ImproperlyConfigured(
+            f"Unknown serializer {serializer}, expected {SERIALIZER_DRF} or {SERIALIZER_VALUES}"
+        )
+    return get_model_serializer(model_class, list_fields=config.get('fields'))
+
+
+class BaseIndexer:  # pylint: disable=too-many-instance-attributes
     """
     Base class for indexing documents in MeiliSearch.
     """
 
+    # pylint: disable=too-many-arguments, too-many-positional-arguments
     def __init__(self, index_name: str, queryset: QuerySet,
-                 serializer_class: type(Serializer), client: MeiliSearchEngine):
+                 serializer_class: type(Serializer), client: MeiliSearchEngine,
+                 batch_size: int = None, fingerprints: FingerprintStore = None,
+                 upload_format: str = None, checkpoint: CheckpointRecorder = None):
         """
         Initialize the BaseIndexer.
 
@@ -22,23 +85,142 @@ class BaseIndexer:
         :param queryset: Django QuerySet to be indexed.
         :param serializer_class: Serializer class to serialize the queryset data.
         :param client: Instance of MeiliSearchEngine.
+        :param batch_size: Number of rows fetched, serialized and sent per request.
+        :param fingerprints: Optional store used to skip documents unchanged since last load.
+        :param upload_format: One of json (default), ndjson and ndjson+gzip.
+        :param checkpoint: Optional recorder persisting the progress after every batch.
         """
         self.queryset = queryset
         self.serializer_class = serializer_class
         self.client = client
         self.index_name = index_name
+        self.batch_size = batch_size or DEFAULT_BATCH_SIZE
+        self.fingerprints = fingerprints
+        self.checkpoint = checkpoint
+        self.upload_format = upload_format or UPLOAD_FORMAT_JSON
+        if self.upload_format not in UPLOAD_FORMATS:
+            raise ImproperlyConfigured(
+                f"Unknown upload_format {upload_format}, expected one of {UPLOAD_FORMATS}"
+            )
+
+    def iter_batches(self):
+        """
+        Walk the queryset in primary key order, one chunk of ``batch_size`` rows at a time.
+
+        Each chunk is fetched with a ``pk > last_pk`` keyset query, so only one chunk
+        of rows is held in memory at once regardless of the table size. Rows are model
+        instances, or values_list tuples for a ValuesSerializer.
+
+        :return: Generator of lists of rows.
+        """
+        queryset = self.queryset.order_by('pk')
+        last_pk = None
+        while True:
+            chunk = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+            rows = list(project(chunk, self.serializer_class)[:self.batch_size])
+            if not rows:
+                return
+            yield rows
+            if len(rows) < self.batch_size:
+                return
+            last_pk = row_pk(rows[-1])
+
+    def serialize(self, rows):
+        """
+        Serialize one batch of rows into documents.
+
+        :param rows: List of rows.
+        :return: List of documents.
+        """
+        serializer: Serializer = self.serializer_class(rows, many=True)
+        if self.fingerprints is not None:
+            return self.fingerprints.changed(serializer.data)
+        return serializer.data
 
-    def index(self, settings=None, options=None):
+    def index(self, settings=None, options=None, workers=None, max_in_flight=None):
         """
         Index the queryset data in MeiliSearch.
 
+        The queryset is streamed in batches and every batch is sent with its own
+        request in the configured upload format. When ``workers`` is set, batches go through an
+        IndexingPipeline so database reads, serialization and uploads overlap.
+
         :param settings: Optional settings for the index.
         :param options: Optional options for the index creation.
-        :return: Response from MeiliSearch add_documents API.
+        :param workers: Optional number of concurrent uploader threads.
+        :param max_in_flight: Optional bound on the batches queued between pipeline stages.
+        :return: List of responses from MeiliSearch add_documents API, one per batch with
+            documents to send.
         """
-        serializer: Serializer = self.serializer_class(self.queryset, many=True)
         index = self.client.index(self.index_name, index_settings=settings, options=options)
-        return index.add_documents(serializer.data)
+        batches = ((row_pk(rows[-1]), rows) for rows in self.iter_batches())
+        return self.load_batches(index, batches, self.serialize, workers, max_in_flight)
+
+    def load_batches(  # pylint: disable=too-many-arguments, too-many-positional-arguments
+            self, index, batches, serialize, workers=None, max_in_flight=None
+    ):
+        """
+        Serialize and upload batches, recording every accepted batch in the checkpoint.
+
+        :param index: MeiliSearch index.
+        :param batches: Iterable of (cursor, raw batch) pairs, the cursor being the position
+            to resume from once the batch is loaded.
+        :param serialize: Callable turning a raw batch into a list of documents.
+        :param workers: Optional number of concurrent uploader threads.
+        :param max_in_flight: Optional bound on the batches queued between pipeline stages.
+        :return: List of responses from MeiliSearch, one per batch with documents to send.
+        """
+        checkpoint = self.checkpoint
+
+        def read():
+            for item in enumerate(batches):
+                if checkpoint is not None:
+                    checkpoint.save()
+                yield item
+
+        def prepare(item):
+            sequence, (cursor, batch) = item
+            return sequence, cursor, serialize(batch)
+
+        def upload(item):
+            sequence, cursor, documents = item
+            task_info = self.send(index, documents)
+            if checkpoint is not None:
+                checkpoint.record(sequence, cursor, task_info)
+            return task_info
+
+        try:
+            if workers:
+                pipeline = IndexingPipeline(workers=workers, max_in_flight=max_in_flight)
+                results = pipeline.run(read(), prepare, upload)
+            else:
+                results = [upload(prepare(item)) for item in read()]
+        finally:
+            if checkpoint is not None:
+                checkpoint.save()
+        return [task_info for task_info in results if task_info is not None]
+
+    def send(self, index, documents):
+        """
+        Upload one batch of documents in the configured format.
+
+        NDJSON payloads are encoded one document at a time, optionally through an
+        incremental gzip stream, and posted as raw bytes.
+
+        :param index: MeiliSearch index.
+        :param documents: List of documents.
+        :return: Response from MeiliSearch, None when there is nothing to send.
+        """
+        if not documents:
+            return None
+        if self.upload_format == UPLOAD_FORMAT_JSON:
+            return index.add_documents(documents)
+        compress = self.upload_format == UPLOAD_FORMAT_NDJSON_GZIP
+        return self.client.add_documents_ndjson(
+            self.index_name,
+            encode_ndjson(documents, compress=compress),
+            content_encoding='gzip' if compress else None
+        )
 
     def index_documents(self, documents: list, settings=None, options=None):
         """
@@ -50,4 +232,30 @@ class BaseIndexer:
         :return: Response from MeiliSearch add_documents API.
         """
         index = self.client.index(self.index_name, index_settings=settings, options=options)
-        return index.add_documents(documents)
+        return self.send(index, documents)
+
+    def index_content(  # pylint: disable=too-many-arguments, too-many-positional-arguments
+            self, batches, settings=None, options=None, workers=None, max_in_flight=None
+    ):
+        """
+        Index the batches produced by a content source as they are produced.
+
+        When ``workers`` is set, batches go through an IndexingPipeline so the source keeps
+        producing the next batches while the previous ones are uploaded.
+
+        :param batches: Iterable of (documents, cursor) pairs.
+        :param settings: Optional settings for the index.
+        :param options: Optional options for the index creation.
+        :param workers: Optional number of concurrent uploader threads.
+        :param max_in_flight: Optional bound on the batches queued between pipeline stages.
+        :return: Tuple of the responses from MeiliSearch and the cursor of the last batch.
+        """
+        index = self.client.index(self.index_name, index_settings=settings, options=options)
+        state = {'cursor': None}
+
+        def read():
+            for documents, cursor in batches:
+                state['cursor'] = cursor
+                yield cursor, documents
+
+        return self.load_batches(index, read(), list, workers, max_in_flight), state['cursor']
@@ -0,0 +1,101 @@
+"""
+Checkpoints of running index loads, used to resume interrupted loads.
+"""
+
+import threading
+
+from ..models import IndexCheckpoint
+
+
+class CheckpointRecorder:  # pylint: disable=too-many-instance-attributes
+    """
+    Persist the progress of an index load after every batch accepted by the search engine.
+
+    Batches may be accepted out of order when uploads run concurrently, so the cursor only
+    moves past a batch once every batch before it was accepted as well. Uploader threads
+    only ``record`` the progress, ``save`` writes it from the thread owning the load so
+    concurrent uploads never contend for the database. Resuming from the saved cursor never
+    skips a batch, at worst a few batches are sent again.
+    """
+
+    def __init__(self, index_name, target_name, checkpoint=None):
+        """
+        Initialize the recorder.
+
+        :param index_name: Name of the index in the configuration.
+        :param target_name: Name of the search engine index receiving the documents.
+        :param checkpoint: Optional IndexCheckpoint to resume from.
+        """
+        self.index_name = index_name
+        self.target_name = target_name
+        self.cursor = checkpoint.cursor if checkpoint else None
+        self.batches = checkpoint.batches if checkpoint else 0
+        self.task_uids = list(checkpoint.task_uids) if checkpoint else []
+        self.resumed_task_uids = tuple(self.task_uids)
+        self._next = 0
+        self._accepted = {}
+        self._dirty = False
+        self._lock = threading.Lock()
+
+    @classmethod
+    def start(cls, index_name, target_name, resume=False):
+        """
+        Returns recorder of a new load, continuing the stored checkpoint when resuming.
+
+        :param index_name: Name of the index in the configuration.
+        :param target_name: Name of the search engine index receiving the documents.
+        :param resume: Whether to continue from the stored checkpoint.
+        :return: CheckpointRecorder.
+        """
+        checkpoints = IndexCheckpoint.objects.filter(index_name=index_name)
+        if resume:
+            return cls(index_name, target_name, checkpoints.filter(target_name=target_name).first())
+        checkpoints.delete()
+        return cls(index_name, target_name)
+
+    @property
+    def resumed(self):
+        """
+        Returns whether the load continues a previous one
+        :return:
+        """
+        return bool(self.batches)
+
+    def record(self, sequence, cursor, task_info):
+        """
+        Record a batch accepted by the search engine.
+
+        :param sequence: Position of the batch in the current run, starting at 0.
+        :param cursor: Position to resume from once this batch is loaded.
+        :param task_info: Task of the batch, None when the batch had nothing to send.
+        """
+        with self._lock:
+            self._accepted[sequence] = (cursor, task_info)
+            while self._next in self._accepted:
+                cursor, task_info = self._accepted.pop(self._next)
+                self._next += 1
+                self.cursor = cursor
+                self.batches += 1
+                self._dirty = True
+                if task_info is not None:
+                    self.task_uids.append(task_info.task_uid)
+
+    def save(self):
+        """
+        Store the progress recorded since the last save.
+        """
+        with self._lock:
+            if not self._dirty:
+                return
+            self._dirty = False
+            defaults = {
+                'target_name': self.target_name, 'cursor': self.cursor,
+                'batches': self.batches, 'task_uids': list(self.task_uids),
+            }
+        IndexCheckpoint.objects.update_or_create(index_name=self.index_name, defaults=defaults)
+
+    def clear(self):
+        """
+        Drop the checkpoint once the load is complete.
+        """
+        IndexCheckpoint.objects.filter(index_name=self.index_name).delete()
@@ -0,0 +1,68 @@
+"""
+Streaming protocol of ``content_class`` index sources.
+
+A content class exposes either or both of:
+
+``fetch()``
+    Returns the documents of the index as a list or any iterable. Items may be documents
+    or lists of documents, which are then uploaded as produced.
+
+``fetch_batches(cursor=None)``
+    Yields ``(documents, cursor)`` pairs, ``cursor`` being any JSON serializable value
+    from which ``fetch_batches`` can resume producing the following batches.
+
+Resuming a source only implementing ``fetch`` produces it again and skips the batches
+already loaded.
+"""
+
+from itertools import islice
+
+
+def group_documents(items, batch_size):
+    """
+    Group an iterable of documents into lists of at most ``batch_size`` documents.
+
+    Lists found in the iterable are batches already built by the source, they are
+    yielded as they are after the documents accumulated before them.
+
+    :param items: Iterable of documents or of lists of documents.
+    :param batch_size: Maximum number of accumulated documents per batch.
+    :return: Generator of lists of documents.
+    """
+    items = iter(items)
+    pending = []
+    while True:
+        chunk = list(islice(items, batch_size - len(pending)))
+        if not chunk:
+            break
+        for item in chunk:
+            if isinstance(item, (list, tuple)):
+                if pending:
+                    yield pending
+                    pending = []
+                if item:
+                    yield list(item)
+            else:
+                pending.append(item)
+        if len(pending) >= batch_size:
+            yield pending
+            pending = []
+    if pending:
+        yield pending
+
+
+def iter_content_batches(source, batch_size, cursor=None, skip=0):
+    """
+    Walk the batches of a content source.
+
+    :param source: Instance of a content class.
+    :param batch_size: Batch size used for sources only implementing fetch.
+    :param cursor: Optional cursor to resume a fetch_batches source from.
+    :param skip: Number of leading batches to drop when resuming a fetch source.
+    :return: Generator of (documents, cursor) pairs.
+    """
+    if hasattr(source, 'fetch_batches'):
+        yield from source.fetch_batches(cursor=cursor)
+        return
+    for documents in islice(group_documents(source.fetch(), batch_size), skip, None):
+        yield documents, None
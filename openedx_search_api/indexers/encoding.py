@@ -0,0 +1,69 @@
+"""
+Encoding of documents into NDJSON upload payloads.
+"""
+
+import json
+import zlib
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+UPLOAD_FORMAT_JSON = 'json'
+UPLOAD_FORMAT_NDJSON = 'ndjson'
+UPLOAD_FORMAT_NDJSON_GZIP = 'ndjson+gzip'
+UPLOAD_FORMATS = (UPLOAD_FORMAT_JSON, UPLOAD_FORMAT_NDJSON, UPLOAD_FORMAT_NDJSON_GZIP)
+
+_json_encoder = DjangoJSONEncoder(separators=(',', ':'))
+
+
+def encode_document(document):
+    """
+    Returns one document encoded as a JSON line.
+
+    orjson is used when installed, the standard library encoder otherwise. Types neither
+    supports natively are encoded like Django does.
+
+    :param document: Document to encode.
+    :return: Bytes ending with a newline.
+    """
+    if orjson is not None:
+        return orjson.dumps(
+            document, default=_json_encoder.default, option=orjson.OPT_APPEND_NEWLINE
+        )
+    return (_json_encoder.encode(document) + '\n').encode()
+
+
+def encode_ndjson(documents, compress=False):
+    """
+    Encode documents into an NDJSON payload, one line at a time.
+
+    When compressing, every line goes straight through an incremental gzip stream so the
+    uncompressed payload is never held in memory.
+
+    :param documents: Iterable of documents.
+    :param compress: Whether to gzip the payload.
+    :return: Bytes payload.
+    """
+    if not compress:
+        return b''.join(encode_document(document) for document in documents)
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+    chunks = [compressor.compress(encode_document(document)) for document in documents]
+    chunks.append(compressor.flush())
+    return b''.join(chunks)
+
+
+def decode_ndjson(payload, compressed=False):
+    """
+    Returns documents of an NDJSON payload.
+
+    :param payload: Bytes payload.
+    :param compressed: Whether the payload is gzipped.
+    :return: List of documents.
+    """
+    if compressed:
+        payload = zlib.decompress(payload, wbits=zlib.MAX_WBITS | 16)
+    return [json.loads(line) for line in payload.splitlines() if line]
@@ -0,0 +1,148 @@
+"""
+Change detection of indexed documents through stored content hashes.
+"""
+
+import hashlib
+import json
+import threading
+import uuid
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection
+from django.db.models import F
+
+from ..models import DocumentFingerprint
+
+WRITE_BATCH_SIZE = 1000
+
+
+def fingerprint_document(document):
+    """
+    Returns signed 64-bit hash of the canonical JSON form of a document.
+
+    :param document: Serialized document.
+    :return: Integer fitting a BigIntegerField.
+    """
+    payload = json.dumps(document, sort_keys=True, separators=(',', ':'), cls=DjangoJSONEncoder)
+    digest = hashlib.blake2b(payload.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'big', signed=True)
+
+
+class FingerprintStore:
+    """
+    Per-index map of document primary keys to the hash of their last sent version.
+
+    ``changed`` drops the documents whose hash matches the stored one and writes the hashes
+    of the others as pending rows tagged with the run, one batch at a time, so the memory of a
+    load does not grow with the table. Pending hashes only replace the stored ones in
+    ``commit``, once the caller knows the search engine processed the uploads, so a failed load
+    never hides documents from the next one. A document sent by two concurrent runs is only
+    promoted by the last one which tagged it.
+    """
+
+    def __init__(self, index_name, primary_key='id'):
+        """
+        Initialize the store.
+
+        :param index_name: Name of the index.
+        :param primary_key: Document field holding the primary key.
+        """
+        self.index_name = index_name
+        self.primary_key = primary_key
+        self.run = uuid.uuid4().hex
+        self.skipped = 0
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        """
+        Returns picklable state, stores are sent back by the processes of parallel loads.
+        """
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def changed(self, documents):
+        """
+        Returns the documents added or changed since the last committed load.
+
+        :param documents: List of serialized documents.
+        :return: List of documents to send.
+        """
+        if any(self.primary_key not in document for document in documents):
+            return documents
+        keyed = [
+            (str(document[self.primary_key]), fingerprint_document(document), document)
+            for document in documents
+        ]
+        stored = dict(
+            DocumentFingerprint.objects.filter(
+                index_name=self.index_name,
+                document_id__in=[document_id for document_id, _, _ in keyed]
+            ).values_list('document_id', 'fingerprint')
+        )
+        changed = [entry for entry in keyed if stored.get(entry[0]) != entry[1]]
+        with self._lock:
+            self.skipped += len(documents) - len(changed)
+        self.stage(changed)
+        return [document for _, _, document in changed]
+
+    def stage(self, changed):
+        """
+        Write the hashes of changed documents as pending rows of this run.
+
+        :param changed: List of (document id, hash, document) tuples.
+        """
+        options = {
+            'update_conflicts': True, 'update_fields': ['pending_fingerprint', 'pending_run']
+        }
+        if connection.features.supports_update_conflicts_with_target:
+            options['unique_fields'] = ['index_name', 'document_id']
+        DocumentFingerprint.objects.bulk_create(
+            [
+                DocumentFingerprint(
+                    index_name=self.index_name, document_id=document_id,
+                    pending_fingerprint=fingerprint, pending_run=self.run
+                )
+                for document_id, fingerprint, _ in changed
+            ],
+            batch_size=WRITE_BATCH_SIZE,
+            **options
+        )
+
+    def pending(self):
+        """
+        Returns queryset of the rows staged by this run.
+        """
+        return DocumentFingerprint.objects.filter(index_name=self.index_name, pending_run=self.run)
+
+    def commit(self):
+        """
+        Replace the stored hashes with the pending ones.
+        """
+        self.pending().update(
+            fingerprint=F('pending_fingerprint'), pending_fingerprint=None, pending_run=''
+        )
+
+    def discard(self):
+        """
+        Drop the pending hashes.
+        """
+        self.pending().filter(fingerprint__isnull=True).delete()
+        self.pending().update(pending_fingerprint=None, pending_run='')
+
+    @staticmethod
+    def invalidate(index_name, document_ids=None):
+        """
+        Forget stored hashes so the documents are sent again by the next load.
+
+        :param index_name: Name of the index.
+        :param document_ids: Optional primary keys, every document of the index by default.
+        """
+        fingerprints = DocumentFingerprint.objects.filter(index_name=index_name)
+        if document_ids is not None:
+            fingerprints = fingerprints.filter(document_id__in=[str(pk) for pk in document_ids])
+        fingerprints.delete()
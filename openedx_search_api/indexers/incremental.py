@@ -0,0 +1,216 @@
+"""
+Incremental indexing of model changes collected from Django signals.
+"""
+
+import logging
+import threading
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connections
+
+from ..drivers import DriverFactory
+from .base import DEFAULT_BATCH_SIZE, get_index_serializer
+from .fingerprints import FingerprintStore
+from .serializers import project, row_pk
+
+log = logging.getLogger(__name__)
+
+DEFAULT_FLUSH_INTERVAL = 5
+
+
+class IncrementalIndexBuffer:
+    """
+    Per-process buffer of changed primary keys waiting to be sent to the search engine.
+
+    Changes are coalesced per index: saving the same row many times keeps a single pending
+    upsert and a delete cancels a pending upsert of the same row. The buffer is flushed once
+    ``flush_interval`` seconds have passed since the first pending change or as soon as
+    ``max_batch_size`` changes are pending, whichever comes first. Flushes run in a background
+    thread, never in the request which saved the rows, and changes whose flush failed are put
+    back in the buffer to be sent by the next one.
+    """
+
+    def __init__(self, flush_interval=None, max_batch_size=None):
+        """
+        Initialize the buffer.
+
+        :param flush_interval: Seconds to wait before flushing pending changes.
+        :param max_batch_size: Number of pending changes triggering an immediate flush.
+        """
+        self.flush_interval = flush_interval if flush_interval is not None else getattr(
+            settings, 'SEARCH_INCREMENTAL_FLUSH_INTERVAL', DEFAULT_FLUSH_INTERVAL
+        )
+        self.max_batch_size = max_batch_size or getattr(
+            settings, 'SEARCH_INCREMENTAL_BATCH_SIZE', DEFAULT_BATCH_SIZE
+        )
+        self._lock = threading.Lock()
+        self._timer = None
+        self._flusher = None
+        self._upserts = {}
+        self._deletes = {}
+
+    def __len__(self):
+        with self._lock:
+            return self._size()
+
+    def _size(self):
+        return sum(map(len, self._upserts.values())) + sum(map(len, self._deletes.values()))
+
+    def add(self, index_name, pk, deleted=False):
+        """
+        Record a changed row of an index.
+
+        :param index_name: Name of the index the row belongs to.
+        :param pk: Primary key of the changed row.
+        :param deleted: Whether the row was deleted.
+        """
+        with self._lock:
+            upserts = self._upserts.setdefault(index_name, set())
+            deletes = self._deletes.setdefault(index_name, set())
+            if deleted:
+                upserts.discard(pk)
+                deletes.add(pk)
+            else:
+                deletes.discard(pk)
+                upserts.add(pk)
+            if not self._flush_due():
+                self._schedule()
+            elif self._flusher is None:
+                self._flusher = threading.Thread(target=self._flush_in_background, daemon=True)
+                self._flusher.start()
+
+    def _flush_due(self):
+        """
+        Returns whether pending changes must be flushed without waiting for the timer, the
+        lock being held by the caller
+        :return:
+        """
+        size = self._size()
+        return bool(size) and (size >= self.max_batch_size or not self.flush_interval)
+
+    def _schedule(self):
+        """
+        Start the flush timer unless one is pending, the lock being held by the caller.
+        """
+        if self._timer is None and self.flush_interval:
+            self._timer = threading.Timer(self.flush_interval, self._flush_in_background)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def join(self, timeout=None):
+        """
+        Wait for the last flush started in the background by ``add`` to finish.
+
+        :param timeout: Seconds to wait at most, None waiting as long as it takes.
+        """
+        flusher = self._flusher
+        if flusher is not None:
+            flusher.join(timeout)
+
+    def _flush_in_background(self):
+        """
+        Flush pending changes from a background thread and release its database connections.
+
+        The flusher started by ``add`` keeps flushing while changes recorded in the meantime
+        are due, so a single thread sends them.
+        """
+        current = threading.current_thread()
+        try:
+            while True:
+                self.flush()
+                with self._lock:
+                    if not self._flush_due():
+                        if self._flusher is current:
+                            self._flusher = None
+                        break
+        except Exception:  # pylint: disable=broad-exception-caught
+            log.exception("Unable to flush incremental index changes")
+            with self._lock:
+                if self._flusher is current:
+                    self._flusher = None
+        finally:
+            connections.close_all()
+
+    def flush(self):
+        """
+        Send every pending change to the search engine.
+
+        Upserted rows are re-read and serialized in batches, deleted rows of an index are
+        removed with one delete_documents call. Stored content hashes of the changed rows
+        are dropped so the next load sends them again. When sending fails, the changes of the
+        indexes not flushed yet are put back in the buffer before the error is raised.
+        """
+        with self._lock:
+            upserts, deletes = self._upserts, self._deletes
+            self._upserts, self._deletes = {}, {}
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        if not any(upserts.values()) and not any(deletes.values()):
+            return
+        try:
+            self._send(upserts, deletes)
+        except BaseException:
+            self._restore(upserts, deletes)
+            raise
+
+    def _restore(self, upserts, deletes):
+        """
+        Put back changes which could not be sent, changes recorded since taking precedence.
+        """
+        with self._lock:
+            for index_name, pks in upserts.items():
+                newer = self._deletes.get(index_name, set())
+                self._upserts.setdefault(index_name, set()).update(set(pks) - newer)
+            for index_name, pks in deletes.items():
+                newer = self._upserts.get(index_name, set())
+                self._deletes.setdefault(index_name, set()).update(set(pks) - newer)
+            self._schedule()
+
+    def _send(self, upserts, deletes):
+        """
+        Send the changes of every index, removing the changes of an index from the given
+        dicts once they are sent.
+        """
+        index_configurations = getattr(settings, 'INDEX_CONFIGURATIONS', {})
+        client = DriverFactory.get_client(None)
+        for index_name in set(upserts) | set(deletes):
+            config = index_configurations[index_name]
+            index = client.index(
+                index_name, index_settings=config.get('settings', {}), options=config.get('options')
+            )
+            deleted = set(deletes.get(index_name, ()))
+            deleted |= self.upsert(index, config, upserts.get(index_name, ()))
+            if deleted:
+                index.delete_documents(sorted(deleted))
+            FingerprintStore.invalidate(
+                index_name, set(upserts.get(index_name, ())) | deleted
+            )
+            upserts.pop(index_name, None)
+            deletes.pop(index_name, None)
+
+    def upsert(self, index, config, pks):
+        """
+        Send the current state of the given rows to an index.
+
+        :param index: Search engine index.
+        :param config: Index configuration.
+        :param pks: Primary keys of the changed rows.
+        :return: Primary keys of the rows which no longer exist.
+        """
+        if not pks:
+            return set()
+        model_klass = apps.get_model(*config['model_class'].split('.'))
+        serializer_klass = get_index_serializer(model_klass, config)
+        batch_size = config.get('batch_size') or DEFAULT_BATCH_SIZE
+        pks = sorted(pks)
+        missing = set(pks)
+        for start in range(0, len(pks), batch_size):
+            rows = list(project(
+                model_klass.objects.filter(pk__in=pks[start:start + batch_size]), serializer_klass
+            ))
+            if rows:
+                index.add_documents(serializer_klass(rows, many=True).data)
+            missing.difference_update(row_pk(row) for row in rows)
+        return missing
@@ -0,0 +1,137 @@
+"""
+Producer/consumer pipeline to overlap database reads, serialization and uploads.
+"""
+
+import queue
+import threading
+
+from django.db import connections
+
+_DONE = object()
+
+
+class IndexingPipeline:  # pylint: disable=too-few-public-methods
+    """
+    Run the reader, serializer and uploader stages of an index load concurrently.
+
+    The reader stage runs in the calling thread and pulls batches out of the ``batches``
+    iterable (typically database chunks). A serializer thread turns each batch into documents
+    and a pool of ``workers`` uploader threads sends them to the search engine. Both hand-off
+    queues are bounded by ``max_in_flight`` so a slow engine applies backpressure on the reader
+    instead of letting serialized batches pile up in memory.
+    """
+
+    def __init__(self, workers=1, max_in_flight=None):
+        """
+        Initialize the pipeline.
+
+        :param workers: Number of uploader threads.
+        :param max_in_flight: Maximum number of batches queued between two stages.
+        """
+        self.workers = max(int(workers or 1), 1)
+        self.max_in_flight = max(int(max_in_flight or self.workers * 2), 1)
+        self._stop = threading.Event()
+        self._errors = []
+
+    def _put(self, target_queue, item):
+        """
+        Put an item on a bounded queue without blocking forever when another stage failed.
+        """
+        while not self._stop.is_set():
+            try:
+                target_queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, source_queue):
+        """
+        Get an item from a queue, returning the end marker once another stage failed.
+        """
+        while not self._stop.is_set():
+            try:
+                return source_queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _DONE
+
+    def _fail(self, error):
+        """
+        Record the first error raised by any stage and stop the pipeline.
+        """
+        self._errors.append(error)
+        self._stop.set()
+
+    def _serialize(self, serialize, raw_queue, upload_queue):
+        """
+        Serializer stage: turn raw batches into documents.
+        """
+        try:
+            while True:
+                item = self._get(raw_queue)
+                if item is _DONE:
+                    break
+                sequence, batch = item
+                if not self._put(upload_queue, (sequence, serialize(batch))):
+                    break
+        except Exception as error:  # pylint: disable=broad-exception-caught
+            self._fail(error)
+        finally:
+            connections.close_all()
+            for _ in range(self.workers):
+                self._put(upload_queue, _DONE)
+
+    def _upload(self, upload, upload_queue, results):
+        """
+        Uploader stage: send serialized documents to the search engine.
+        """
+        try:
+            while True:
+                item = self._get(upload_queue)
+                if item is _DONE:
+                    break
+                sequence, documents = item
+                results[sequence] = upload(documents)
+        except Exception as error:  # pylint: disable=broad-exception-caught
+            self._fail(error)
+        finally:
+            connections.close_all()
+
+    def run(self, batches, serialize, upload):
+        """
+        Push every batch through the pipeline.
+
+        :param batches: Iterable of raw batches, consumed in the calling thread.
+        :param serialize: Callable turning a raw batch into a list of documents.
+        :param upload: Callable sending a list of documents, its return value is collected.
+        :return: List of upload results in batch order.
+        """
+        raw_queue = queue.Queue(maxsize=self.max_in_flight)
+        upload_queue = queue.Queue(maxsize=self.max_in_flight)
+        results = {}
+        threads = [
+            threading.Thread(
+                target=self._serialize, args=(serialize, raw_queue, upload_queue), daemon=True
+            )
+        ] + [
+            threading.Thread(
+                target=self._upload, args=(upload, upload_queue, results), daemon=True
+            )
+            for _ in range(self.workers)
+        ]
+        for thread in threads:
+            thread.start()
+        try:
+            for sequence, batch in enumerate(batches):
+                if not self._put(raw_queue, (sequence, batch)):
+                    break
+        except Exception as error:  # pylint: disable=broad-exception-caught
+            self._fail(error)
+        finally:
+            self._put(raw_queue, _DONE)
+            for thread in threads:
+                thread.join()
+        if self._errors:
+            raise self._errors[0]
+        return [results[sequence] for sequence in sorted(results)]
@@ -0,0 +1,122 @@
+"""
+Projection serializers building documents straight from ``values_list`` rows.
+"""
+
+from django.core.exceptions import ImproperlyConfigured
+from django.utils import timezone
+from django.utils.duration import duration_string
+
+SERIALIZER_DRF = 'drf'
+SERIALIZER_VALUES = 'values'
+
+
+def _datetime_to_string(value):
+    if timezone.is_aware(value):
+        value = timezone.localtime(value)
+    value = value.isoformat()
+    if value.endswith('+00:00'):
+        value = value[:-6] + 'Z'
+    return value
+
+
+def _decimal_to_string(value):
+    return f'{value:f}'
+
+
+CONVERTERS = {
+    'DateTimeField': _datetime_to_string,
+    'DateField': lambda value: value.isoformat(),
+    'TimeField': lambda value: value.isoformat(),
+    'DecimalField': _decimal_to_string,
+    'DurationField': duration_string,
+    'UUIDField': str,
+    'GenericIPAddressField': str,
+}
+
+
+class ValuesSerializer:
+    """
+    Serializer-like projection of rows fetched with ``values_list('pk', *columns)``.
+
+    Values are converted to the representation DRF gives them through a converter table
+    computed once per column, so serializing a row is a single pass over a tuple.
+    """
+    names = ()
+    columns = ()
+    converters = ()
+
+    def __init__(self, rows, many=True):  # pylint: disable=unused-argument
+        self.rows = rows
+
+    @classmethod
+    def project(cls, queryset):
+        """
+        Returns queryset of the rows expected by the serializer, primary key first
+        :param queryset:
+        :return:
+        """
+        return queryset.values_list('pk', *cls.columns)
+
+    @property
+    def data(self):
+        """
+        Returns documents of the rows
+        :return:
+        """
+        names, converters = self.names, self.converters
+        return [
+            {
+                name: value if converter is None or value is None else converter(value)
+                for name, converter, value in zip(names, converters, row[1:])
+            }
+            for row in self.rows
+        ]
+
+
+def get_values_serializer(model_class, list_fields=None, list_exclude=None):
+    """
+    Create a ValuesSerializer class projecting the concrete fields of the given model.
+
+    :param model_class: The Django model class.
+    :param list_fields: Fields to include, every concrete field when empty or "__all__".
+    :param list_exclude: Fields to exclude.
+    :return: A ValuesSerializer subclass for the model.
+    """
+    meta = model_class._meta  # pylint: disable=protected-access
+    if not list_fields or list_fields == '__all__':
+        fields = [field for field in meta.concrete_fields if field.name not in (list_exclude or ())]
+    else:
+        fields = [meta.get_field(name) for name in list_fields]
+    for field in fields:
+        if not field.concrete or field.many_to_many or field.one_to_many:
+            raise ImproperlyConfigured(
+                f"{model_class.__name__}.{field.name} can not be projected with values, "
+                f"use the drf serializer for this index"
+            )
+    return type(f'{model_class.__name__}ValuesSerializer', (ValuesSerializer,), {
+        'names': tuple(field.name for field in fields),
+        'columns': tuple(field.attname for field in fields),
+        'converters': tuple(CONVERTERS.get(field.get_internal_type()) for field in fields),
+    })
+
+
+def project(queryset, serializer_class):
+    """
+    Returns queryset fetching the rows expected by a serializer class.
+
+    :param queryset: Queryset of model instances.
+    :param serializer_class: DRF serializer or ValuesSerializer class.
+    :return: Queryset of model instances or of values_list tuples.
+    """
+    projection = getattr(serializer_class, 'project', None)
+    return projection(queryset) if projection else queryset
+
+
+def row_pk(row):
+    """
+    Returns primary key of a model instance or of a projected row.
+
+    :param row: Model instance or values_list tuple.
+    :return: Primary key.
+    """
+    return row[0] if isinstance(row, tuple) else row.pk
@@ -0,0 +1,165 @@
+"""
+Slicing of model index querysets, used to split one load across machines.
+"""
+
+import json
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models.functions import Mod
+
+SHARD_MODE_RANGE = 'range'
+SHARD_MODE_HASH = 'hash'
+SHARD_MODES = (SHARD_MODE_RANGE, SHARD_MODE_HASH)
+
+
+def parse_shard(value):
+    """
+    Parse a ``i/N`` shard specification, ``i`` counting from 0 like Kubernetes job indexes.
+
+    :param value: Shard specification, e.g. "3/16".
+    :return: Tuple of the shard number and the number of shards.
+    :raises ValueError: When the specification is malformed or out of range.
+    """
+    try:
+        number, count = (int(part) for part in value.split('/'))
+    except ValueError as error:
+        raise ValueError(f"Invalid shard {value!r}, expected i/N e.g. 3/16") from error
+    if count < 1 or not 0 <= number < count:
+        raise ValueError(f"Invalid shard {value!r}, expected 0 <= i < N")
+    return number, count
+
+
+def shard_boundaries(queryset, count):
+    """
+    Returns primary keys splitting a queryset into ``count`` ranges of about the same size.
+
+    The boundaries are the primary keys found at every ``rows / count`` offset of the
+    primary key order. They only depend on the rows: machines computing them at different
+    times get different ranges when rows were added or deleted in between, leaving rows
+    in no range or in two. Compute them once, see write_shard_plan, and pin them for every
+    machine.
+
+    :param queryset: Queryset to split.
+    :param count: Number of ranges.
+    :return: Sorted list of at most count - 1 primary keys, each one starting a range.
+    """
+    total = queryset.count()
+    pks = queryset.order_by('pk').values_list('pk', flat=True)
+    boundaries = []
+    for shard in range(1, count):
+        offset = total * shard // count
+        if offset >= total:
+            break
+        boundary = pks[offset]
+        if not boundaries or boundary != boundaries[-1]:
+            boundaries.append(boundary)
+    return boundaries
+
+
+def split_range(pk_from, pk_to, count):
+    """
+    Returns integer primary keys splitting ``[pk_from, pk_to)`` into ``count`` ranges of the
+    same width.
+
+    The boundaries only depend on the given bounds, every machine computes the same ones
+    whatever the rows, but ranges are only balanced when primary keys are dense.
+
+    :param pk_from: First primary key of the range, included.
+    :param pk_to: End of the range, excluded.
+    :param count: Number of ranges.
+    :return: List of count - 1 primary keys, each one starting a range.
+    :raises ValueError: When the bounds are not integers or the range is empty.
+    """
+    try:
+        pk_from, pk_to = int(pk_from), int(pk_to)
+    except (TypeError, ValueError) as error:
+        raise ValueError(
+            f"Range shards split [{pk_from}, {pk_to}) arithmetically, they need integer bounds"
+        ) from error
+    if pk_to <= pk_from:
+        raise ValueError(f"Empty primary key range [{pk_from}, {pk_to})")
+    return [pk_from + (pk_to - pk_from) * shard // count for shard in range(1, count)]
+
+
+def write_shard_plan(path, count, boundaries):
+    """
+    Write the pinned range shard boundaries of every index to a JSON file.
+
+    :param path: Path of the plan file.
+    :param count: Number of shards.
+    :param boundaries: Boundaries returned by shard_boundaries, keyed by index name.
+    """
+    with open(path, 'w', encoding='utf-8') as plan_file:
+        json.dump({'count': count, 'indexes': boundaries}, plan_file, cls=DjangoJSONEncoder)
+
+
+def read_shard_plan(path, index_name, count):
+    """
+    Returns the pinned range shard boundaries of an index from a plan file.
+
+    :param path: Path of the plan file written by write_shard_plan.
+    :param index_name: Name of the index.
+    :param count: Number of shards of the load, must match the plan.
+    :return: List of primary keys, each one starting a range.
+    :raises ValueError: When the plan has another number of shards or misses the index.
+    """
+    with open(path, encoding='utf-8') as plan_file:
+        plan = json.load(plan_file)
+    if plan['count'] != count:
+        raise ValueError(f"Shard plan {path} splits indexes in {plan['count']} shards, not {count}")
+    if index_name not in plan['indexes']:
+        raise ValueError(f"Shard plan {path} has no boundaries for index {index_name}")
+    return plan['indexes'][index_name]
+
+
+def pk_range(queryset, pk_from=None, pk_to=None):
+    """
+    Restrict a queryset to a half-open primary key range.
+
+    :param queryset: Queryset to restrict.
+    :param pk_from: Optional first primary key of the range, included.
+    :param pk_to: Optional end of the range, excluded.
+    :return: Filtered queryset.
+    """
+    if pk_from is not None:
+        queryset = queryset.filter(pk__gte=pk_from)
+    if pk_to is not None:
+        queryset = queryset.filter(pk__lt=pk_to)
+    return queryset
+
+
+def shard_queryset(queryset, number, count, mode=SHARD_MODE_RANGE, boundaries=None):
+    """
+    Returns the slice of a queryset belonging to one shard.
+
+    Range shards are contiguous primary key ranges, which keeps every shard reading a
+    compact part of the table. They are cut at pinned ``boundaries``, from a plan written by
+    write_shard_plan or from split_range, so every machine agrees on them while rows change.
+    Hash shards take the rows whose primary key modulo ``count`` is ``number``, they need
+    integer primary keys but no boundaries.
+
+    :param queryset: Queryset to slice.
+    :param number: Shard number, from 0 to count - 1.
+    :param count: Number of shards.
+    :param mode: range (default) or hash.
+    :param boundaries: Primary keys starting every range but the first, for range shards.
+    :return: Filtered queryset.
+    """
+    if mode == SHARD_MODE_HASH:
+        if queryset.model._meta.pk.get_internal_type() not in (  # pylint: disable=protected-access
+                'AutoField', 'BigAutoField', 'SmallAutoField', 'IntegerField', 'BigIntegerField',
+                'PositiveIntegerField', 'PositiveBigIntegerField'
+        ):
+            raise ImproperlyConfigured(
+                f"{queryset.model.__name__} has no integer primary key, use range shards"
+            )
+        return queryset.annotate(search_shard=Mod('pk', count)).filter(search_shard=number)
+    if mode != SHARD_MODE_RANGE:
+        raise ImproperlyConfigured(f"Unknown shard mode {mode}, expected one of {SHARD_MODES}")
+    if boundaries is None:
+        raise ImproperlyConfigured("Range shards need pinned boundaries")
+    boundaries = [None] + list(boundaries) + [None]
+    if number + 1 >= len(boundaries):
+        return queryset.none()
+    return pk_range(queryset, boundaries[number], boundaries[number + 1])
@@ -0,0 +1,178 @@
+"""
+Tracking of the asynchronous search engine tasks submitted by an index load.
+"""
+
+import time
+
+FINISHED_STATUSES = ('succeeded', 'failed', 'canceled')
+MAX_UIDS_PER_POLL = 500
+
+
+class TaskTracker:
+    """
+    Follow the tasks enqueued on the search engine until they are processed.
+
+    Pending tasks are polled in batches with a single filtered tasks API request per
+    ``MAX_UIDS_PER_POLL`` task uids instead of one request per task.
+    """
+
+    def __init__(self, client, poll_interval=0.5, timeout=None, stdout=None):
+        """
+        Initialize the tracker.
+
+        :param client: Search engine driver exposing get_tasks.
+        :param poll_interval: Seconds to sleep between two polls.
+        :param timeout: Optional number of seconds after which waiting gives up, counted from
+            the call to wait.
+        :param stdout: Optional stream receiving live progress lines.
+        """
+        self.client = client
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.stdout = stdout
+        self.started_at = time.monotonic()
+        self.tasks = {}
+        self.statuses = {}
+
+    def track(self, task_info):
+        """
+        Start tracking a submitted task.
+
+        :param task_info: TaskInfo returned by the search engine.
+        """
+        self.track_uid(task_info.task_uid, task_info.status)
+
+    def track_uid(self, task_uid, status='enqueued'):
+        """
+        Start tracking a task known by its uid only.
+
+        :param task_uid: Uid of the task.
+        :param status: Last known status of the task.
+        """
+        self.tasks[task_uid] = None
+        self.statuses[task_uid] = status
+
+    @property
+    def pending(self):
+        """
+        Returns uids of tasks not processed yet
+        :return:
+        """
+        return [uid for uid, status in self.statuses.items() if status not in FINISHED_STATUSES]
+
+    def count(self, *statuses):
+        """
+        Returns number of tracked tasks in any of the given statuses
+        :return:
+        """
+        return sum(1 for status in self.statuses.values() if status in statuses)
+
+    @property
+    def indexed_documents(self):
+        """
+        Returns number of documents indexed by the succeeded tasks
+        :return:
+        """
+        return sum(
+            (task.details or {}).get('indexedDocuments') or 0
+            for task in self.tasks.values()
+            if task is not None and task.status == 'succeeded'
+        )
+
+    @property
+    def processing_time(self):
+        """
+        Returns engine side processing time in seconds of the finished tasks
+        :return:
+        """
+        return sum(self.task_duration(task) for task in self.tasks.values() if task is not None)
+
+    @staticmethod
+    def task_duration(task):
+        """
+        Returns engine side processing time of a task in seconds
+        :param task:
+        :return:
+        """
+        if task.started_at and task.finished_at:
+            return (task.finished_at - task.started_at).total_seconds()
+        return 0.0
+
+    def docs_per_second(self):
+        """
+        Returns indexed documents per wall clock second since tracking started
+        :return:
+        """
+        elapsed = time.monotonic() - self.started_at
+        return self.indexed_documents / elapsed if elapsed else 0.0
+
+    def poll(self):
+        """
+        Refresh the status of every pending task.
+
+        :return: List of the tasks that finished since the previous poll.
+        """
+        pending = self.pending
+        finished = []
+        for start in range(0, len(pending), MAX_UIDS_PER_POLL):
+            for task in self.client.get_tasks(pending[start:start + MAX_UIDS_PER_POLL]):
+                self.statuses[task.uid] = task.status
+                if task.status in FINISHED_STATUSES:
+                    self.tasks[task.uid] = task
+                    finished.append(task)
+        return finished
+
+    def write(self, message):
+        """
+        Write a progress line when a stream is configured.
+        """
+        if self.stdout is not None:
+            self.stdout.write(f"{message}\n")
+
+    def progress(self):
+        """
+        Returns one line progress report
+        :return:
+        """
+        return (
+            f"done: {self.count('succeeded')}, enqueued: {len(self.pending)}, "
+            f"failed: {self.count('failed', 'canceled')}, "
+            f"docs/sec: {self.docs_per_second():.1f}"
+        )
+
+    def wait(self):
+        """
+        Poll until every tracked task is processed or the timeout is reached.
+
+        The timeout only covers the wait, not the time spent submitting the tasks.
+
+        :return: True when all tasks succeeded.
+        """
+        wait_started_at = time.monotonic()
+        while self.pending:
+            if self.timeout is not None and time.monotonic() - wait_started_at > self.timeout:
+                self.write(f"timed out waiting for {len(self.pending)} task(s)")
+                break
+            for task in self.poll():
+                documents = (task.details or {}).get('indexedDocuments')
+                self.write(
+                    f"task UID: {task.uid} {task.status} on index {task.index_uid}, "
+                    f"documents: {documents}, engine time: {self.task_duration(task):.3f}s"
+                )
+            self.write(self.progress())
+            if self.pending:
+                time.sleep(self.poll_interval)
+        return not self.pending and self.count('succeeded') == len(self.statuses)
+
+    def summary(self):
+        """
+        Returns the final report of the tracked tasks
+        :return:
+        """
+        return (
+            f"tasks: {len(self.statuses)}, succeeded: {self.count('succeeded')}, "
+            f"failed: {self.count('failed', 'canceled')}, unfinished: {len(self.pending)}, "
+            f"documents: {self.indexed_documents}, docs/sec: {self.docs_per_second():.1f}, "
+            f"engine time: {self.processing_time:.3f}s, "
+            f"elapsed: {time.monotonic() - self.started_at:.3f}s"
+        )
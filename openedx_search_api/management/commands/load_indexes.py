@@ -3,18 +3,43 @@ Management command to load indexes into MeiliSearch.
 """
 
 import logging
+import multiprocessing
 import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 from django.apps import apps
 from django.conf import settings
-from django.core.management import BaseCommand
+from django.core.management import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Max
 from django.utils.module_loading import import_string
-from rest_framework import serializers
 
 from openedx_search_api.drivers import DriverFactory
+from openedx_search_api.indexers.base import get_index_serializer, get_model_serializer
+from openedx_search_api.indexers.checkpoints import CheckpointRecorder
+from openedx_search_api.indexers.content import iter_content_batches
+from openedx_search_api.indexers.fingerprints import FingerprintStore
+from openedx_search_api.indexers.serializers import SERIALIZER_DRF
+from openedx_search_api.indexers.sharding import (
+    SHARD_MODE_RANGE,
+    SHARD_MODES,
+    parse_shard,
+    pk_range,
+    read_shard_plan,
+    shard_boundaries,
+    shard_queryset,
+    split_range,
+    write_shard_plan
+)
+from openedx_search_api.indexers.tasks import TaskTracker
+from openedx_search_api.models import IndexWatermark
 
 log = logging.getLogger(__name__)
 
+SHADOW_INDEX_SUFFIX = '__building'
+DEFAULT_INDEXER_CLASS = 'openedx_search_api.indexers.base.BaseIndexer'
+
 
 def string_to_dict(s: str):
     """
@@ -27,6 +52,36 @@ def string_to_dict(s: str):
     return dict(item.split('=') for item in s.split(','))
 
 
+def load_index_process(command_class, index_name, config, options):
+    """
+    Load one index in a worker process of --parallel-indexes.
+
+    The process opens its own database connection and search engine client, and returns
+    everything the parent needs to wait for the index and record the state it reached.
+
+    :param command_class: Command class running the load.
+    :param index_name: Name of the index in the configuration.
+    :param config: Index configuration.
+    :param options: Options of the command.
+    :return: Tuple of the {task uid: status} submitted, the watermarks, the fingerprint
+        stores and the elapsed seconds.
+    """
+    started_at = time.monotonic()
+    command = command_class()
+    client = DriverFactory.get_client(None)
+    tracker = TaskTracker(client)
+    watermarks = {}
+    fingerprint_stores = {}
+    try:
+        command.load_index(
+            command.get_indexer_class(), client, tracker, index_name, config,
+            watermarks=watermarks, fingerprint_stores=fingerprint_stores, **options
+        )
+    finally:
+        connections.close_all()
+    return tracker.statuses, watermarks, fingerprint_stores, time.monotonic() - started_at
+
+
 class Command(BaseCommand):
     """
     Command to load indexes into MeiliSearch.
@@ -47,6 +102,95 @@ class Command(BaseCommand):
             type=str,
             help='Set filter to select specific dataset e.g. "pk:1"'
         )
+        parser.add_argument(
+            '--shard',
+            default=None,
+            type=str,
+            help='Only load shard i of N of the model indexes e.g. "3/16", i counting from 0. '
+                 'Range shards are cut at the boundaries of --shard-plan, or split the '
+                 '--pk-from/--pk-to range of one model index in N equal parts'
+        )
+        parser.add_argument(
+            '--shard-mode',
+            default=SHARD_MODE_RANGE,
+            choices=SHARD_MODES,
+            help='Split shards by balanced primary key ranges (default) or by primary key hash'
+        )
+        parser.add_argument(
+            '--pk-from',
+            default=None,
+            help='Only load model rows whose primary key is greater than or equal to this value'
+        )
+        parser.add_argument(
+            '--pk-to',
+            default=None,
+            help='Only load model rows whose primary key is lower than this value'
+        )
+        parser.add_argument(
+            '--plan-shards',
+            default=None,
+            type=int,
+            help='Print the --pk-from/--pk-to options of N balanced shards of every model index, '
+                 'and write their boundaries to --shard-plan when given'
+        )
+        parser.add_argument(
+            '--shard-plan',
+            default=None,
+            help='JSON file of the range shard boundaries of every model index, written by '
+                 '--plan-shards and read by the --shard jobs so they all cut the same ranges'
+        )
+        parser.add_argument(
+            '-w',
+            '--workers',
+            default=1,
+            type=int,
+            help='Number of concurrent uploader threads, more than 1 pipelines reads and uploads'
+        )
+        parser.add_argument(
+            '--parallel-indexes',
+            default=1,
+            type=int,
+            help='Number of indexes loaded concurrently, each one in its own worker process'
+        )
+        parser.add_argument(
+            '--max-in-flight',
+            default=None,
+            type=int,
+            help='Maximum number of batches queued between pipeline stages, defaults to 2 x workers'
+        )
+        parser.add_argument(
+            '--wait',
+            action='store_true',
+            help='Wait until the search engine processed every submitted task and report progress'
+        )
+        parser.add_argument(
+            '--wait-timeout',
+            default=None,
+            type=float,
+            help='Give up waiting for the submitted tasks after this many seconds'
+        )
+        parser.add_argument(
+            '--incremental',
+            action='store_true',
+            help='Only load model rows past the watermark stored by the last successful run, '
+                 'implies --wait'
+        )
+        parser.add_argument(
+            '--skip-unchanged',
+            action='store_true',
+            help='Only send documents whose content hash changed since the last successful run, '
+                 'implies --wait'
+        )
+        parser.add_argument(
+            '--resume',
+            action='store_true',
+            help='Continue the loads interrupted by a previous run from their last checkpoint'
+        )
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help='Load a shadow index and atomically swap it with the live index once it is ready'
+        )
 
     def get_serializer(self, model_class, list_fields=None, list_exclude=None):
         """
@@ -57,22 +201,232 @@ class Command(BaseCommand):
         :param list_exclude: Fields to exclude from the serializer.
         :return: A serializer class for the model.
         """
+        return get_model_serializer(model_class, list_fields, list_exclude)
+
+    def get_indexer_class(self):
+        """
+        Returns indexer class of the loaded indexes.
+        :return:
+        """
+        return import_string(getattr(self, 'INDEXER_CLASS', DEFAULT_INDEXER_CLASS))
+
+    def get_workers(self, config, **options):
+        """
+        Returns number of uploader threads of an index, None to upload in the calling thread.
+
+        ``max_workers`` in the index configuration caps --workers for that index.
+
+        :param config: Index configuration.
+        :return: Number of threads or None.
+        """
+        workers = options.get('workers') or 1
+        if config.get('max_workers'):
+            workers = min(workers, config['max_workers'])
+        return workers if workers > 1 else None
+
+    def index_content(self, indexer, config, **options):
+        """
+        Load the documents of a content_class index, uploading batches as they are produced.
+
+        :param indexer: Indexer instance of the index.
+        :param config: Index configuration.
+        :return: List of submitted task infos.
+        """
+        content_klass = import_string(config['content_class'])
+        checkpoint = indexer.checkpoint
+        batches = iter_content_batches(
+            content_klass(), indexer.batch_size,
+            cursor=checkpoint.cursor if checkpoint else None,
+            skip=checkpoint.batches if checkpoint and checkpoint.cursor is None else 0
+        )
+        task_infos, cursor = indexer.index_content(
+            batches,
+            config.get('settings', {}),
+            workers=self.get_workers(config, **options),
+            max_in_flight=options.get('max_in_flight')
+        )
+        if cursor is not None:
+            sys.stdout.write(f"index UID: {indexer.index_name}, cursor: {cursor}\n")
+        return task_infos
+
+    def index_model(self, indexer, config, **options):
+        """
+        Load the queryset of a model_class index.
+
+        :param indexer: Indexer instance of the index.
+        :param config: Index configuration.
+        :return: List of submitted task infos.
+        """
+        return indexer.index(
+            config.get('settings', {}),
+            workers=self.get_workers(config, **options),
+            max_in_flight=options.get('max_in_flight')
+        )
+
+    def load_model_index(  # pylint: disable=too-many-arguments, too-many-positional-arguments
+            self, klass, client, index_name, target_name, config, **options
+    ):
+        """
+        Build the queryset of a model_class index and load it.
+
+        :param klass: Indexer class.
+        :param client: Search engine driver.
+        :param index_name: Name of the index in the configuration.
+        :param target_name: Name of the search engine index receiving the documents.
+        :param config: Index configuration.
+        :return: Tuple of the submitted task infos and the (field, value) watermark reached.
+        """
+        model_klass = apps.get_model(*config['model_class'].split('.'))
+        if config.get('serializer', SERIALIZER_DRF) == SERIALIZER_DRF:
+            serializer_klass = self.get_serializer(
+                model_klass, list_fields=config.get('fields')
+            )
+        else:
+            serializer_klass = get_index_serializer(model_klass, config)
+        queryset = model_klass.objects.filter(**string_to_dict(options.get('filters', '')))
+        watermark_field = config.get('watermark_field', 'pk')
+        if options.get('incremental'):
+            queryset = self.apply_watermark(index_name, queryset, watermark_field)
+        if self.is_sliced(**options):
+            queryset = self.apply_slice(index_name, queryset, **options)
+        if not queryset.exists():
+            sys.stdout.write(
+                f"there is not data to update in index:{index_name}\n"
+            )
+            return [], (watermark_field, None)
+        watermark = (watermark_field, queryset.aggregate(value=Max(watermark_field))['value'])
+        if self.is_sliced(**options) or options.get('filters'):
+            # A slice or a filtered selection never covers the other rows, it can not advance
+            # the watermark.
+            watermark = (watermark_field, None)
+        checkpoint = options.get('checkpoint')
+        if checkpoint is not None and checkpoint.cursor is not None:
+            queryset = queryset.filter(pk__gt=checkpoint.cursor)
+        indexer = klass(
+            target_name, queryset, serializer_klass, client,
+            batch_size=config.get('batch_size'), fingerprints=options.get('fingerprints'),
+            upload_format=config.get('upload_format'), checkpoint=checkpoint
+        )
+        return self.index_model(indexer, config, **options), watermark
+
+    @staticmethod
+    def is_sliced(**options):
+        """
+        Returns whether the load only covers a slice of the model indexes
+        :return:
+        """
+        return any(options.get(option) is not None for option in ('shard', 'pk_from', 'pk_to'))
+
+    def apply_slice(self, index_name, queryset, **options):
+        """
+        Restrict a queryset to the --pk-from/--pk-to range and to the --shard slice.
+
+        Range shards are cut at the boundaries pinned in --shard-plan, or at equal steps of
+        the --pk-from/--pk-to range, so every job cuts the same ranges whatever rows change.
+
+        :param index_name: Name of the index.
+        :param queryset: Queryset of the index.
+        :return: Filtered queryset.
+        :raises CommandError: When the range shard boundaries can not be pinned.
+        """
+        queryset = pk_range(queryset, options.get('pk_from'), options.get('pk_to'))
+        if options.get('shard') is None:
+            return queryset
+        number, count = parse_shard(options['shard'])
+        mode = options.get('shard_mode', SHARD_MODE_RANGE)
+        boundaries = None
+        if mode == SHARD_MODE_RANGE:
+            try:
+                if options.get('shard_plan'):
+                    boundaries = read_shard_plan(options['shard_plan'], index_name, count)
+                else:
+                    boundaries = split_range(options.get('pk_from'), options.get('pk_to'), count)
+            except ValueError as error:
+                raise CommandError(str(error)) from error
+        return shard_queryset(queryset, number, count, mode, boundaries)
+
+    def plan_shards(self, selected, count, **options):
+        """
+        Print the primary key ranges of balanced shards of every selected model index.
 
-        class BaseSerializer(serializers.ModelSerializer):
-            """
-            Serializer class for the model.
-            """
+        :param selected: Configurations of the indexes, keyed by index name.
+        :param count: Number of shards.
+        """
+        plan = {}
+        for index_name, config in selected.items():
+            if 'model_class' not in config:
+                continue
+            model_klass = apps.get_model(*config['model_class'].split('.'))
+            queryset = pk_range(
+                model_klass.objects.filter(**string_to_dict(options.get('filters', ''))),
+                options.get('pk_from'), options.get('pk_to')
+            )
+            plan[index_name] = shard_boundaries(queryset, count)
+            boundaries = [None] + plan[index_name] + [None]
+            for number in range(len(boundaries) - 1):
+                bounds = [
+                    f"{option} {value}" for option, value in (
+                        ('--pk-from', boundaries[number]), ('--pk-to', boundaries[number + 1])
+                    ) if value is not None
+                ]
+                sys.stdout.write(f"index UID: {index_name}, shard {number}: {' '.join(bounds)}\n")
+        if options.get('shard_plan'):
+            write_shard_plan(options['shard_plan'], count, plan)
 
-            # pylint: disable=too-few-public-methods
-            class Meta:
-                """
-                Meta class for the serializer.
-                """
-                model = model_class
-                fields = list_fields or []
-                exclude = list_exclude or []
+    def apply_watermark(self, index_name, queryset, field):
+        """
+        Restrict a queryset to the rows past the stored watermark of an index.
 
-        return BaseSerializer
+        Timestamp watermarks are compared inclusively so rows written within the same
+        instant as the previous high-water mark are not missed.
+
+        :param index_name: Name of the index.
+        :param queryset: Queryset of the index.
+        :param field: Watermark field of the index.
+        :return: Filtered queryset.
+        """
+        value = IndexWatermark.get_value(index_name, field)
+        if value is None:
+            return queryset
+        lookup = 'gt' if field == 'pk' else 'gte'
+        return queryset.filter(**{f'{field}__{lookup}': value})
+
+    def wait_for(self, client, task_infos, task_uids=(), **options):
+        """
+        Wait until the search engine processed the given tasks.
+
+        :param client: Search engine driver.
+        :param task_infos: List of task infos to wait for.
+        :param task_uids: Uids of other tasks to wait for, e.g. submitted by a resumed run.
+        :return: True when all tasks succeeded.
+        """
+        tracker = TaskTracker(client, timeout=options.get('wait_timeout'))
+        for task_uid in task_uids:
+            tracker.track_uid(task_uid)
+        for task_info in task_infos:
+            tracker.track(task_info)
+        return tracker.wait()
+
+    def swap_shadow_index(  # pylint: disable=too-many-arguments, too-many-positional-arguments
+            self, client, index_name, config, task_infos, task_uids=(), **options
+    ):
+        """
+        Replace a live index by its fully loaded shadow index and drop the previous documents.
+
+        :param client: Search engine driver.
+        :param index_name: Name of the live index.
+        :param config: Index configuration.
+        :param task_infos: Tasks submitted while loading the shadow index.
+        :param task_uids: Uids of the tasks submitted by the interrupted run being resumed.
+        """
+        shadow_name = f"{index_name}{SHADOW_INDEX_SUFFIX}"
+        if not self.wait_for(client, task_infos, task_uids, **options):
+            raise CommandError(f"Loading {shadow_name} failed, {index_name} was left untouched")
+        client.index(index_name, config.get('settings', {}), options=config.get('options'))
+        if not self.wait_for(client, [client.swap_indexes(index_name, shadow_name)], **options):
+            raise CommandError(f"Swapping {shadow_name} with {index_name} failed")
+        self.wait_for(client, [client.delete_index(shadow_name)], **options)
+        sys.stdout.write(f"index UID: {index_name} rebuilt\n")
 
     def handle(self, *args, **kwargs):  # pylint: disable=unused-argument,too-many-locals
         """
@@ -82,42 +436,238 @@ class Command(BaseCommand):
         :param kwargs: Keyword arguments.
         """
         index_list = kwargs.get('index', [])
-        filters = string_to_dict(kwargs.get('filters', ''))
         client = DriverFactory.get_client(None)
-        indexer_class = getattr(
-            self, 'INDEXER_CLASS', 'openedx_search_api.indexers.base.BaseIndexer'
-        )
-        klass = import_string(indexer_class)
         index_configurations = getattr(settings, 'INDEX_CONFIGURATIONS', {})
+        tracker = TaskTracker(
+            client, timeout=kwargs.get('wait_timeout'), stdout=sys.stdout
+        )
+        watermarks = {}
+        fingerprint_stores = {}
 
-        for index_name, config in index_configurations.items():
-            if index_list and index_name not in index_list:
-                continue
-            if 'content_class' in config:
-                content_klass = import_string(config['content_class'])
-                indexer = klass(index_name, None, None, client)
-                documents = content_klass().fetch()
-                task_info = indexer.index_documents(
-                    documents, config.get('settings', {})
+        self.check_options(**kwargs)
+
+        selected = {
+            index_name: config for index_name, config in index_configurations.items()
+            if not index_list or index_name in index_list
+        }
+        models_count = sum('model_class' in config for config in selected.values())
+        has_pk_range = kwargs.get('pk_from') is not None or kwargs.get('pk_to') is not None
+        if models_count > 1 and has_pk_range:
+            raise CommandError(
+                "--pk-from/--pk-to apply to the primary keys of one model, select a single model "
+                "index with --index"
+            )
+        if kwargs.get('plan_shards'):
+            self.plan_shards(selected, kwargs['plan_shards'], **kwargs)
+            return
+        if self.is_sliced(**kwargs):
+            skipped = [index_name for index_name, config in selected.items()
+                       if 'model_class' not in config]
+            for index_name in skipped:
+                sys.stdout.write(f"index UID: {index_name} is not a model index, skipped\n")
+                del selected[index_name]
+        failed = []
+        if (kwargs.get('parallel_indexes') or 1) > 1 and len(selected) > 1:
+            failed = self.load_parallel(
+                selected, tracker, watermarks, fingerprint_stores, **kwargs
+            )
+        else:
+            klass = self.get_indexer_class()
+            for index_name, config in selected.items():
+                self.load_index(
+                    klass, client, tracker, index_name, config,
+                    watermarks=watermarks, fingerprint_stores=fingerprint_stores, **kwargs
                 )
+
+        self.finish_load(tracker, watermarks, fingerprint_stores, **kwargs)
+        if failed:
+            raise CommandError(f"Loading failed for: {', '.join(failed)}")
+
+    def check_options(self, **options):
+        """
+        Reject incompatible options.
+
+        :raises CommandError: When options can not be combined.
+        """
+        if options.get('rebuild') and (options.get('incremental') or options.get('skip_unchanged')):
+            raise CommandError(
+                "--rebuild always loads the full dataset, drop --incremental and --skip-unchanged"
+            )
+        if options.get('rebuild') and self.is_sliced(**options):
+            raise CommandError("--rebuild swaps whole indexes, it can not load a shard or pk range")
+        if options.get('rebuild') and options.get('filters'):
+            raise CommandError(
+                "--rebuild swaps whole indexes, it can not load the rows selected by --filters"
+            )
+        if options.get('shard') is not None:
+            try:
+                parse_shard(options['shard'])
+            except ValueError as error:
+                raise CommandError(str(error)) from error
+            if options.get('shard_mode', SHARD_MODE_RANGE) == SHARD_MODE_RANGE and not (
+                    options.get('shard_plan')
+                    or options.get('pk_from') is not None and options.get('pk_to') is not None
+            ):
+                raise CommandError(
+                    "Range shards need pinned boundaries: pass the --shard-plan written by "
+                    "--plan-shards, split one model index with --pk-from and --pk-to or use "
+                    "--shard-mode hash"
+                )
+        if options.get('plan_shards') is not None and options['plan_shards'] < 1:
+            raise CommandError("--plan-shards expects a positive number of shards")
+
+    def load_parallel(  # pylint: disable=too-many-locals
+            self, selected, tracker, watermarks, fingerprint_stores, **options
+    ):
+        """
+        Load independent indexes concurrently in a pool of --parallel-indexes processes.
+
+        Every index is loaded by load_index_process in a forked process with its own
+        database connection and search engine client. Indexes report as they complete and
+        their tasks, watermarks and fingerprints are gathered for one combined wait and
+        summary, so an index failing does not stop the others.
+
+        :param selected: Configurations of the indexes to load, keyed by index name.
+        :param tracker: TaskTracker receiving the tasks of every index.
+        :param watermarks: Receives the (field, value) watermark reached by model indexes.
+        :param fingerprint_stores: Receives the FingerprintStore of model indexes.
+        :return: Names of the indexes whose load raised.
+        """
+        options = {key: value for key, value in options.items() if key not in ('stdout', 'stderr')}
+        processes = min(options['parallel_indexes'], len(selected))
+        # Forked processes must not share the connections of the parent.
+        connections.close_all()
+        failed = []
+        with ProcessPoolExecutor(
+                max_workers=processes, mp_context=multiprocessing.get_context('fork')
+        ) as executor:
+            futures = {
+                executor.submit(load_index_process, type(self), index_name, config, options):
+                    index_name
+                for index_name, config in selected.items()
+            }
+            for future in as_completed(futures):
+                index_name = futures[future]
+                try:
+                    statuses, index_watermarks, index_stores, elapsed = future.result()
+                except Exception as error:  # pylint: disable=broad-exception-caught
+                    failed.append(index_name)
+                    sys.stdout.write(f"index UID: {index_name} failed: {error!r}\n")
+                    continue
+                for task_uid, status in statuses.items():
+                    tracker.track_uid(task_uid, status)
+                watermarks.update(index_watermarks)
+                fingerprint_stores.update(index_stores)
                 sys.stdout.write(
-                    f"task UID: {task_info.task_uid}, index UID: {task_info.index_uid}\n"
+                    f"index UID: {index_name} loaded in {elapsed:.3f}s, tasks: {len(statuses)}\n"
                 )
-            else:
-                model_klass = apps.get_model(*config['model_class'].split('.'))
-                serializer_klass = self.get_serializer(
-                    model_klass, list_fields=config.get('fields')
+        return sorted(failed)
+
+    def load_index(  # pylint: disable=too-many-arguments, too-many-positional-arguments
+            self, klass, client, tracker, index_name, config,
+            watermarks, fingerprint_stores, **options
+    ):
+        """
+        Load one index, checkpointing its progress so an interrupted load can be resumed.
+
+        :param klass: Indexer class.
+        :param client: Search engine driver.
+        :param tracker: TaskTracker of the submitted tasks.
+        :param index_name: Name of the index in the configuration.
+        :param config: Index configuration.
+        :param watermarks: Receives the (field, value) watermark reached by model indexes.
+        :param fingerprint_stores: Receives the FingerprintStore of model indexes.
+        """
+        target_name = index_name
+        if options.get('rebuild'):
+            target_name = f"{index_name}{SHADOW_INDEX_SUFFIX}"
+        checkpoint = CheckpointRecorder.start(
+            self.checkpoint_name(index_name, **options), target_name, options.get('resume')
+        )
+        if checkpoint.resumed:
+            sys.stdout.write(
+                f"index UID: {index_name}, resuming after {checkpoint.batches} batch(es)\n"
+            )
+        elif target_name != index_name:
+            self.wait_for(client, [client.delete_index(target_name)], **options)
+            client.index(target_name, config.get('settings', {}), options=config.get('options'))
+        if 'content_class' in config:
+            indexer = klass(
+                target_name, None, None, client, batch_size=config.get('batch_size'),
+                upload_format=config.get('upload_format'), checkpoint=checkpoint
+            )
+            task_infos = self.index_content(indexer, config, **options)
+        else:
+            if options.get('skip_unchanged'):
+                fingerprint_stores[index_name] = FingerprintStore(
+                    index_name, (config.get('options') or {}).get('primaryKey', 'id')
                 )
-                queryset = model_klass.objects.filter(**filters)
-                if queryset.exists():
-                    indexer = klass(
-                        index_name, queryset, serializer_klass, client
-                    )
-                    task_info = indexer.index(config.get('settings', {}))
-                    sys.stdout.write(
-                        f"task UID: {task_info.task_uid}, index UID: {task_info.index_uid}\n"
-                    )
-                else:
-                    sys.stdout.write(
-                        f"there is not data to update in index:{index_name}\n"
-                    )
+            task_infos, watermarks[index_name] = self.load_model_index(
+                klass, client, index_name, target_name, config,
+                fingerprints=fingerprint_stores.get(index_name), checkpoint=checkpoint, **options
+            )
+        for task_uid in checkpoint.resumed_task_uids:
+            tracker.track_uid(task_uid)
+        for task_info in task_infos:
+            tracker.track(task_info)
+            sys.stdout.write(
+                f"task UID: {task_info.task_uid}, index UID: {task_info.index_uid}\n"
+            )
+        if target_name != index_name:
+            self.swap_shadow_index(
+                client, index_name, config, task_infos, checkpoint.resumed_task_uids, **options
+            )
+        checkpoint.clear()
+
+    def checkpoint_name(self, index_name, **options):
+        """
+        Returns name under which the progress of an index load is checkpointed.
+
+        Slices of one index are loaded by separate runs, each one keeps its own checkpoint.
+
+        :param index_name: Name of the index in the configuration.
+        :return: Checkpoint name.
+        """
+        if not self.is_sliced(**options):
+            return index_name
+        slices = [
+            f"{option}={options[option]}" for option in ('shard', 'shard_mode', 'pk_from', 'pk_to')
+            if options.get(option) is not None and (option != 'shard_mode' or options.get('shard'))
+        ]
+        return f"{index_name}[{','.join(slices)}]"
+
+    def finish_load(self, tracker, watermarks, fingerprint_stores, **options):
+        """
+        Wait for the submitted tasks when required and record the state reached by the load.
+
+        Fingerprints and watermarks are only stored once every task succeeded, so a run which
+        did not wait leaves them untouched.
+
+        :param tracker: TaskTracker of the submitted tasks.
+        :param watermarks: (field, value) watermark reached by every model index.
+        :param fingerprint_stores: FingerprintStore of every index loaded with --skip-unchanged.
+        """
+        for index_name, store in fingerprint_stores.items():
+            sys.stdout.write(f"index UID: {index_name}, unchanged documents: {store.skipped}\n")
+
+        # --rebuild already waited for the tasks of the shadow index before swapping it.
+        waited = bool(
+            options.get('wait') or options.get('incremental') or options.get('rebuild')
+            or fingerprint_stores
+        )
+        if waited and tracker.statuses:
+            succeeded = tracker.wait()
+            sys.stdout.write(f"{tracker.summary()}\n")
+            if not succeeded:
+                for store in fingerprint_stores.values():
+                    store.discard()
+                raise CommandError("Some indexing tasks failed or did not finish")
+        if not waited:
+            return
+
+        for store in fingerprint_stores.values():
+            store.commit()
+
+        for index_name, (watermark_field, value) in watermarks.items():
+            if value is not None:
+                IndexWatermark.set_value(index_name, watermark_field, value)
@@ -0,0 +1,249 @@
+"""
+Management command to issue search tokens ahead of a traffic peak.
+"""
+
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand
+from django.db import connection, transaction
+from django.http import HttpRequest
+
+from openedx_search_api.cache import token_cache
+from openedx_search_api.drivers import DriverFactory
+from openedx_search_api.management.commands.load_indexes import string_to_dict
+from openedx_search_api.models import SearchApiKeyModel, SearchEngineToken
+
+TOKEN_FIELDS = [
+    'token', 'token_type', 'expires_at', 'search_engine', 'index_search_rules',
+    'api_key_uid', 'rules_fingerprint',
+]
+API_KEY_FIELDS = [
+    'uid', 'name', 'actions', 'indexes', 'expires_at', 'key', 'created_at', 'updated_at',
+]
+
+log = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    """
+    Command to pre-generate the search tokens of a set of users.
+
+    Users are walked in primary key order, one chunk at a time. Tokens of a chunk are
+    signed concurrently and written in one transaction with one bulk_create and one
+    bulk_update, so the token endpoint finds a valid stored token for every pre-warmed user.
+    Rows written by concurrent token requests in the meantime are overwritten, so the cached
+    token of every signed user is invalidated. The engine keys created for a chunk are revoked
+    when one of its users can not be signed or its rows can not be written.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '-f', '--filters', default='', type=str,
+            help='Filter of the users e.g. "is_active=True,courseenrollment__course_id=<id>"'
+        )
+        parser.add_argument(
+            '--active-days',
+            default=None,
+            type=int,
+            help='Only users who logged in during the last N days'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            default=500,
+            type=int,
+            help='Number of users signed and written per chunk'
+        )
+        parser.add_argument(
+            '-w',
+            '--workers',
+            default=4,
+            type=int,
+            help='Number of concurrent signing threads'
+        )
+        parser.add_argument(
+            '--min-lifetime',
+            default=24,
+            type=float,
+            help='Re-sign stored tokens expiring within this many hours'
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Re-sign every token even when the stored one can be reused'
+        )
+
+    def get_users(self, **options):
+        """
+        Returns queryset of the users to pre-warm.
+
+        :return: QuerySet of users.
+        """
+        users = get_user_model().objects.filter(**string_to_dict(options.get('filters', '')))
+        if options.get('active_days') is not None:
+            since = datetime.now(tz=timezone.utc) - timedelta(days=options['active_days'])
+            users = users.filter(last_login__gte=since)
+        return users.distinct().order_by('pk')
+
+    def iter_chunks(self, users, chunk_size):
+        """
+        Walk users in primary key order with keyset queries.
+
+        :param users: Ordered queryset of users.
+        :param chunk_size: Number of users per chunk.
+        :return: Generator of lists of users.
+        """
+        last_pk = None
+        while True:
+            chunk = users if last_pk is None else users.filter(pk__gt=last_pk)
+            rows = list(chunk[:chunk_size])
+            if not rows:
+                return
+            yield rows
+            last_pk = rows[-1].pk
+
+    @staticmethod
+    def sign(user, token, api_key, force):
+        """
+        Sign the token of one user.
+
+        :return: Tuple of the user, the token fields and the fields of a new api key.
+        """
+        request = HttpRequest()
+        request.user = user
+        client = DriverFactory.get_client(request)
+        token_defaults, api_key_defaults = client.build_user_token(token, api_key, force=force)
+        return user, token_defaults, api_key_defaults
+
+    @staticmethod
+    def save(model_klass, fields, stored, defaults):
+        """
+        Write the rows of a chunk with one bulk_update and one bulk_create.
+
+        New rows are inserted as upserts on the user, since a token request of the user may
+        store its own row after the chunk was read.
+
+        :param model_klass: SearchEngineToken or SearchApiKeyModel.
+        :param fields: Fields to write.
+        :param stored: Existing rows of the chunk by user id.
+        :param defaults: New field values by user.
+        """
+        updated, created = [], []
+        for user, values in defaults.items():
+            row = stored.get(user.id)
+            if row is None:
+                created.append(model_klass(user=user, **values))
+            else:
+                for field, value in values.items():
+                    setattr(row, field, value)
+                updated.append(row)
+        if updated:
+            model_klass.objects.bulk_update(updated, fields)
+        if created:
+            options = {'update_conflicts': True, 'update_fields': fields}
+            if connection.features.supports_update_conflicts_with_target:
+                options['unique_fields'] = ['user']
+            model_klass.objects.bulk_create(created, **options)
+
+    @staticmethod
+    def revoke(api_key_defaults):
+        """
+        Revoke engine keys which were created for rows that could not be written.
+
+        :param api_key_defaults: SearchApiKeyModel fields of the created keys by user.
+        """
+        client = DriverFactory.get_client(None)
+        for values in api_key_defaults.values():
+            try:
+                client.delete_key(values['uid'])
+            except Exception:  # pylint: disable=broad-exception-caught
+                log.warning("Unable to revoke search engine key %s", values['uid'], exc_info=True)
+
+    @staticmethod
+    def gather(results, token_defaults, api_key_defaults):
+        """
+        Collect the signed fields of a chunk, raising the first signing error once every
+        user was signed so the keys created for the others are known.
+
+        :param results: Iterable of (sign result, exception) tuples.
+        :param token_defaults: Receives the SearchEngineToken fields by user.
+        :param api_key_defaults: Receives the SearchApiKeyModel fields of new keys by user.
+        """
+        errors = []
+        for signed, error in results:
+            if error is not None:
+                errors.append(error)
+                continue
+            user, token_values, api_key_values = signed
+            if token_values is not None:
+                token_defaults[user] = token_values
+            if api_key_values is not None:
+                api_key_defaults[user] = api_key_values
+        if errors:
+            raise errors[0]
+
+    def prewarm_chunk(self, executor, users, **options):
+        """
+        Sign and store the tokens of one chunk of users.
+
+        :return: Number of tokens written.
+        """
+        now = datetime.now(tz=timezone.utc)
+        valid_until = now + timedelta(hours=options['min_lifetime'])
+        tokens = SearchEngineToken.objects.in_bulk(
+            [user.id for user in users], field_name='user_id'
+        )
+        api_keys = SearchApiKeyModel.objects.in_bulk(
+            [user.id for user in users], field_name='user_id'
+        )
+
+        def sign_user(user):
+            token, api_key = tokens.get(user.id), api_keys.get(user.id)
+            try:
+                return self.sign(
+                    user,
+                    token if token is not None and token.expires_at > valid_until else None,
+                    api_key if api_key is not None and api_key.expires_at > now else None,
+                    options['force'],
+                ), None
+            except Exception as error:  # pylint: disable=broad-exception-caught
+                return None, error
+
+        token_defaults, api_key_defaults = {}, {}
+        try:
+            self.gather(executor.map(sign_user, users), token_defaults, api_key_defaults)
+            with transaction.atomic():
+                self.save(SearchApiKeyModel, API_KEY_FIELDS, api_keys, api_key_defaults)
+                self.save(SearchEngineToken, TOKEN_FIELDS, tokens, token_defaults)
+        except BaseException:
+            self.revoke(api_key_defaults)
+            raise
+        for user in token_defaults:
+            token_cache.invalidate(user.id)
+        return len(token_defaults)
+
+    def handle(self, *args, **options):  # pylint: disable=unused-argument
+        """
+        Handle the management command execution.
+
+        :param args: Positional arguments.
+        :param options: Keyword arguments.
+        """
+        started_at = time.monotonic()
+        users_count = signed = 0
+        with ThreadPoolExecutor(max_workers=max(options['workers'], 1)) as executor:
+            for users in self.iter_chunks(self.get_users(**options), options['chunk_size']):
+                signed += self.prewarm_chunk(executor, users, **options)
+                users_count += len(users)
+                elapsed = time.monotonic() - started_at
+                self.stdout.write(
+                    f"users: {users_count}, signed: {signed}, "
+                    f"users/sec: {users_count / elapsed if elapsed else 0.0:.1f}"
+                )
+        self.stdout.write(
+            f"pre-warmed {users_count} user(s), signed {signed} token(s) "
+            f"in {time.monotonic() - started_at:.3f}s"
+        )
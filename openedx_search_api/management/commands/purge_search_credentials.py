@@ -0,0 +1,133 @@
+"""
+Management command to delete expired search tokens and api keys.
+"""
+
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from django.core.management import BaseCommand
+
+from openedx_search_api.drivers import DriverFactory
+from openedx_search_api.models import SearchApiKeyModel, SearchEngineToken
+
+log = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    """
+    Command to garbage collect expired credentials.
+
+    Expired rows are deleted in chunks of ``--chunk-size`` so no statement holds table locks
+    for long. The engine keys of expired api keys are revoked by ``--workers`` threads before
+    their rows are deleted, rows of keys which could not be revoked are kept for the next run.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            default=1000,
+            type=int,
+            help='Number of rows deleted per statement'
+        )
+        parser.add_argument(
+            '-w', '--workers', default=4, type=int,
+            help='Number of concurrent engine key revocations'
+        )
+        parser.add_argument(
+            '--grace-hours',
+            default=0,
+            type=float,
+            help='Only purge credentials expired for more than this many hours'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report what would be purged without deleting anything'
+        )
+
+    def iter_expired(self, model_klass, cutoff, chunk_size, fields=('pk',)):
+        """
+        Walk the rows expired before cutoff in primary key order with keyset queries.
+
+        :param model_klass: SearchEngineToken or SearchApiKeyModel.
+        :param cutoff: Expiry datetime rows must be older than.
+        :param chunk_size: Number of rows per chunk.
+        :param fields: Fields to fetch, the primary key first.
+        :return: Generator of lists of value tuples.
+        """
+        queryset = model_klass.objects.filter(expires_at__lt=cutoff).order_by('pk')
+        last_pk = None
+        while True:
+            chunk = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+            rows = list(chunk.values_list(*fields)[:chunk_size])
+            if not rows:
+                return
+            yield rows
+            last_pk = rows[-1][0]
+
+    @staticmethod
+    def revoke(client, key_uid):
+        """
+        Revoke one engine key.
+
+        :return: True when the key no longer exists on the engine.
+        """
+        try:
+            client.delete_key(key_uid)
+        except Exception:  # pylint: disable=broad-exception-caught
+            log.warning("Unable to revoke search engine key %s", key_uid, exc_info=True)
+            return False
+        return True
+
+    def purge_api_keys(self, client, cutoff, **options):
+        """
+        Revoke and delete expired api keys.
+
+        :return: Tuple of the number of deleted rows and of failed revocations.
+        """
+        deleted = failed = 0
+        with ThreadPoolExecutor(max_workers=max(options['workers'], 1)) as executor:
+            for rows in self.iter_expired(
+                    SearchApiKeyModel, cutoff, options['chunk_size'], fields=('pk', 'uid')
+            ):
+                if options['dry_run']:
+                    deleted += len(rows)
+                    continue
+                revoked = list(executor.map(lambda row: self.revoke(client, row[1]), rows))
+                pks = [row[0] for row, success in zip(rows, revoked) if success]
+                failed += len(rows) - len(pks)
+                deleted += SearchApiKeyModel.objects.filter(pk__in=pks).delete()[0]
+        return deleted, failed
+
+    def purge_tokens(self, cutoff, **options):
+        """
+        Delete expired tokens.
+
+        :return: Number of deleted rows.
+        """
+        deleted = 0
+        for rows in self.iter_expired(SearchEngineToken, cutoff, options['chunk_size']):
+            if options['dry_run']:
+                deleted += len(rows)
+                continue
+            deleted += SearchEngineToken.objects.filter(pk__in=[row[0] for row in rows]).delete()[0]
+        return deleted
+
+    def handle(self, *args, **options):  # pylint: disable=unused-argument
+        """
+        Handle the management command execution.
+
+        :param args: Positional arguments.
+        :param options: Keyword arguments.
+        """
+        started_at = time.monotonic()
+        cutoff = datetime.now(tz=timezone.utc) - timedelta(hours=options['grace_hours'])
+        tokens = self.purge_tokens(cutoff, **options)
+        api_keys, failed = self.purge_api_keys(DriverFactory.get_client(None), cutoff, **options)
+        prefix = 'would purge' if options['dry_run'] else 'purged'
+        self.stdout.write(
+            f"{prefix} {tokens} token(s) and {api_keys} api key(s), "
+            f"{failed} key revocation(s) failed, in {time.monotonic() - started_at:.3f}s"
+        )
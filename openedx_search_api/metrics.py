@@ -0,0 +1,413 @@
+"""
+In-process metrics of the driver calls, token issuance stages, token cache and engine requests.
+
+Metrics are aggregated per process in ``registry`` and served in the Prometheus text format by
+the ``metrics/`` view. Every observation is also handed to the exporters listed in
+SEARCH_METRICS_EXPORTERS, e.g. StatsdExporter, to push them to an external collector.
+Recording a value costs a lock acquisition and a few dict lookups, so metrics stay enabled
+unless SEARCH_METRICS_ENABLED is False.
+"""
+
+import contextvars
+import functools
+import inspect
+import socket
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import lru_cache
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+QUERY_BUCKETS = (0, 1, 2, 3, 4, 5, 6, 8, 10, 15, 20, 50)
+
+
+@lru_cache(maxsize=1)
+def is_enabled():
+    """
+    Returns whether metrics are recorded, read once per process since it is checked by
+    every observation
+    :return:
+    """
+    return getattr(settings, 'SEARCH_METRICS_ENABLED', True)
+
+
+@lru_cache(maxsize=1)
+def get_exporters():
+    """
+    Returns instances of the exporters of SEARCH_METRICS_EXPORTERS, created once per process
+    :return:
+    """
+    return tuple(
+        import_string(exporter)() for exporter in getattr(settings, 'SEARCH_METRICS_EXPORTERS', ())
+    )
+
+
+def _export(kind, name, value, labelnames, labels):
+    for exporter in get_exporters():
+        exporter.export(kind, name, value, dict(zip(labelnames, labels)))
+
+
+class Timer:
+    """
+    Context manager observing the seconds spent in its block into a histogram, the outcome
+    label value being ``error`` when the block raises and ``ok`` otherwise.
+    """
+    __slots__ = ('histogram', 'labels', 'started_at')
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+        self.started_at = None
+
+    def __enter__(self):
+        self.started_at = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        outcome = 'ok' if exc_type is None else 'error'
+        self.histogram.observe(time.perf_counter() - self.started_at, *self.labels, outcome)
+
+
+class Metric:
+    """
+    Base class of the metrics, holding one series per combination of label values.
+    """
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def samples(self):
+        """
+        Yield (name suffix, labels, value) of every sample
+        """
+        raise NotImplementedError("Method 'samples' not implemented")
+
+    def clear(self):
+        """
+        Forget every recorded value.
+        """
+        with self._lock:
+            self.values.clear()
+
+
+class Counter(Metric):
+    """
+    Monotonic counter per combination of label values.
+    """
+    kind = 'counter'
+
+    def inc(self, *labels, amount=1):
+        """
+        Increment the counter of the given label values.
+        """
+        if not is_enabled():
+            return
+        with self._lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+        _export(self.kind, self.name, amount, self.labelnames, labels)
+
+    def samples(self):
+        """
+        Yield (name suffix, labels, value) of every sample
+        """
+        with self._lock:
+            values = dict(self.values)
+        for labels, value in sorted(values.items()):
+            yield '', dict(zip(self.labelnames, labels)), value
+
+
+class Histogram(Metric):
+    """
+    Distribution of observed values per combination of label values, with cumulative buckets.
+    """
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        """
+        Record one value for the given label values.
+        """
+        if not is_enabled():
+            return
+        with self._lock:
+            series = self.values.get(labels)
+            if series is None:
+                series = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][bisect_left(self.buckets, value)] += 1
+            series[1] += value
+            series[2] += 1
+        _export(self.kind, self.name, value, self.labelnames, labels)
+
+    def time(self, *labels):
+        """
+        Returns a context manager observing the duration of its block, the outcome label
+        value being appended to the given ones
+        :return:
+        """
+        return Timer(self, labels)
+
+    def samples(self):
+        with self._lock:
+            values = {labels: (list(series[0]), series[1], series[2])
+                      for labels, series in self.values.items()}
+        for labels, (counts, total, count) in sorted(values.items()):
+            labels = dict(zip(self.labelnames, labels))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                yield '_bucket', dict(labels, le=format_value(bound)), cumulative
+            yield '_sum', labels, total
+            yield '_count', labels, count
+
+
+def format_value(value):
+    """
+    Returns a sample value in the Prometheus text format
+    :param value:
+    :return:
+    """
+    if value == float('inf'):
+        return '+Inf'
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class MetricsRegistry:
+    """
+    Metrics of the process.
+    """
+
+    def __init__(self):
+        self.metrics = {}
+
+    def register(self, metric):
+        """
+        Register a metric and return it
+        :param metric:
+        :return:
+        """
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        """
+        Returns a new registered counter
+        :return:
+        """
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        """
+        Returns a new registered histogram
+        :return:
+        """
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def clear(self):
+        """
+        Forget every recorded value.
+        """
+        for metric in self.metrics.values():
+            metric.clear()
+
+    def render(self):
+        """
+        Returns every metric in the Prometheus text exposition format
+        :return:
+        """
+        lines = []
+        for metric in self.metrics.values():
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for suffix, labels, value in metric.samples():
+                rendered = ','.join(
+                    f'{name}="{escape_label(label)}"' for name, label in labels.items()
+                )
+                lines.append(
+                    f"{metric.name}{suffix}{'{' + rendered + '}' if rendered else ''} "
+                    f"{format_value(value)}"
+                )
+        return '\n'.join(lines) + '\n'
+
+
+def escape_label(value):
+    """
+    Returns a label value escaped for the Prometheus text format
+    :param value:
+    :return:
+    """
+    return str(value).replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+registry = MetricsRegistry()
+
+DRIVER_CALLS = registry.histogram(
+    'openedx_search_driver_call_seconds', 'Duration of the search engine driver calls.',
+    ('driver', 'method', 'outcome')
+)
+ENGINE_REQUESTS = registry.histogram(
+    'openedx_search_engine_request_seconds', 'Duration of the HTTP requests to Meilisearch.',
+    ('method', 'outcome')
+)
+TOKEN_STAGES = registry.histogram(
+    'openedx_search_token_stage_seconds', 'Duration of every stage of a token request.',
+    ('stage', 'outcome')
+)
+TOKEN_REQUESTS = registry.histogram(
+    'openedx_search_token_request_seconds', 'Duration of the token view requests.',
+    ('view', 'outcome')
+)
+TOKEN_DB_QUERIES = registry.histogram(
+    'openedx_search_token_db_queries', 'Database queries run by a token view request.',
+    ('view',), buckets=QUERY_BUCKETS
+)
+TOKEN_CACHE_LOOKUPS = registry.counter(
+    'openedx_search_token_cache_lookups_total', 'Token cache lookups by result.', ('result',)
+)
+
+
+def instrument(function, histogram, *labels):
+    """
+    Wrap a function or coroutine function to observe the duration of every call.
+
+    The ``outcome`` label value, ``ok`` or ``error``, is appended to the given label values.
+
+    :param function: Function to wrap.
+    :param histogram: Histogram observing the durations.
+    :param labels: Label values preceding the outcome.
+    :return: Wrapped function.
+    """
+    ok_labels, error_labels = labels + ('ok',), labels + ('error',)
+
+    if inspect.iscoroutinefunction(function):
+        @functools.wraps(function)
+        async def async_wrapper(*args, **kwargs):
+            started_at = time.perf_counter()
+            try:
+                result = await function(*args, **kwargs)
+            except BaseException:
+                histogram.observe(time.perf_counter() - started_at, *error_labels)
+                raise
+            histogram.observe(time.perf_counter() - started_at, *ok_labels)
+            return result
+        return async_wrapper
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        started_at = time.perf_counter()
+        try:
+            result = function(*args, **kwargs)
+        except BaseException:
+            histogram.observe(time.perf_counter() - started_at, *error_labels)
+            raise
+        histogram.observe(time.perf_counter() - started_at, *ok_labels)
+        return result
+    return wrapper
+
+
+def timed(histogram, *labels):
+    """
+    Decorator form of instrument.
+
+    :param histogram: Histogram observing the durations.
+    :param labels: Label values preceding the outcome.
+    :return: Decorator.
+    """
+    return lambda function: instrument(function, histogram, *labels)
+
+
+class QueryCounter:  # pylint: disable=too-few-public-methods
+    """
+    Number of database queries run within a counting_queries block.
+    """
+
+    def __init__(self):
+        self.count = 0
+
+
+_query_counter = contextvars.ContextVar('openedx_search_query_counter', default=None)
+
+
+def count_query(  # pylint: disable=too-many-arguments, too-many-positional-arguments
+        execute, sql, params, many, context
+):
+    """
+    Database execute wrapper, installed on every connection, counting the query into the
+    counter of the current context.
+    """
+    counter = _query_counter.get()
+    if counter is not None:
+        counter.count += 1
+    return execute(sql, params, many, context)
+
+
+@contextmanager
+def counting_queries():
+    """
+    Count the database queries run by the block.
+
+    The counter lives in a context variable, so queries the async ORM runs in the threads of
+    sync_to_async are counted as well.
+
+    :return: QueryCounter of the block.
+    """
+    counter = QueryCounter()
+    token = _query_counter.set(counter)
+    try:
+        yield counter
+    finally:
+        _query_counter.reset(token)
+
+
+class StatsdExporter:
+    """
+    Exporter sending every observation to a statsd daemon over UDP.
+
+    Histograms of seconds are sent as timers in milliseconds, other histograms as
+    histograms and counters as counters. Label values are appended to the metric name,
+    e.g. ``openedx_search.token_stage_seconds.sign:0.412|ms``.
+    """
+
+    def __init__(self):
+        self.address = (
+            getattr(settings, 'SEARCH_METRICS_STATSD_HOST', 'localhost'),
+            getattr(settings, 'SEARCH_METRICS_STATSD_PORT', 8125),
+        )
+        self.prefix = getattr(settings, 'SEARCH_METRICS_STATSD_PREFIX', 'openedx_search')
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.setblocking(False)
+
+    def format(self, kind, name, value, labels):
+        """
+        Returns the statsd line of an observation
+        :return:
+        """
+        name = name.removeprefix('openedx_search_')
+        path = '.'.join([self.prefix, name] + [str(label) for label in labels.values()])
+        if kind == 'counter':
+            return f'{path}:{value}|c'
+        if name.endswith('_seconds'):
+            return f'{path}:{value * 1000:.3f}|ms'
+        return f'{path}:{value}|h'
+
+    def export(self, kind, name, value, labels):
+        """
+        Send one observation, dropping it when the daemon cannot be reached.
+        """
+        try:
+            self.socket.sendto(self.format(kind, name, value, labels).encode(), self.address)
+        except OSError:
+            pass
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.8 on 2026-10-17 22:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('openedx_search_api', '0003_searchenginetoken_api_key_uid'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='searchenginetoken',
+            name='rules_fingerprint',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+    ]
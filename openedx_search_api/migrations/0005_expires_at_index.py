@@ -0,0 +1,23 @@
+# Generated by Django 5.0.8 on 2026-10-17 22:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('openedx_search_api', '0004_searchenginetoken_rules_fingerprint'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='searchapikeymodel',
+            name='expires_at',
+            field=models.DateTimeField(db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='searchenginetoken',
+            name='expires_at',
+            field=models.DateTimeField(db_index=True),
+        ),
+    ]
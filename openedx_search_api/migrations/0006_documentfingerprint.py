@@ -0,0 +1,25 @@
+# Generated by Django 5.0.8 on 2026-10-17 22:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('openedx_search_api', '0005_expires_at_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentFingerprint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('index_name', models.CharField(max_length=255)),
+                ('document_id', models.CharField(max_length=255)),
+                ('fingerprint', models.BigIntegerField()),
+            ],
+            options={
+                'unique_together': {('index_name', 'document_id')},
+            },
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.0.8 on 2026-10-17 23:03
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('openedx_search_api', '0006_documentfingerprint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IndexCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('index_name', models.CharField(max_length=255, unique=True)),
+                ('target_name', models.CharField(max_length=255)),
+                ('cursor', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder, null=True)),
+                ('batches', models.PositiveIntegerField(default=0)),
+                ('task_uids', models.JSONField(default=list)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.0.8 on 2026-10-18 00:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('openedx_search_api', '0007_indexcheckpoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='documentfingerprint',
+            name='pending_fingerprint',
+            field=models.BigIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='documentfingerprint',
+            name='pending_run',
+            field=models.CharField(blank=True, default='', max_length=32),
+        ),
+        migrations.AlterField(
+            model_name='documentfingerprint',
+            name='fingerprint',
+            field=models.BigIntegerField(null=True),
+        ),
+        migrations.AddIndex(
+            model_name='documentfingerprint',
+            index=models.Index(fields=['index_name', 'pending_run'], name='openedx_sea_index_n_967e86_idx'),
+        ),
+    ]
@@ -4,6 +4,7 @@ Define you models here
 from datetime import datetime
 
 from django.contrib.auth import get_user_model
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 
 User = get_user_model()
@@ -15,9 +16,11 @@ class SearchEngineToken(models.Model):
     """
     token = models.TextField()
     token_type = models.CharField(max_length=255)
-    expires_at = models.DateTimeField()
+    expires_at = models.DateTimeField(db_index=True)
     search_engine = models.CharField(max_length=255)
     index_search_rules = models.JSONField()
+    api_key_uid = models.CharField(max_length=255, blank=True, default='')
+    rules_fingerprint = models.CharField(max_length=64, blank=True, default='')
     user = models.OneToOneField(User, on_delete=models.CASCADE)
 
     objects = models.Manager()
@@ -31,6 +34,15 @@ class SearchEngineToken(models.Model):
         """
         return cls.objects.filter(user_id=user.id, expires_at__gt=datetime.now()).first()
 
+    @classmethod
+    async def aget_active_token(cls, user):
+        """
+        Returns active token key object using the async ORM
+        :param user:
+        :return:
+        """
+        return await cls.objects.filter(user_id=user.id, expires_at__gt=datetime.now()).afirst()
+
 
 class SearchApiKeyModel(models.Model):
     """
@@ -40,7 +52,7 @@ class SearchApiKeyModel(models.Model):
     name = models.CharField(max_length=255, blank=True, null=True)
     actions = models.JSONField()
     indexes = models.JSONField()
-    expires_at = models.DateTimeField()
+    expires_at = models.DateTimeField(db_index=True)
     key = models.CharField(max_length=500)
     created_at = models.DateTimeField()
     updated_at = models.DateTimeField()
@@ -56,3 +68,84 @@ class SearchApiKeyModel(models.Model):
         :return:
         """
         return cls.objects.filter(user_id=user.id, expires_at__gt=datetime.now()).first()
+
+    @classmethod
+    async def aget_active_api_key(cls, user):
+        """
+        Returns active api key object using the async ORM
+        :param user:
+        :return:
+        """
+        return await cls.objects.filter(user_id=user.id, expires_at__gt=datetime.now()).afirst()
+
+
+class IndexWatermark(models.Model):
+    """
+    It is to store the high-water mark reached by the last successful load of an index
+    """
+    index_name = models.CharField(max_length=255, unique=True)
+    field = models.CharField(max_length=255)
+    value = models.JSONField(encoder=DjangoJSONEncoder)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = models.Manager()
+
+    @classmethod
+    def get_value(cls, index_name, field):
+        """
+        Returns watermark value of the index when it was recorded for the same field
+        :param index_name:
+        :param field:
+        :return:
+        """
+        watermark = cls.objects.filter(index_name=index_name, field=field).first()
+        return watermark.value if watermark else None
+
+    @classmethod
+    def set_value(cls, index_name, field, value):
+        """
+        Stores watermark value of the index
+        :param index_name:
+        :param field:
+        :param value:
+        :return:
+        """
+        return cls.objects.update_or_create(
+            index_name=index_name, defaults={'field': field, 'value': value}
+        )[0]
+
+
+class DocumentFingerprint(models.Model):
+    """
+    It is to store the hash of the last document sent to an index for every primary key,
+    and the hash sent by a running load until its tasks succeed
+    """
+    index_name = models.CharField(max_length=255)
+    document_id = models.CharField(max_length=255)
+    fingerprint = models.BigIntegerField(null=True)
+    pending_fingerprint = models.BigIntegerField(null=True)
+    pending_run = models.CharField(max_length=32, blank=True, default='')
+
+    objects = models.Manager()
+
+    # pylint: disable=too-few-public-methods
+    class Meta:
+        """
+        Meta class for the model.
+        """
+        unique_together = ('index_name', 'document_id')
+        indexes = [models.Index(fields=['index_name', 'pending_run'])]
+
+
+class IndexCheckpoint(models.Model):
+    """
+    It is to store the progress of a running index load so an interrupted run can be resumed
+    """
+    index_name = models.CharField(max_length=255, unique=True)
+    target_name = models.CharField(max_length=255)
+    cursor = models.JSONField(encoder=DjangoJSONEncoder, null=True)
+    batches = models.PositiveIntegerField(default=0)
+    task_uids = models.JSONField(default=list)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = models.Manager()
@@ -0,0 +1,120 @@
+"""
+Signal handlers keeping model indexes up to date between full loads.
+"""
+
+import atexit
+from functools import partial
+
+from django.apps import apps
+from django.conf import settings
+from django.db import transaction
+from django.core.signals import setting_changed
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import token_cache
+from .drivers.meilisearch import get_compiled_search_rules
+from .indexers.incremental import IncrementalIndexBuffer
+from .metrics import count_query, get_exporters, is_enabled
+from .models import SearchApiKeyModel, SearchEngineToken
+
+index_buffer = IncrementalIndexBuffer()
+_model_indexes = {}
+
+
+@receiver(post_save, sender=SearchEngineToken, dispatch_uid='search_token_cache_token_save')
+@receiver(post_delete, sender=SearchEngineToken, dispatch_uid='search_token_cache_token_delete')
+@receiver(post_save, sender=SearchApiKeyModel, dispatch_uid='search_token_cache_key_save')
+@receiver(post_delete, sender=SearchApiKeyModel, dispatch_uid='search_token_cache_key_delete')
+def invalidate_token_cache(sender, instance, **kwargs):  # pylint: disable=unused-argument
+    """
+    Drop the cached tokens of a user whenever the stored token or api key is rotated.
+    """
+    token_cache.invalidate(instance.user_id)
+
+
+@receiver(setting_changed, dispatch_uid='search_rules_setting_changed')
+def recompile_search_rules(sender, setting, **kwargs):  # pylint: disable=unused-argument
+    """
+    Drop the compiled search rules when INDEX_CONFIGURATIONS changes at runtime.
+    """
+    if setting == 'INDEX_CONFIGURATIONS':
+        get_compiled_search_rules.cache_clear()
+
+
+@receiver(setting_changed, dispatch_uid='search_metrics_setting_changed')
+def reload_metrics_exporters(sender, setting, **kwargs):  # pylint: disable=unused-argument
+    """
+    Read the metrics settings again when they change at runtime.
+    """
+    if setting.startswith('SEARCH_METRICS_'):
+        is_enabled.cache_clear()
+        get_exporters.cache_clear()
+
+
+@receiver(connection_created, dispatch_uid='search_metrics_connection_created')
+def install_query_counter(sender, connection, **kwargs):  # pylint: disable=unused-argument
+    """
+    Count the queries of every database connection for the token request metrics.
+    """
+    if count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_query)
+
+
+def _get_index_names(sender):
+    """
+    Returns names of the indexes built from the sender model
+    :param sender:
+    :return:
+    """
+    return _model_indexes.get(sender, ())
+
+
+def handle_post_save(sender, instance, **kwargs):  # pylint: disable=unused-argument
+    """
+    Queue an upsert of the saved row once the transaction commits.
+    """
+    for index_name in _get_index_names(sender):
+        transaction.on_commit(partial(index_buffer.add, index_name, instance.pk))
+
+
+def handle_post_delete(sender, instance, **kwargs):  # pylint: disable=unused-argument
+    """
+    Queue a removal of the deleted row once the transaction commits.
+    """
+    for index_name in _get_index_names(sender):
+        transaction.on_commit(partial(index_buffer.add, index_name, instance.pk, deleted=True))
+
+
+def connect_incremental_indexing():
+    """
+    Connect the save and delete handlers of every model_class index configuration.
+    """
+    index_configurations = getattr(settings, 'INDEX_CONFIGURATIONS', {})
+    _model_indexes.clear()
+    for index_name, config in index_configurations.items():
+        if 'model_class' in config:
+            model_klass = apps.get_model(*config['model_class'].split('.'))
+            _model_indexes.setdefault(model_klass, []).append(index_name)
+    for model_klass in _model_indexes:
+        label = model_klass._meta.label_lower  # pylint: disable=protected-access
+        post_save.connect(
+            handle_post_save, sender=model_klass, dispatch_uid=f'search_index_save_{label}'
+        )
+        post_delete.connect(
+            handle_post_delete, sender=model_klass, dispatch_uid=f'search_index_delete_{label}'
+        )
+    atexit.register(index_buffer.flush)
+
+
+def disconnect_incremental_indexing():
+    """
+    Disconnect the handlers connected by connect_incremental_indexing.
+    """
+    for model_klass in _model_indexes:
+        label = model_klass._meta.label_lower  # pylint: disable=protected-access
+        post_save.disconnect(sender=model_klass, dispatch_uid=f'search_index_save_{label}')
+        post_delete.disconnect(sender=model_klass, dispatch_uid=f'search_index_delete_{label}')
+    _model_indexes.clear()
+    atexit.unregister(index_buffer.flush)
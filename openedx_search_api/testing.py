@@ -0,0 +1,385 @@
+"""
+In-process HTTP stand-in for the Meilisearch endpoints used by openedx_search_api, shared by
+the tests and the benchmarks.
+
+It implements health, keys, indexes, settings, documents, swaps and tasks with an
+optional fixed latency per request. Tasks succeed as soon as they are enqueued and only
+document counts are kept, so the stand-in costs the benchmarked code as little as possible.
+"""
+
+import gzip
+import json
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+def _now():
+    return datetime.now(tz=timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+
+
+def _count_documents(body, content_type):
+    if 'ndjson' in content_type:
+        return sum(1 for line in body.splitlines() if line.strip())
+    documents = json.loads(body or b'[]')
+    return len(documents) if isinstance(documents, list) else 1
+
+
+class FakeMeilisearchState:
+    """
+    Indexes, keys and tasks of the stand-in.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.indexes = {}
+        self.keys = {}
+        self.tasks = {}
+        self.requests = 0
+
+    def enqueue(self, index_uid, task_type, details=None):
+        """
+        Returns TaskInfo payload of a task recorded as already succeeded.
+        """
+        with self.lock:
+            uid = len(self.tasks)
+            now = _now()
+            self.tasks[uid] = {
+                'uid': uid, 'indexUid': index_uid, 'status': 'succeeded', 'type': task_type,
+                'details': details or {}, 'error': None, 'duration': 'PT0S',
+                'enqueuedAt': now, 'startedAt': now, 'finishedAt': now,
+            }
+        return {
+            'taskUid': uid, 'indexUid': index_uid, 'status': 'enqueued', 'type': task_type,
+            'enqueuedAt': now,
+        }
+
+    def create_index(self, uid, primary_key=None):
+        """
+        Create an index unless it exists.
+        """
+        with self.lock:
+            now = _now()
+            self.indexes.setdefault(uid, {
+                'uid': uid, 'primaryKey': primary_key, 'createdAt': now, 'updatedAt': now,
+                'settings': {}, 'documents': 0,
+            })
+            return self.indexes[uid]
+
+    def create_key(self, options):
+        """
+        Returns a new API key.
+        """
+        uid = str(uuid.uuid4())
+        now = _now()
+        key = {
+            'uid': uid, 'key': uuid.uuid4().hex, 'name': options.get('name'),
+            'description': options.get('description') or '',
+            'actions': options.get('actions', ['*']), 'indexes': options.get('indexes', ['*']),
+            'expiresAt': options.get('expiresAt') or (
+                datetime.now(tz=timezone.utc) + timedelta(days=7)
+            ).strftime('%Y-%m-%dT%H:%M:%S.%fZ'),
+            'createdAt': now, 'updatedAt': now,
+        }
+        with self.lock:
+            self.keys[uid] = key
+        return key
+
+
+class FakeMeilisearchHandler(BaseHTTPRequestHandler):
+    """
+    Route the requests of the Meilisearch client to the shared state.
+
+    Every route handler receives the request body, the parsed query string and the
+    parameters of its path pattern as keyword arguments.
+    """
+    # pylint: disable=unused-argument, too-many-public-methods
+    protocol_version = 'HTTP/1.1'
+    routes = (
+        ('GET', r'/health', 'health'),
+        ('GET', r'/keys', 'list_keys'),
+        ('POST', r'/keys', 'create_key'),
+        ('DELETE', r'/keys/(?P<uid>[^/]+)', 'delete_key'),
+        ('GET', r'/indexes', 'list_indexes'),
+        ('POST', r'/indexes', 'create_index'),
+        ('GET', r'/indexes/(?P<uid>[^/]+)', 'get_index'),
+        ('DELETE', r'/indexes/(?P<uid>[^/]+)', 'delete_index'),
+        ('GET', r'/indexes/(?P<uid>[^/]+)/settings', 'get_settings'),
+        ('PATCH', r'/indexes/(?P<uid>[^/]+)/settings', 'update_settings'),
+        ('POST', r'/indexes/(?P<uid>[^/]+)/documents', 'add_documents'),
+        ('PUT', r'/indexes/(?P<uid>[^/]+)/documents', 'add_documents'),
+        ('POST', r'/swap-indexes', 'swap_indexes'),
+        ('GET', r'/tasks', 'list_tasks'),
+        ('GET', r'/tasks/(?P<uid>\d+)', 'get_task'),
+    )
+
+    @property
+    def state(self):
+        """
+        Returns state shared by every request of the server
+        :return:
+        """
+        return self.server.state
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        pass
+
+    def _body(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        if self.headers.get('Content-Encoding') == 'gzip':
+            body = gzip.decompress(body)
+        return body
+
+    def _send(self, status, payload=None):
+        body = json.dumps(payload).encode() if payload is not None else b''
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _not_found(self, code, message):
+        self._send(404, {'message': message, 'code': code, 'type': 'invalid_request', 'link': ''})
+
+    def _dispatch(self, method):
+        url = urlparse(self.path)
+        body = self._body()
+        with self.state.lock:
+            self.state.requests += 1
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        for route_method, pattern, handler in self.routes:
+            match = re.fullmatch(pattern, url.path)
+            if route_method == method and match:
+                getattr(self, handler)(body=body, query=parse_qs(url.query), **match.groupdict())
+                return
+        self._not_found('not_found', f'{method} {url.path} is not implemented')
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        """
+        Handle GET requests.
+        """
+        self._dispatch('GET')
+
+    def do_POST(self):  # pylint: disable=invalid-name
+        """
+        Handle POST requests.
+        """
+        self._dispatch('POST')
+
+    def do_PUT(self):  # pylint: disable=invalid-name
+        """
+        Handle PUT requests.
+        """
+        self._dispatch('PUT')
+
+    def do_PATCH(self):  # pylint: disable=invalid-name
+        """
+        Handle PATCH requests.
+        """
+        self._dispatch('PATCH')
+
+    def do_DELETE(self):  # pylint: disable=invalid-name
+        """
+        Handle DELETE requests.
+        """
+        self._dispatch('DELETE')
+
+    def health(self, **kwargs):
+        """
+        Answer the health check.
+        """
+        self._send(200, {'status': 'available'})
+
+    def list_keys(self, **kwargs):
+        """
+        List the API keys.
+        """
+        keys = list(self.state.keys.values())
+        self._send(200, {'results': keys, 'offset': 0, 'limit': len(keys), 'total': len(keys)})
+
+    def create_key(self, body, **kwargs):
+        """
+        Create an API key.
+        """
+        self._send(201, self.state.create_key(json.loads(body or b'{}')))
+
+    def delete_key(self, uid, **kwargs):
+        """
+        Delete an API key.
+        """
+        with self.state.lock:
+            key = self.state.keys.pop(uid, None)
+        if key is None:
+            self._not_found('api_key_not_found', f'API key `{uid}` not found.')
+        else:
+            self._send(204)
+
+    def list_indexes(self, **kwargs):
+        """
+        List the indexes.
+        """
+        indexes = [
+            {field: index[field] for field in ('uid', 'primaryKey', 'createdAt', 'updatedAt')}
+            for index in self.state.indexes.values()
+        ]
+        self._send(200, {
+            'results': indexes, 'offset': 0, 'limit': len(indexes), 'total': len(indexes)
+        })
+
+    def create_index(self, body, **kwargs):
+        """
+        Create an index.
+        """
+        options = json.loads(body or b'{}')
+        self.state.create_index(options['uid'], options.get('primaryKey'))
+        self._send(202, self.state.enqueue(options['uid'], 'indexCreation'))
+
+    def get_index(self, uid, **kwargs):
+        """
+        Get the information of an index.
+        """
+        index = self.state.indexes.get(uid)
+        if index is None:
+            self._not_found('index_not_found', f'Index `{uid}` not found.')
+            return
+        self._send(200, {
+            field: index[field] for field in ('uid', 'primaryKey', 'createdAt', 'updatedAt')
+        })
+
+    def delete_index(self, uid, **kwargs):
+        """
+        Delete an index.
+        """
+        with self.state.lock:
+            self.state.indexes.pop(uid, None)
+        self._send(202, self.state.enqueue(uid, 'indexDeletion'))
+
+    def get_settings(self, uid, **kwargs):
+        """
+        Get the settings of an index.
+        """
+        index = self.state.indexes.get(uid)
+        if index is None:
+            self._not_found('index_not_found', f'Index `{uid}` not found.')
+            return
+        self._send(200, index['settings'])
+
+    def update_settings(self, uid, body, **kwargs):
+        """
+        Update the settings of an index.
+        """
+        self.state.create_index(uid)['settings'].update(json.loads(body or b'{}'))
+        self._send(202, self.state.enqueue(uid, 'settingsUpdate'))
+
+    def add_documents(self, uid, body, query, **kwargs):
+        """
+        Count the documents added to an index.
+        """
+        count = _count_documents(body, self.headers.get('Content-Type', ''))
+        index = self.state.create_index(uid, (query.get('primaryKey') or [None])[0])
+        with self.state.lock:
+            index['documents'] += count
+        self._send(202, self.state.enqueue(
+            uid, 'documentAdditionOrUpdate', {'receivedDocuments': count, 'indexedDocuments': count}
+        ))
+
+    def swap_indexes(self, body, **kwargs):
+        """
+        Swap indexes.
+        """
+        for swap in json.loads(body or b'[]'):
+            first, second = swap['indexes']
+            with self.state.lock:
+                indexes = self.state.indexes
+                indexes[first], indexes[second] = indexes.get(second), indexes.get(first)
+        self._send(202, self.state.enqueue(None, 'indexSwap'))
+
+    def list_tasks(self, query, **kwargs):
+        """
+        List tasks, optionally filtered by uids.
+        """
+        uids = [int(uid) for value in query.get('uids', []) for uid in value.split(',')]
+        tasks = list(self.state.tasks.values())
+        if uids:
+            tasks = [self.state.tasks[uid] for uid in uids if uid in self.state.tasks]
+        self._send(200, {
+            'results': tasks, 'limit': len(tasks), 'total': len(tasks), 'from': None, 'next': None
+        })
+
+    def get_task(self, uid, **kwargs):
+        """
+        Get a task.
+        """
+        task = self.state.tasks.get(int(uid))
+        if task is None:
+            self._not_found('task_not_found', f'Task `{uid}` not found.')
+            return
+        self._send(200, task)
+
+
+class FakeMeilisearch:
+    """
+    Local Meilisearch stand-in serving from a background thread.
+
+    Usable as a context manager::
+
+        with FakeMeilisearch(latency=0.002) as engine:
+            settings.MEILISEARCH_URL = engine.url
+    """
+
+    def __init__(self, latency=0.0, host='127.0.0.1', port=0):
+        """
+        Initialize the stand-in.
+
+        :param latency: Seconds every request waits before being answered.
+        :param host: Address to listen on.
+        :param port: Port to listen on, a free one by default.
+        """
+        self.server = ThreadingHTTPServer((host, port), FakeMeilisearchHandler)
+        self.server.daemon_threads = True
+        self.server.latency = latency
+        self.server.state = FakeMeilisearchState()
+        self._thread = None
+
+    @property
+    def url(self):
+        """
+        Returns base URL of the stand-in
+        :return:
+        """
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    @property
+    def state(self):
+        """
+        Returns indexes, keys and tasks of the stand-in
+        :return:
+        """
+        return self.server.state
+
+    def start(self):
+        """
+        Start serving in a daemon thread.
+        """
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stop serving and close the socket.
+        """
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
@@ -2,3 +2,8 @@
 Import test cases for search module
 """
 from .base_tests import *
+from .indexer_tests import *
+from .signals_tests import *
+from .cache_tests import *
+from .token_tests import *
+from .metrics_tests import *
@@ -2,14 +2,26 @@
 Unit tests for the MeiliSearchEngine driver in the openedx_search_api package.
 """
 import json
+import os
+import tempfile
 from io import StringIO
+from unittest import mock
 
 from django.contrib.auth import get_user_model
 from django.core import management
-from django.test import TestCase, RequestFactory
+from django.test import TestCase, RequestFactory, override_settings
+from meilisearch import errors
 
-from openedx_search_api.drivers import DriverFactory
-from openedx_search_api.views import AuthTokenView
+from openedx_search_api.drivers import DriverFactory, SearchError
+from openedx_search_api.drivers.filters import parse_filter
+from openedx_search_api.drivers.meilisearch import (
+    MeiliSearchEngine,
+    diff_settings,
+    index_metadata_cache
+)
+from openedx_search_api.models import SearchEngineToken
+from openedx_search_api.testing import FakeMeilisearch
+from openedx_search_api.views import AuthTokenView, SearchView
 
 
 class DriverTestCase(TestCase):
@@ -33,6 +45,18 @@ class DriverTestCase(TestCase):
 
         self.assertTrue(client.check_connection(), msg="Connection status")
 
+    def test_client_is_shared(self):
+        """
+        Driver instances are per request but share one pooled Meilisearch client.
+        """
+        request = self.request_factory.get('/token')
+        request.user = self.user
+        first = DriverFactory.get_client(request)
+        second = DriverFactory.get_client(None)
+        self.assertIsNot(first, second)
+        self.assertIs(first.client, second.client)
+        self.assertIs(first.request, request)
+
     def test_create_api_key(self):
         """
         Create api key test
@@ -59,6 +83,293 @@ class DriverTestCase(TestCase):
         self.assertIn('search_engine', payload)
 
 
+class IndexMetadataTestCase(TestCase):
+    """
+    Test case for the index metadata cache and the settings reconciler.
+    """
+    url = 'http://meilisearch.test'
+    settings = {'filterableAttributes': ['IS_STAFF', 'USERNAME'], 'rankingRules': ['words']}
+
+    def setUp(self):
+        self.client = mock.Mock()
+        self.index = self.client.index.return_value
+        self.index.get_settings.return_value = {
+            'filterableAttributes': ['USERNAME', 'IS_STAFF'], 'rankingRules': ['words', 'typo'],
+            'typoTolerance': {'enabled': True, 'minWordSizeForTypos': {'oneTypo': 5}},
+        }
+        self.engine = MeiliSearchEngine(None, self.url, self.url, 'key', client=self.client)
+        index_metadata_cache.invalidate(self.url)
+        self.addCleanup(index_metadata_cache.invalidate, self.url)
+
+    def test_existing_index_only_receives_changed_settings(self):
+        """
+        Settings are fetched once and only the changed keys are sent.
+        """
+        self.engine.index('courses', self.settings)
+        self.index.update_settings.assert_called_once_with({'rankingRules': ['words']})
+        self.client.create_index.assert_not_called()
+
+    def test_index_metadata_is_cached(self):
+        """
+        Later calls with the same configuration make no request until invalidated.
+        """
+        for _ in range(3):
+            self.engine.index('courses', self.settings)
+        self.index.fetch_info.assert_called_once()
+        self.index.get_settings.assert_called_once()
+        self.engine.index('courses', {'rankingRules': ['words', 'typo']})
+        self.assertEqual(self.index.fetch_info.call_count, 2)
+        self.engine.delete_index('courses')
+        self.engine.index('courses', {'rankingRules': ['words', 'typo']})
+        self.assertEqual(self.index.fetch_info.call_count, 3)
+
+    def test_missing_index_is_created_with_settings(self):
+        """
+        A missing index is created and receives every configured setting.
+        """
+        self.index.fetch_info.side_effect = errors.MeilisearchApiError(
+            'index_not_found', mock.Mock(status_code=404, text='')
+        )
+        self.engine.index('courses', self.settings, options={'primaryKey': 'id'})
+        self.client.create_index.assert_called_once_with('courses', {'primaryKey': 'id'})
+        self.index.update_settings.assert_called_once_with(self.settings)
+        self.index.get_settings.assert_not_called()
+
+    def test_diff_settings(self):
+        """
+        Unordered attribute lists and nested settings are compared on what they configure.
+        """
+        current = self.index.get_settings.return_value
+        self.assertEqual(diff_settings(current, {
+            'sortableAttributes': [],
+            'filterableAttributes': ['IS_STAFF', 'USERNAME'],
+            'typoTolerance': {'minWordSizeForTypos': {'oneTypo': 5}},
+        }), {'sortableAttributes': []})
+        self.assertEqual(
+            diff_settings(current, {'typoTolerance': {'enabled': False}}),
+            {'typoTolerance': {'enabled': False}}
+        )
+
+
+class FakeMeilisearchTestCase(TestCase):
+    """
+    Test case running the driver against the local Meilisearch stand-in of the benchmarks.
+    """
+
+    def setUp(self):
+        self.engine = FakeMeilisearch().start()
+        self.addCleanup(self.engine.stop)
+        settings_override = override_settings(
+            MEILISEARCH_URL=self.engine.url, MEILISEARCH_PUBLIC_URL=self.engine.url
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.addCleanup(index_metadata_cache.invalidate, self.engine.url)
+        self.user = get_user_model().objects.create_user(username='testuser', password='testpass')
+
+    def test_token_view(self):
+        """
+        The token view creates one engine key and signs a token with it.
+        """
+        request = RequestFactory().get('/token')
+        request.user = self.user
+        payload = json.loads(AuthTokenView().get(request).content)
+        self.assertIn('token', payload)
+        self.assertEqual(len(self.engine.state.keys), 1)
+
+    def test_load_indexes(self):
+        """
+        load_indexes creates the index with its settings and every task succeeds.
+        """
+        management.call_command('load_indexes', wait=True, stdout=StringIO())
+        index = self.engine.state.indexes['user_content']
+        self.assertEqual(index['documents'], 1)
+        self.assertEqual(
+            index['settings']['filterableAttributes'], ['IS_SUPERUSER', 'USERNAME', 'IS_STAFF']
+        )
+
+
+SQLITE_INDEX_CONFIGURATIONS = {
+    'user_content': {
+        'options': {'primaryKey': 'id'},
+        'search_rules': ['is_staff = false'],
+        'settings': {
+            'searchableAttributes': ['username', 'first_name', 'email'],
+            'filterableAttributes': ['id', 'is_staff', 'username'],
+            'sortableAttributes': ['id'],
+        },
+        'model_class': 'auth.User',
+        'fields': ['id', 'username', 'first_name', 'email', 'is_staff'],
+    }
+}
+
+
+class SqliteDriverTestCase(TestCase):
+    """
+    Test case for the embedded SQLite FTS5 driver.
+    """
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(
+            SEARCH_ENGINE='openedx_search_api.drivers.sqlite.SqliteSearchEngine',
+            SQLITE_SEARCH_DATABASE=os.path.join(directory.name, 'search.sqlite3'),
+            INDEX_CONFIGURATIONS=SQLITE_INDEX_CONFIGURATIONS,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        user_model = get_user_model()
+        self.staff = user_model.objects.create_user(
+            username='alice', email='alice@example.com', is_staff=True
+        )
+        self.user = user_model.objects.create_user(username='bob', email='bob@example.com')
+        user_model.objects.create_user(
+            username='carol', first_name='Caroline', email='bob.fan@example.com'
+        )
+        management.call_command('load_indexes', wait=True, stdout=StringIO())
+        self.client = DriverFactory.get_client(None)
+
+    def search(self, **params):
+        """
+        Returns usernames of the hits of a search on the index
+        """
+        response = self.client.search_index('user_content', params)
+        return [hit['username'] for hit in response['hits']]
+
+    def test_search_ranks_with_bm25(self):
+        """
+        Matches on earlier searchable attributes rank first and the last word is a prefix.
+        """
+        self.assertEqual(self.search(q='bob'), ['bob', 'carol'])
+        self.assertEqual(self.search(q='carol'), ['carol'])
+        self.assertEqual(self.search(q='Car'), ['carol'])
+        self.assertEqual(self.search(q='bob fan'), ['carol'])
+        self.assertEqual(self.search(q='', sort=['id:desc'], limit=2), ['carol', 'bob'])
+
+    def test_filters(self):
+        """
+        Filters on filterable attributes run on their columns.
+        """
+        self.assertEqual(self.search(filter='is_staff = false'), ['bob', 'carol'])
+        self.assertEqual(self.search(filter='username IN [alice, carol]'), ['alice', 'carol'])
+        self.assertEqual(self.search(filter='NOT username = bob'), ['alice', 'carol'])
+        self.assertEqual(self.search(filter=f'id > {self.user.id}'), ['carol'])
+        self.assertEqual(
+            self.search(filter=[f'id {self.staff.id} TO {self.user.id}', ['is_staff = true']]),
+            ['alice']
+        )
+        self.assertEqual(self.search(q='bob', filter='(id EXISTS) AND username != bob'), ['carol'])
+        with self.assertRaises(SearchError) as error:
+            self.search(filter='email = bob@example.com')
+        self.assertEqual(error.exception.code, 'invalid_search_filter')
+
+    def test_parse_filter(self):
+        """
+        Meilisearch filters, including the legacy colon form, parse into trees.
+        """
+        self.assertEqual(
+            parse_filter('IS_STAFF: false AND (a NOT IN [1, "x y"] OR NOT b EXISTS)'),
+            ('and', [
+                ('cmp', 'IS_STAFF', '=', 'false'),
+                ('or', [('not', ('in', 'a', ['1', 'x y'])), ('not', ('exists', 'b'))]),
+            ])
+        )
+        with self.assertRaises(SearchError):
+            parse_filter('a = ')
+
+    def test_documents_and_tasks(self):
+        """
+        Documents are replaced and deleted in transactions recorded as tasks.
+        """
+        index = self.client.index('user_content')
+        added = index.add_documents([{'id': self.user.id, 'username': 'robert'}])
+        deleted = index.delete_documents([self.staff.id])
+        failed = index.add_documents([{'username': 'nobody'}])
+        tasks = {task.uid: task for task in self.client.get_tasks(
+            [added.task_uid, deleted.task_uid, failed.task_uid]
+        )}
+        self.assertEqual(tasks[added.task_uid].status, 'succeeded')
+        self.assertEqual(tasks[deleted.task_uid].details['deletedDocuments'], 1)
+        self.assertEqual(tasks[failed.task_uid].error['code'], 'missing_document_id')
+        self.assertEqual(self.search(q='robert'), ['robert'])
+        self.assertEqual(self.search(q='bob'), ['carol'])
+
+    def test_list_values_and_settings_changes(self):
+        """
+        List elements are filterable and changing the attributes rebuilds the index tables.
+        """
+        index = self.client.index('tagged', {'filterableAttributes': ['tags']})
+        index.add_documents([
+            {'id': 1, 'title': 'Python basics', 'tags': ['python', 'beginner']},
+            {'id': 2, 'title': 'Advanced Django', 'tags': ['python', 'django'], 'level': 3},
+        ])
+        response = index.search('', {'filter': 'tags = django'})
+        self.assertEqual([hit['id'] for hit in response['hits']], [2])
+        self.client.index('tagged', {'filterableAttributes': ['tags', 'level']})
+        response = index.search('django', {'filter': 'level >= 3 AND tags IN [python]'})
+        self.assertEqual([hit['id'] for hit in response['hits']], [2])
+
+    def test_rebuild_swaps_indexes(self):
+        """
+        load_indexes --rebuild loads a shadow index and swaps it with the live one.
+        """
+        get_user_model().objects.filter(username='carol').delete()
+        management.call_command('load_indexes', rebuild=True, wait=True, stdout=StringIO())
+        self.assertEqual(self.search(), ['alice', 'bob'])
+        self.assertEqual(
+            [index.uid for index in self.client.indexes()['results']], ['user_content']
+        )
+
+    def test_search_view_enforces_token_rules(self):
+        """
+        The search view validates the signed token and applies its search rules.
+        """
+        request = RequestFactory().get('/token')
+        request.user = self.staff
+        token = json.loads(AuthTokenView().get(request).content)
+        self.assertEqual(token['search_engine'], 'sqlite')
+
+        def search(authorization, **params):
+            request = RequestFactory().post(
+                '/search/indexes/user_content/search', json.dumps(params),
+                content_type='application/json', HTTP_AUTHORIZATION=authorization
+            )
+            response = SearchView.as_view()(request, index_uid='user_content')
+            return response.status_code, json.loads(response.content)
+
+        status, payload = search(f"Bearer {token['token']}", q='example')
+        self.assertEqual(status, 200)
+        self.assertCountEqual([hit['username'] for hit in payload['hits']], ['bob', 'carol'])
+        status, payload = search(f"Bearer {token['token']}", filter='username = carol')
+        self.assertEqual(payload['estimatedTotalHits'], 1)
+        status, payload = search(
+            f"Bearer {token['token']}", filter='username = alice) OR (username = alice'
+        )
+        self.assertEqual((status, payload['code']), (400, 'invalid_search_filter'))
+        status, payload = search(
+            f"Bearer {token['token']}", filter=['username = alice', ['username = alice']]
+        )
+        self.assertEqual(payload['hits'], [])
+        self.assertEqual(search('Bearer invalid')[0], 403)
+        self.assertEqual(search('')[1]['code'], 'missing_authorization_header')
+        with self.assertRaises(SearchError) as error:
+            self.client.search(token['token'], 'other', {})
+        self.assertEqual(error.exception.status_code, 403)
+        SearchEngineToken.objects.filter(user=self.staff).delete()
+        self.assertEqual(search(f"Bearer {token['token']}")[0], 403)
+
+    def test_hits_are_capped(self):
+        """
+        Only the first maxTotalHits hits can be reached, whatever the limit.
+        """
+        self.client.index('user_content', {'pagination': {'maxTotalHits': 2}})
+        self.assertEqual(len(self.search(limit=100000000)), 2)
+        self.assertEqual(self.search(offset=1, limit=5), ['bob'])
+        response = self.client.search_index('user_content', {'offset': 2})
+        self.assertEqual((response['hits'], response['estimatedTotalHits']), ([], 2))
+
+
 class CommandTest(TestCase):
     """
     This test case if covering management commands
@@ -0,0 +1,192 @@
+"""
+Unit tests for the token cache in front of the database.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connections
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+
+from openedx_search_api.cache import RELEASE_LOCK_SCRIPT, token_cache
+from openedx_search_api.drivers.meilisearch import MeiliSearchEngine
+from openedx_search_api.models import SearchApiKeyModel, SearchEngineToken
+
+
+def make_engine(request, client):
+    """
+    Build a MeiliSearchEngine around a mocked Meilisearch client.
+    """
+    client.create_key.return_value = SimpleNamespace(
+        uid='c471bd40-303b-48bc-bb80-4602baff2675', name=None, actions=['*'], indexes=['*'],
+        key='key', expires_at=datetime.now(tz=timezone.utc) + timedelta(days=7),
+        created_at=datetime.now(tz=timezone.utc), updated_at=datetime.now(tz=timezone.utc)
+    )
+    client.generate_tenant_token.side_effect = (
+        lambda **kwargs: f"token-{kwargs['api_key_uid']}-{kwargs['search_rules']}"
+    )
+    return MeiliSearchEngine(
+        request, 'http://localhost:7700', 'http://localhost:7700', 'masterKey', client=client
+    )
+
+
+class EngineTestCase(TestCase):
+    """
+    Base test case for token issuing through a MeiliSearchEngine with a mocked client.
+    """
+
+    def setUp(self):
+        cache.clear()
+        token_cache.clear()
+        self.addCleanup(token_cache.clear)
+        self.user = get_user_model().objects.create_user(username='testuser', password='testpass')
+        self.request = RequestFactory().get('/token')
+        self.request.user = self.user
+        self.client = mock.Mock()
+
+
+class TokenCacheTestCase(EngineTestCase):
+    """
+    Test case for TokenCache.
+    """
+
+    def test_hit_does_not_touch_database(self):
+        """
+        A second token request is served from the cache without any query.
+        """
+        rules = make_engine(self.request, self.client).get_search_rules()
+        first = make_engine(self.request, self.client).get_user_token(rules)
+        with self.assertNumQueries(0):
+            second = make_engine(self.request, self.client).get_user_token(rules)
+        self.assertEqual(first['token'], second['token'])
+        self.client.create_key.assert_called_once()
+
+    def test_shared_tier_is_used_after_local_miss(self):
+        """
+        Another process, with an empty local tier, gets the token from the Django cache.
+        """
+        rules = {'user_content': {'filter': 'IS_STAFF: false'}}
+        make_engine(self.request, self.client).get_user_token(rules)
+        token_cache.clear()
+        with self.assertNumQueries(0):
+            self.assertIsNotNone(token_cache.get(self.user.id, rules))
+
+    def test_rotation_invalidates_cache(self):
+        """
+        Rotating the stored token drops every cached token of the user.
+        """
+        rules = {'user_content': {'filter': 'IS_STAFF: false'}}
+        make_engine(self.request, self.client).get_user_token(rules)
+        SearchEngineToken.objects.get(user=self.user).delete()
+        self.assertIsNone(token_cache.get(self.user.id, rules))
+
+    def test_entries_expire_before_token(self):
+        """
+        Tokens expiring within the safety margin are never cached.
+        """
+        response = {
+            'token': 'token',
+            'expires_at': datetime.now(tz=timezone.utc) + timedelta(seconds=60)
+        }
+        token_cache.set(self.user.id, {}, response)
+        self.assertIsNone(token_cache.get(self.user.id, {}))
+
+    def test_lock_taken_over_is_not_released(self):
+        """
+        Releasing an expired lock keeps the lock its new holder took in the meantime.
+        """
+        key = token_cache.lock_key(self.user.id)
+        self.addCleanup(cache.delete, key)
+        with token_cache.lock(self.user.id):
+            cache.set(key, 'other')
+        self.assertEqual(cache.get(key), 'other')
+
+    def test_stuck_holder_does_not_block_other_threads(self):
+        """
+        Threads of the user stop waiting for a stuck holder after the lock timeout.
+        """
+        release = threading.Event()
+        holding = threading.Event()
+
+        def hold():
+            with token_cache.lock(self.user.id):
+                holding.set()
+                release.wait(5)
+
+        holder = threading.Thread(target=hold)
+        holder.start()
+        self.addCleanup(holder.join)
+        self.addCleanup(release.set)
+        holding.wait(5)
+        started_at = time.monotonic()
+        with override_settings(SEARCH_TOKEN_LOCK_TIMEOUT=0.2), token_cache.lock(self.user.id):
+            self.assertLess(time.monotonic() - started_at, 2)
+
+    def test_redis_lock_is_released_atomically(self):
+        """
+        With Redis, the lock is released by a compare-and-delete script.
+        """
+        key = token_cache.lock_key(self.user.id)
+        self.addCleanup(cache.delete, key)
+        redis_client = mock.Mock()
+        with mock.patch(
+                'openedx_search_api.cache.get_redis_client', return_value=redis_client
+        ), token_cache.lock(self.user.id):
+            owner = cache.get(key)
+        redis_client.eval.assert_called_once_with(
+            RELEASE_LOCK_SCRIPT, 1, cache.make_and_validate_key(key), owner
+        )
+
+
+class SingleFlightTestCase(TransactionTestCase):
+    """
+    Test case for coalescing concurrent token requests of one user.
+    """
+
+    def setUp(self):
+        cache.clear()
+        token_cache.clear()
+        self.addCleanup(token_cache.clear)
+        self.user = get_user_model().objects.create_user(username='testuser', password='testpass')
+        self.client = mock.Mock()
+
+    def request_token(self, rules):
+        """
+        Issue a token from a new engine, as a concurrent request would.
+        """
+        try:
+            request = RequestFactory().get('/token')
+            request.user = self.user
+            return make_engine(request, self.client).get_user_token(rules)['token']
+        finally:
+            connections.close_all()
+
+    def test_concurrent_requests_create_one_key(self):
+        """
+        Parallel requests of a user wait for the first one instead of creating their own key.
+        """
+        request = RequestFactory().get('/token')
+        request.user = self.user
+        make_engine(request, self.client)
+        create_key = self.client.create_key.return_value
+        self.client.create_key.side_effect = lambda options: time.sleep(0.2) or create_key
+        rules = {'user_content': {'filter': 'IS_STAFF: false'}}
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            tokens = set(executor.map(self.request_token, [rules] * 4))
+        self.client.create_key.assert_called_once()
+        self.client.generate_tenant_token.assert_called_once()
+        self.assertEqual(len(tokens), 1)
+        self.assertEqual(SearchApiKeyModel.objects.count(), 1)
+
+    def test_abandoned_lock_expires(self):
+        """
+        A lock left behind by a crashed holder does not block token requests forever.
+        """
+        cache.add(token_cache.lock_key(self.user.id), 'crashed', 1)
+        with override_settings(SEARCH_TOKEN_LOCK_TIMEOUT=0.2):
+            self.assertTrue(self.request_token({'user_content': {}}))
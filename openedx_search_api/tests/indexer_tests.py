@@ -0,0 +1,818 @@
+"""
+Unit tests for the indexers in the openedx_search_api package.
+"""
+import datetime
+import os
+import pickle
+import tempfile
+from concurrent.futures import Future
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core import management
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import CommandError
+from django.db import connection
+from django.test import TestCase, override_settings
+from meilisearch.models.task import Task, TaskInfo
+
+from openedx_search_api.indexers.base import BaseIndexer, get_model_serializer
+from openedx_search_api.indexers.encoding import decode_ndjson
+from openedx_search_api.indexers.fingerprints import FingerprintStore, fingerprint_document
+from openedx_search_api.indexers.pipeline import IndexingPipeline
+from openedx_search_api.indexers.serializers import get_values_serializer
+from openedx_search_api.indexers.sharding import (
+    parse_shard,
+    shard_boundaries,
+    shard_queryset,
+    split_range
+)
+from openedx_search_api.indexers.tasks import TaskTracker
+from openedx_search_api.management.commands.load_indexes import Command
+from openedx_search_api.models import DocumentFingerprint, IndexCheckpoint, IndexWatermark
+
+
+class BaseIndexerTestCase(TestCase):
+    """
+    Test case for BaseIndexer.
+    """
+
+    def setUp(self):
+        self.users = [
+            get_user_model().objects.create_user(username=f'user{i}', password='testpass')
+            for i in range(5)
+        ]
+        self.serializer_class = Command().get_serializer(
+            get_user_model(), list_fields=['id', 'username']
+        )
+        self.client = mock.Mock()
+
+    def test_iter_batches(self):
+        """
+        The queryset is walked in primary key ordered chunks of batch_size rows.
+        """
+        indexer = BaseIndexer(
+            'user_content', get_user_model().objects.all(), self.serializer_class, self.client,
+            batch_size=2
+        )
+        batches = list(indexer.iter_batches())
+        self.assertEqual([len(rows) for rows in batches], [2, 2, 1])
+        self.assertEqual(
+            [row.pk for rows in batches for row in rows],
+            sorted(user.pk for user in self.users)
+        )
+
+    def test_index_sends_one_request_per_batch(self):
+        """
+        Every batch is serialized and sent with its own add_documents call.
+        """
+        indexer = BaseIndexer(
+            'user_content', get_user_model().objects.all(), self.serializer_class, self.client,
+            batch_size=2
+        )
+        task_infos = indexer.index()
+        add_documents = self.client.index.return_value.add_documents
+        self.assertEqual(len(task_infos), 3)
+        self.assertEqual(add_documents.call_count, 3)
+        self.assertEqual(
+            [doc['username'] for call in add_documents.call_args_list for doc in call.args[0]],
+            [user.username for user in self.users]
+        )
+
+    def test_index_with_workers(self):
+        """
+        Pipelined uploads send every batch and return the task infos in batch order.
+        """
+        indexer = BaseIndexer(
+            'user_content', get_user_model().objects.all(), self.serializer_class, self.client,
+            batch_size=2
+        )
+        add_documents = self.client.index.return_value.add_documents
+        add_documents.side_effect = lambda documents: [doc['username'] for doc in documents]
+        task_infos = indexer.index(workers=3, max_in_flight=1)
+        self.assertEqual(
+            task_infos, [['user0', 'user1'], ['user2', 'user3'], ['user4']]
+        )
+
+
+    def test_index_uploads_compressed_ndjson(self):
+        """
+        ndjson+gzip batches are posted as gzipped NDJSON payloads.
+        """
+        indexer = BaseIndexer(
+            'user_content', get_user_model().objects.all(), self.serializer_class, self.client,
+            batch_size=2, upload_format='ndjson+gzip'
+        )
+        indexer.index()
+        add_documents_ndjson = self.client.add_documents_ndjson
+        self.client.index.return_value.add_documents.assert_not_called()
+        self.assertEqual(add_documents_ndjson.call_count, 3)
+        self.assertEqual(
+            {call.kwargs['content_encoding'] for call in add_documents_ndjson.call_args_list},
+            {'gzip'}
+        )
+        self.assertEqual(
+            [
+                doc['username'] for call in add_documents_ndjson.call_args_list
+                for doc in decode_ndjson(call.args[1], compressed=True)
+            ],
+            [user.username for user in self.users]
+        )
+
+    def test_values_serializer_matches_drf(self):
+        """
+        The values projection builds the same documents as the generated ModelSerializer.
+        """
+        fields = ['id', 'username', 'date_joined', 'is_staff', 'last_login']
+        drf_serializer = get_model_serializer(get_user_model(), list_fields=fields)
+        values_serializer = get_values_serializer(get_user_model(), list_fields=fields)
+        queryset = get_user_model().objects.all()
+        indexer = BaseIndexer('user_content', queryset, values_serializer, self.client)
+        self.assertEqual(
+            [document for rows in indexer.iter_batches() for document in indexer.serialize(rows)],
+            [dict(document) for document in drf_serializer(queryset.order_by('pk'), many=True).data]
+        )
+
+    def test_values_serializer_rejects_relations(self):
+        """
+        Many valued relations can not be projected with values_list.
+        """
+        with self.assertRaises(ImproperlyConfigured):
+            get_values_serializer(get_user_model(), list_fields=['id', 'groups'])
+
+
+class ShardingTestCase(TestCase):
+    """
+    Test case for the slicing of model querysets into shards.
+    """
+
+    def setUp(self):
+        self.pks = [
+            get_user_model().objects.create_user(username=f'user{i}', password='testpass').pk
+            for i in range(7)
+        ]
+        self.queryset = get_user_model().objects.all()
+
+    def shard_pks(self, count, mode):
+        """
+        Returns primary keys of every shard.
+        """
+        boundaries = shard_boundaries(self.queryset, count) if mode == 'range' else None
+        return [
+            list(
+                shard_queryset(self.queryset, number, count, mode, boundaries)
+                .values_list('pk', flat=True)
+            )
+            for number in range(count)
+        ]
+
+    def test_range_shards_are_balanced_and_disjoint(self):
+        """
+        Range shards are contiguous primary key ranges of about the same size.
+        """
+        shards = self.shard_pks(3, 'range')
+        self.assertEqual([len(shard) for shard in shards], [2, 2, 3])
+        self.assertEqual(sum(shards, []), self.pks)
+
+    def test_hash_shards_are_disjoint(self):
+        """
+        Hash shards split the primary keys by modulo.
+        """
+        shards = self.shard_pks(3, 'hash')
+        self.assertEqual(sorted(sum(shards, [])), self.pks)
+        for number, shard in enumerate(shards):
+            self.assertTrue(all(pk % 3 == number for pk in shard))
+
+    def test_more_shards_than_rows(self):
+        """
+        Shards past the number of rows are empty.
+        """
+        shards = self.shard_pks(10, 'range')
+        self.assertEqual(sum(shards, []), self.pks)
+        self.assertEqual(shards[-1], [])
+
+    def test_split_range(self):
+        """
+        Arithmetic boundaries cut an integer range in equal parts whatever the rows.
+        """
+        self.assertEqual(split_range('10', '20', 3), [13, 16])
+        for pk_from, pk_to in (('a', '20'), (None, '20'), ('20', '10')):
+            with self.assertRaises(ValueError):
+                split_range(pk_from, pk_to, 2)
+
+    def test_parse_shard(self):
+        """
+        Shards are given as i/N with 0 <= i < N.
+        """
+        self.assertEqual(parse_shard('3/16'), (3, 16))
+        for value in ('16/16', '1', 'a/2', '0/0'):
+            with self.assertRaises(ValueError):
+                parse_shard(value)
+
+
+class IndexingPipelineTestCase(TestCase):
+    """
+    Test case for IndexingPipeline.
+    """
+
+    def test_run_keeps_batch_order(self):
+        """
+        Results come back in batch order whatever order the uploaders finish in.
+        """
+        pipeline = IndexingPipeline(workers=4, max_in_flight=2)
+        results = pipeline.run(range(20), lambda batch: batch * 2, lambda documents: documents + 1)
+        self.assertEqual(results, [batch * 2 + 1 for batch in range(20)])
+
+    def test_run_raises_upload_errors(self):
+        """
+        An error in an uploader stops the pipeline and is raised to the caller.
+        """
+        def upload(documents):
+            if documents == 3:
+                raise ValueError('upload failed')
+            return documents
+
+        pipeline = IndexingPipeline(workers=2, max_in_flight=1)
+        with self.assertRaises(ValueError):
+            pipeline.run(range(100), lambda batch: batch, upload)
+
+
+def make_task(uid, status, documents=0):
+    """
+    Build a processed search engine task.
+    """
+    return Task(
+        uid=uid, indexUid='user_content', status=status, type='documentAdditionOrUpdate',
+        details={'receivedDocuments': documents, 'indexedDocuments': documents},
+        enqueuedAt='2024-08-15T12:00:00.0Z', startedAt='2024-08-15T12:00:00.0Z',
+        finishedAt='2024-08-15T12:00:01.5Z'
+    )
+
+
+def make_task_info(uid):
+    """
+    Build the task info returned when a task is enqueued.
+    """
+    return TaskInfo(
+        taskUid=uid, indexUid='user_content', status='enqueued',
+        type='documentAdditionOrUpdate', enqueuedAt='2024-08-15T12:00:00.0Z'
+    )
+
+
+class FingerprintStoreTestCase(TestCase):
+    """
+    Test case for FingerprintStore.
+    """
+
+    def test_pending_hashes_are_staged_in_the_table(self):
+        """
+        Hashes of changed documents are written as pending rows and promoted on commit.
+        """
+        documents = [{'id': 1, 'title': 'a'}, {'id': 2, 'title': 'b'}]
+        store = FingerprintStore('index')
+        self.assertEqual(store.changed(documents), documents)
+        self.assertEqual(
+            list(DocumentFingerprint.objects.values_list('fingerprint', 'pending_run')),
+            [(None, store.run), (None, store.run)]
+        )
+        store.commit()
+        rerun = FingerprintStore('index')
+        self.assertEqual(rerun.changed(documents), [])
+        self.assertEqual((rerun.skipped, rerun.pending().count()), (2, 0))
+
+    def test_commit_only_promotes_rows_of_its_run(self):
+        """
+        Pending rows of a concurrent or failed run are neither promoted nor dropped.
+        """
+        FingerprintStore('index').changed([{'id': 1, 'title': 'a'}])
+        store = FingerprintStore('index')
+        store.changed([{'id': 2, 'title': 'b'}, {'id': 3, 'title': 'c'}])
+        store.discard()
+        self.assertEqual(
+            list(DocumentFingerprint.objects.values_list('document_id', flat=True)), ['1']
+        )
+        store.changed([{'id': 2, 'title': 'b'}])
+        store.commit()
+        self.assertEqual(
+            dict(DocumentFingerprint.objects.values_list('document_id', 'fingerprint')),
+            {'1': None, '2': fingerprint_document({'id': 2, 'title': 'b'})}
+        )
+
+
+class TaskTrackerTestCase(TestCase):
+    """
+    Test case for TaskTracker.
+    """
+
+    def test_wait_polls_pending_tasks_in_one_request(self):
+        """
+        All pending tasks are refreshed with a single get_tasks call per poll.
+        """
+        client = mock.Mock()
+        client.get_tasks.side_effect = [
+            [make_task(1, 'succeeded', 10), make_task(2, 'processing')],
+            [make_task(2, 'succeeded', 5)],
+        ]
+        tracker = TaskTracker(client, poll_interval=0)
+        tracker.track(make_task_info(1))
+        tracker.track(make_task_info(2))
+        self.assertTrue(tracker.wait())
+        self.assertEqual(
+            [call.args[0] for call in client.get_tasks.call_args_list], [[1, 2], [2]]
+        )
+        self.assertEqual(tracker.indexed_documents, 15)
+        self.assertEqual(tracker.processing_time, 3.0)
+
+    def test_wait_reports_failures(self):
+        """
+        Waiting returns False when a task failed.
+        """
+        client = mock.Mock()
+        client.get_tasks.return_value = [make_task(1, 'failed')]
+        tracker = TaskTracker(client, poll_interval=0)
+        tracker.track(make_task_info(1))
+        self.assertFalse(tracker.wait())
+        self.assertIn('failed: 1', tracker.summary())
+
+    def test_wait_timeout_starts_with_the_wait(self):
+        """
+        Time spent loading before waiting does not count towards the timeout.
+        """
+        client = mock.Mock()
+        client.get_tasks.return_value = [make_task(1, 'succeeded')]
+        tracker = TaskTracker(client, poll_interval=0, timeout=1)
+        tracker.track(make_task_info(1))
+        tracker.started_at -= 10
+        self.assertTrue(tracker.wait())
+
+    def test_load_indexes_wait_fails_on_failed_task(self):
+        """
+        load_indexes --wait exits with an error when a submitted task failed.
+        """
+        get_user_model().objects.create_user(username='user', password='testpass')
+        client = mock.Mock()
+        client.index.return_value.add_documents.return_value = make_task_info(1)
+        client.get_tasks.return_value = [make_task(1, 'failed')]
+        with mock.patch(
+            'openedx_search_api.management.commands.load_indexes.DriverFactory.get_client',
+            return_value=client
+        ), mock.patch('sys.stdout'):
+            with self.assertRaises(CommandError):
+                management.call_command('load_indexes', wait=True)
+
+
+EVENTS = []
+
+
+class StreamingContent:  # pylint: disable=too-few-public-methods
+    """
+    Content source producing batches with a resumable cursor.
+    """
+
+    def fetch_batches(self, cursor=None):
+        """
+        Yield three batches of two courses.
+        """
+        for page in range((cursor or 0) + 1, 4):
+            EVENTS.append(f'produced {page}')
+            yield [{'id': f'course-{page}-{index}'} for index in range(2)], page
+
+
+class GeneratorContent:  # pylint: disable=too-few-public-methods
+    """
+    Content source returning a generator of documents and of batches.
+    """
+
+    def fetch(self):
+        """
+        Yield loose documents around a prebuilt batch.
+        """
+        yield {'id': 'a'}
+        yield [{'id': 'b'}, {'id': 'c'}]
+        yield from ({'id': name} for name in 'def')
+
+
+class InlineExecutor:
+    """
+    Process pool stand-in running every submitted load in the test process.
+
+    Results go through pickle like the results of worker processes.
+    """
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def submit(self, fn, *args):  # pylint: disable=missing-function-docstring
+        future = Future()
+        try:
+            future.set_result(pickle.loads(pickle.dumps(fn(*args))))
+        except Exception as error:  # pylint: disable=broad-exception-caught
+            future.set_exception(error)
+        return future
+
+
+class LoadIndexesTestCase(TestCase):  # pylint: disable=too-many-public-methods
+    """
+    Test case for the load_indexes management command with a mocked search engine.
+    """
+
+    def setUp(self):
+        self.client = mock.Mock()
+        self.client.index.return_value.add_documents.side_effect = (
+            lambda documents: make_task_info(len(documents))
+        )
+        self.client.get_tasks.side_effect = lambda uids: [
+            make_task(uid, 'succeeded') for uid in uids
+        ]
+        for patcher in [
+            mock.patch(
+                'openedx_search_api.management.commands.load_indexes.DriverFactory.get_client',
+                return_value=self.client
+            ),
+            mock.patch('sys.stdout'),
+        ]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def create_users(self, *usernames):
+        """
+        Create users with the given usernames.
+        """
+        return [
+            get_user_model().objects.create_user(username=username, password='testpass')
+            for username in usernames
+        ]
+
+    def indexed_usernames(self):
+        """
+        Returns usernames sent to the search engine since the last reset.
+        """
+        add_documents = self.client.index.return_value.add_documents
+        return [doc['username'] for call in add_documents.call_args_list for doc in call.args[0]]
+
+    def test_incremental_load_uses_pk_watermark(self):
+        """
+        --incremental only sends the rows created after the previous run.
+        """
+        users = self.create_users('user1', 'user2')
+        management.call_command('load_indexes', wait=True)
+        self.assertEqual(IndexWatermark.get_value('user_content', 'pk'), users[-1].pk)
+        self.create_users('user3')
+        self.client.index.return_value.add_documents.reset_mock()
+        management.call_command('load_indexes', incremental=True)
+        self.assertEqual(self.indexed_usernames(), ['user3'])
+
+    def test_watermark_waits_for_successful_tasks(self):
+        """
+        The watermark only moves once the tasks of the run succeeded.
+        """
+        self.create_users('user1')
+        management.call_command('load_indexes')
+        self.assertIsNone(IndexWatermark.get_value('user_content', 'pk'))
+        self.client.get_tasks.side_effect = lambda uids: [make_task(uid, 'failed') for uid in uids]
+        with self.assertRaises(CommandError):
+            management.call_command('load_indexes', incremental=True)
+        self.assertIsNone(IndexWatermark.get_value('user_content', 'pk'))
+
+    def test_filtered_load_leaves_watermark(self):
+        """
+        Rows outside --filters are not loaded, the watermark stays behind them.
+        """
+        users = self.create_users('user1', 'user2')
+        management.call_command('load_indexes', wait=True, filters=f'pk={users[1].pk}')
+        self.assertIsNone(IndexWatermark.get_value('user_content', 'pk'))
+
+    def test_incremental_load_uses_timestamp_watermark(self):
+        """
+        A configured timestamp field is used as the watermark of the index.
+        """
+        index_configurations = {
+            'user_content': {
+                'model_class': 'auth.User',
+                'fields': ['id', 'username', 'date_joined'],
+                'watermark_field': 'date_joined'
+            }
+        }
+        with override_settings(INDEX_CONFIGURATIONS=index_configurations):
+            user = self.create_users('user1')[0]
+            management.call_command('load_indexes', incremental=True)
+            self.assertIsNotNone(IndexWatermark.get_value('user_content', 'date_joined'))
+            get_user_model().objects.filter(pk=user.pk).update(
+                date_joined=user.date_joined - datetime.timedelta(days=1)
+            )
+            self.create_users('user2')
+            self.client.index.return_value.add_documents.reset_mock()
+            management.call_command('load_indexes', incremental=True)
+            self.assertEqual(self.indexed_usernames(), ['user2'])
+
+    def test_rebuild_swaps_shadow_index(self):
+        """
+        --rebuild loads a shadow index, swaps it with the live index and drops it.
+        """
+        self.create_users('user1')
+        self.client.delete_index.return_value = make_task_info(100)
+        self.client.swap_indexes.return_value = make_task_info(101)
+        self.client.get_tasks.side_effect = lambda uids: [
+            make_task(uid, 'succeeded') for uid in uids
+        ]
+        management.call_command('load_indexes', rebuild=True)
+        self.assertEqual(
+            [call.args[0] for call in self.client.index.call_args_list][:2],
+            ['user_content__building', 'user_content__building']
+        )
+        self.client.swap_indexes.assert_called_once_with('user_content', 'user_content__building')
+        self.assertEqual(
+            [call.args for call in self.client.delete_index.call_args_list],
+            [('user_content__building',), ('user_content__building',)]
+        )
+
+    def test_rebuild_keeps_live_index_when_load_fails(self):
+        """
+        A failed shadow load never gets swapped with the live index.
+        """
+        self.create_users('user1')
+        self.client.delete_index.return_value = make_task_info(100)
+        self.client.get_tasks.side_effect = lambda uids: [make_task(uid, 'failed') for uid in uids]
+        with self.assertRaises(CommandError):
+            management.call_command('load_indexes', rebuild=True)
+        self.client.swap_indexes.assert_not_called()
+
+    def test_rebuild_rejects_filters(self):
+        """
+        A filtered load never replaces the whole live index.
+        """
+        with self.assertRaisesMessage(CommandError, '--rebuild swaps whole indexes'):
+            management.call_command('load_indexes', rebuild=True, filters='pk:1')
+        self.client.index.assert_not_called()
+
+    def test_skip_unchanged_only_sends_changed_documents(self):
+        """
+        --skip-unchanged sends documents whose content hash differs from the last run.
+        """
+        users = self.create_users('user1', 'user2')
+        self.client.get_tasks.side_effect = lambda uids: [
+            make_task(uid, 'succeeded') for uid in uids
+        ]
+        management.call_command('load_indexes', skip_unchanged=True)
+        self.assertEqual(DocumentFingerprint.objects.count(), 2)
+        get_user_model().objects.filter(pk=users[0].pk).update(username='renamed')
+        self.client.index.return_value.add_documents.reset_mock()
+        management.call_command('load_indexes', skip_unchanged=True)
+        self.assertEqual(self.indexed_usernames(), ['renamed'])
+        self.client.index.return_value.add_documents.reset_mock()
+        management.call_command('load_indexes', skip_unchanged=True)
+        self.assertEqual(self.indexed_usernames(), [])
+
+    def test_skip_unchanged_forgets_failed_loads(self):
+        """
+        Hashes of a load whose tasks failed are not stored.
+        """
+        self.create_users('user1')
+        self.client.get_tasks.side_effect = lambda uids: [make_task(uid, 'failed') for uid in uids]
+        with self.assertRaises(CommandError):
+            management.call_command('load_indexes', skip_unchanged=True)
+        self.assertFalse(DocumentFingerprint.objects.exists())
+
+    def test_values_serializer_index(self):
+        """
+        Indexes configured with the values serializer are loaded from values_list rows.
+        """
+        index_configurations = {
+            'user_content': {
+                'model_class': 'auth.User', 'fields': ['id', 'username'], 'serializer': 'values'
+            }
+        }
+        self.create_users('user1', 'user2')
+        with override_settings(INDEX_CONFIGURATIONS=index_configurations):
+            management.call_command('load_indexes')
+        self.assertEqual(self.indexed_usernames(), ['user1', 'user2'])
+
+    @override_settings(INDEX_CONFIGURATIONS={
+        'course_info': {'content_class': 'openedx_search_api.tests.indexer_tests.StreamingContent'}
+    })
+    def test_content_batches_are_uploaded_as_produced(self):
+        """
+        Every batch of a fetch_batches source is uploaded before the next one is produced.
+        """
+        EVENTS.clear()
+        self.client.index.return_value.add_documents.side_effect = (
+            lambda documents: EVENTS.append(f"uploaded {documents[0]['id']}")
+        )
+        management.call_command('load_indexes')
+        self.assertEqual(EVENTS, [
+            'produced 1', 'uploaded course-1-0', 'produced 2', 'uploaded course-2-0',
+            'produced 3', 'uploaded course-3-0',
+        ])
+
+    @override_settings(INDEX_CONFIGURATIONS={
+        'course_info': {
+            'content_class': 'openedx_search_api.tests.indexer_tests.GeneratorContent',
+            'batch_size': 2
+        }
+    })
+    def test_content_generators_are_batched(self):
+        """
+        Documents yielded by fetch are grouped in batch_size lists, yielded lists kept as is.
+        """
+        management.call_command('load_indexes', workers=2)
+        add_documents = self.client.index.return_value.add_documents
+        self.assertEqual(
+            [[doc['id'] for doc in call.args[0]] for call in add_documents.call_args_list],
+            [['a'], ['b', 'c'], ['d', 'e'], ['f']]
+        )
+
+    def test_resume_continues_after_last_accepted_batch(self):
+        """
+        --resume only sends the batches following the checkpoint of the interrupted load.
+        """
+        index_configurations = {
+            'user_content': {'model_class': 'auth.User', 'fields': ['id', 'username'],
+                             'batch_size': 2}
+        }
+        users = self.create_users('user1', 'user2', 'user3', 'user4', 'user5')
+        add_documents = self.client.index.return_value.add_documents
+        add_documents.side_effect = [make_task_info(1), ConnectionError('engine down')]
+        with override_settings(INDEX_CONFIGURATIONS=index_configurations):
+            with self.assertRaises(ConnectionError):
+                management.call_command('load_indexes')
+            checkpoint = IndexCheckpoint.objects.get(index_name='user_content')
+            self.assertEqual((checkpoint.cursor, checkpoint.batches), (users[1].pk, 1))
+            self.assertEqual(checkpoint.task_uids, [1])
+            add_documents.reset_mock()
+            add_documents.side_effect = lambda documents: make_task_info(len(documents))
+            management.call_command('load_indexes', resume=True)
+        self.assertEqual(self.indexed_usernames(), ['user3', 'user4', 'user5'])
+        self.assertFalse(IndexCheckpoint.objects.exists())
+
+    @override_settings(INDEX_CONFIGURATIONS={
+        'course_info': {'content_class': 'openedx_search_api.tests.indexer_tests.StreamingContent'}
+    })
+    def test_resume_passes_cursor_to_content_source(self):
+        """
+        A fetch_batches source is resumed from the cursor of its last accepted batch.
+        """
+        EVENTS.clear()
+        add_documents = self.client.index.return_value.add_documents
+        add_documents.side_effect = [make_task_info(1), ConnectionError('engine down')]
+        with self.assertRaises(ConnectionError):
+            management.call_command('load_indexes')
+        EVENTS.clear()
+        add_documents.side_effect = lambda documents: make_task_info(len(documents))
+        management.call_command('load_indexes', resume=True)
+        self.assertEqual(EVENTS, ['produced 2', 'produced 3'])
+
+    def test_load_without_resume_discards_checkpoint(self):
+        """
+        A load started without --resume drops the checkpoint of an interrupted one.
+        """
+        self.create_users('user1')
+        IndexCheckpoint.objects.create(
+            index_name='user_content', target_name='user_content', cursor=10**6, batches=3
+        )
+        management.call_command('load_indexes')
+        self.assertEqual(self.indexed_usernames(), ['user1'])
+        self.assertFalse(IndexCheckpoint.objects.exists())
+
+    def test_checkpoints_without_upsert_target_support(self):
+        """
+        Checkpoints are stored on backends such as MySQL which can not name the conflict target.
+        """
+        index_configurations = {
+            'user_content': {'model_class': 'auth.User', 'fields': ['id', 'username'],
+                             'batch_size': 1}
+        }
+        users = self.create_users('user1', 'user2')
+        add_documents = self.client.index.return_value.add_documents
+        add_documents.side_effect = [make_task_info(1), ConnectionError('engine down')]
+        with override_settings(INDEX_CONFIGURATIONS=index_configurations), mock.patch.object(
+                connection.features, 'supports_update_conflicts_with_target', False
+        ):
+            with self.assertRaises(ConnectionError):
+                management.call_command('load_indexes')
+            checkpoint = IndexCheckpoint.objects.get(index_name='user_content')
+            self.assertEqual((checkpoint.cursor, checkpoint.batches), (users[0].pk, 1))
+            add_documents.side_effect = lambda documents: make_task_info(len(documents))
+            management.call_command('load_indexes', resume=True)
+        self.assertFalse(IndexCheckpoint.objects.exists())
+
+    @override_settings(INDEX_CONFIGURATIONS={
+        'user_content': {'model_class': 'auth.User', 'fields': ['id', 'username']},
+        'course_info': {'content_class': 'openedx_search_api.tests.indexer_tests.GeneratorContent'},
+        'broken': {'content_class': 'openedx_search_api.tests.indexer_tests.MissingContent'},
+    })
+    @mock.patch(
+        'openedx_search_api.management.commands.load_indexes.ProcessPoolExecutor', InlineExecutor
+    )
+    def test_parallel_indexes_gathers_every_index(self):
+        """
+        --parallel-indexes loads every index in a worker, a failing index not stopping others.
+        """
+        users = self.create_users('user1', 'user2')
+        self.client.get_tasks.side_effect = lambda uids: [
+            make_task(uid, 'succeeded') for uid in uids
+        ]
+        with self.assertRaisesMessage(CommandError, 'Loading failed for: broken'):
+            management.call_command(
+                'load_indexes', parallel_indexes=2, skip_unchanged=True, stdout=mock.Mock()
+            )
+        self.assertEqual(
+            [call.args[0] for call in self.client.index.call_args_list],
+            ['user_content', 'course_info']
+        )
+        self.assertEqual(IndexWatermark.get_value('user_content', 'pk'), users[-1].pk)
+        self.assertEqual(DocumentFingerprint.objects.count(), 2)
+
+    @override_settings(INDEX_CONFIGURATIONS={
+        'course_info': {
+            'content_class': 'openedx_search_api.tests.indexer_tests.GeneratorContent',
+            'batch_size': 2, 'max_workers': 1
+        }
+    })
+    def test_max_workers_caps_index_concurrency(self):
+        """
+        max_workers of an index configuration caps --workers for that index.
+        """
+        with mock.patch('openedx_search_api.indexers.base.IndexingPipeline') as pipeline:
+            management.call_command('load_indexes', workers=4)
+        pipeline.assert_not_called()
+        self.assertEqual(self.client.index.return_value.add_documents.call_count, 4)
+
+    def test_shards_load_disjoint_slices(self):
+        """
+        --shard i/N loads one slice of the model indexes and leaves the watermark alone.
+        """
+        users = self.create_users('user1', 'user2', 'user3', 'user4')
+        loaded = []
+        for number in range(2):
+            self.client.index.return_value.add_documents.reset_mock()
+            management.call_command(
+                'load_indexes', shard=f'{number}/2', pk_from=users[0].pk, pk_to=users[-1].pk + 1
+            )
+            loaded.append(self.indexed_usernames())
+        self.assertEqual(loaded, [['user1', 'user2'], ['user3', 'user4']])
+        self.assertIsNone(IndexWatermark.get_value('user_content', 'pk'))
+
+    def test_shards_use_pinned_plan_boundaries(self):
+        """
+        --shard jobs cut the ranges planned by --plan-shards, rows added since only move to
+        the last shard.
+        """
+        self.create_users('user1', 'user2', 'user3', 'user4')
+        with tempfile.TemporaryDirectory() as directory:
+            plan = os.path.join(directory, 'plan.json')
+            management.call_command('load_indexes', plan_shards=2, shard_plan=plan)
+            self.create_users('user5', 'user6')
+            loaded = []
+            for number in range(2):
+                self.client.index.return_value.add_documents.reset_mock()
+                management.call_command('load_indexes', shard=f'{number}/2', shard_plan=plan)
+                loaded.append(self.indexed_usernames())
+            with self.assertRaisesMessage(CommandError, 'splits indexes in 2 shards, not 3'):
+                management.call_command('load_indexes', shard='0/3', shard_plan=plan)
+        self.assertEqual(loaded, [['user1', 'user2'], ['user3', 'user4', 'user5', 'user6']])
+
+    def test_pk_range(self):
+        """
+        --pk-from includes and --pk-to excludes the given primary keys.
+        """
+        users = self.create_users('user1', 'user2', 'user3', 'user4')
+        management.call_command('load_indexes', pk_from=users[1].pk, pk_to=users[3].pk)
+        self.assertEqual(self.indexed_usernames(), ['user2', 'user3'])
+
+    def test_plan_shards_prints_pk_ranges(self):
+        """
+        --plan-shards prints the pk range options of balanced shards without loading.
+        """
+        users = self.create_users('user1', 'user2', 'user3', 'user4')
+        stdout = mock.Mock()
+        with mock.patch('sys.stdout', stdout):
+            management.call_command('load_indexes', plan_shards=2)
+        self.assertEqual([call.args[0] for call in stdout.write.call_args_list], [
+            f'index UID: user_content, shard 0: --pk-to {users[2].pk}\n',
+            f'index UID: user_content, shard 1: --pk-from {users[2].pk}\n',
+        ])
+        self.client.index.assert_not_called()
+
+    def test_slices_reject_rebuild_and_bad_shards(self):
+        """
+        Slices can not be rebuilt, shards must be given as i/N, range shards need pinned
+        boundaries and pk ranges only apply to one model.
+        """
+        with self.assertRaisesMessage(CommandError, '--rebuild swaps whole indexes'):
+            management.call_command('load_indexes', rebuild=True, shard='0/2')
+        with self.assertRaisesMessage(CommandError, 'Invalid shard'):
+            management.call_command('load_indexes', shard='2/2')
+        with self.assertRaisesMessage(CommandError, 'Range shards need pinned boundaries'):
+            management.call_command('load_indexes', shard='0/2', pk_to=10)
+        with override_settings(INDEX_CONFIGURATIONS={
+            'user_content': {'model_class': 'auth.User', 'fields': ['id', 'username']},
+            'group_content': {'model_class': 'auth.Group', 'fields': ['id', 'name']},
+        }), self.assertRaisesMessage(CommandError, 'select a single model index'):
+            management.call_command('load_indexes', pk_to=10)
+        management.call_command('load_indexes', shard='0/2', shard_mode='hash')
@@ -0,0 +1,178 @@
+"""
+Unit tests for the metrics of the driver calls and token requests.
+"""
+import socket
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase, override_settings
+
+from openedx_search_api.cache import token_cache
+from openedx_search_api.drivers.meilisearch import index_metadata_cache
+from openedx_search_api.metrics import (
+    DRIVER_CALLS,
+    ENGINE_REQUESTS,
+    TOKEN_CACHE_LOOKUPS,
+    TOKEN_DB_QUERIES,
+    TOKEN_STAGES,
+    MetricsRegistry,
+    StatsdExporter,
+    registry
+)
+from openedx_search_api.testing import FakeMeilisearch
+from openedx_search_api.views import AsyncAuthTokenView, AuthTokenView, MetricsView
+
+
+def count(histogram, *labels):
+    """
+    Returns number of values observed by a histogram for the given label values
+    """
+    series = histogram.values.get(labels)
+    return series[2] if series else 0
+
+
+class MetricsRegistryTestCase(TestCase):
+    """
+    Test case for the metrics registry and exporters.
+    """
+
+    def test_render_prometheus(self):
+        """
+        Histograms are rendered with cumulative buckets, sum and count.
+        """
+        metrics = MetricsRegistry()
+        histogram = metrics.histogram('test_seconds', 'Test.', ('stage',), buckets=(0.1, 1.0))
+        counter = metrics.counter('test_total', 'Test.', ('result',))
+        histogram.observe(0.05, 'a"b')
+        histogram.observe(0.5, 'a"b')
+        counter.inc('hit', amount=2)
+        self.assertEqual(metrics.render().splitlines(), [
+            '# HELP test_seconds Test.',
+            '# TYPE test_seconds histogram',
+            'test_seconds_bucket{stage="a\\"b",le="0.1"} 1',
+            'test_seconds_bucket{stage="a\\"b",le="1.0"} 2',
+            'test_seconds_bucket{stage="a\\"b",le="+Inf"} 2',
+            'test_seconds_sum{stage="a\\"b"} 0.55',
+            'test_seconds_count{stage="a\\"b"} 2',
+            '# HELP test_total Test.',
+            '# TYPE test_total counter',
+            'test_total{result="hit"} 2',
+        ])
+
+    def test_disabled(self):
+        """
+        Nothing is recorded when metrics are disabled.
+        """
+        registry.clear()
+        with override_settings(SEARCH_METRICS_ENABLED=False):
+            TOKEN_STAGES.observe(0.1, 'sign', 'ok')
+            TOKEN_CACHE_LOOKUPS.inc('miss')
+        self.assertEqual(TOKEN_STAGES.values, {})
+        self.assertEqual(TOKEN_CACHE_LOOKUPS.values, {})
+
+    def test_statsd_exporter(self):
+        """
+        The statsd exporter sends every observation over UDP.
+        """
+        receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.addCleanup(receiver.close)
+        receiver.bind(('127.0.0.1', 0))
+        receiver.settimeout(5)
+        with override_settings(
+                SEARCH_METRICS_EXPORTERS=['openedx_search_api.metrics.StatsdExporter'],
+                SEARCH_METRICS_STATSD_HOST='127.0.0.1',
+                SEARCH_METRICS_STATSD_PORT=receiver.getsockname()[1],
+        ):
+            TOKEN_STAGES.observe(0.0025, 'sign', 'ok')
+            TOKEN_CACHE_LOOKUPS.inc('miss')
+            TOKEN_DB_QUERIES.observe(3, 'sync')
+            lines = [receiver.recv(512).decode() for _ in range(3)]
+        self.assertEqual(lines, [
+            'openedx_search.token_stage_seconds.sign.ok:2.500|ms',
+            'openedx_search.token_cache_lookups_total.miss:1|c',
+            'openedx_search.token_db_queries.sync:3|h',
+        ])
+        self.assertEqual(
+            StatsdExporter().format('counter', 'other_total', 1, {}),
+            'openedx_search.other_total:1|c'
+        )
+
+
+class TokenMetricsTestCase(TestCase):
+    """
+    Test case for the metrics recorded by the token view against the Meilisearch stand-in.
+    """
+
+    def setUp(self):
+        self.engine = FakeMeilisearch().start()
+        self.addCleanup(self.engine.stop)
+        settings_override = override_settings(
+            MEILISEARCH_URL=self.engine.url, MEILISEARCH_PUBLIC_URL=self.engine.url,
+            SEARCH_METRICS_TOKEN='scrape-token',
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.addCleanup(index_metadata_cache.invalidate, self.engine.url)
+        self.addCleanup(token_cache.clear)
+        cache.clear()
+        registry.clear()
+        self.user = get_user_model().objects.create_user(username='testuser', password='testpass')
+
+    def get_token(self):
+        """
+        Request a token with the token view
+        """
+        request = RequestFactory().get('/token/')
+        request.user = self.user
+        return AuthTokenView().get(request)
+
+    def test_token_view_stages(self):
+        """
+        A miss times every stage and the engine request creating the key, a hit only the
+        cache lookup.
+        """
+        self.get_token()
+        self.get_token()
+        for stage in ('get_client', 'get_search_rules', 'get_user_token', 'render', 'cache_get'):
+            self.assertEqual(count(TOKEN_STAGES, stage, 'ok'), 2)
+        for stage in ('get_active_token', 'get_active_api_key', 'create_key', 'store_api_key',
+                      'sign', 'store_token', 'cache_set'):
+            self.assertEqual(count(TOKEN_STAGES, stage, 'ok'), 1)
+        self.assertEqual(count(DRIVER_CALLS, 'meilisearch', 'get_user_token', 'ok'), 2)
+        self.assertEqual(count(ENGINE_REQUESTS, 'POST', 'ok'), 1)
+        self.assertEqual(TOKEN_CACHE_LOOKUPS.values[('local_hit',)], 1)
+        self.assertEqual(count(TOKEN_DB_QUERIES, 'sync'), 2)
+        self.assertGreater(TOKEN_DB_QUERIES.values[('sync',)][1], 0)
+
+    async def test_async_token_view_counts_queries(self):
+        """
+        Queries the async ORM runs in sync_to_async threads are counted for the async view.
+        """
+        request = RequestFactory().get('/token/')
+        request.user = self.user
+        response = await AsyncAuthTokenView().get(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(count(TOKEN_DB_QUERIES, 'async'), 1)
+        self.assertGreater(TOKEN_DB_QUERIES.values[('async',)][1], 0)
+
+    def test_metrics_view(self):
+        """
+        The metrics view requires the scrape token and renders the registry.
+        """
+        self.get_token()
+        request = RequestFactory().get('/metrics/')
+        self.assertEqual(MetricsView().get(request).status_code, 401)
+        request = RequestFactory().get('/metrics/', HTTP_AUTHORIZATION='Bearer scrape-tokenX')
+        self.assertEqual(MetricsView().get(request).status_code, 401)
+        request = RequestFactory().get('/metrics/', HTTP_AUTHORIZATION='Bearer scrape-token')
+        response = MetricsView().get(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(
+            'openedx_search_driver_call_seconds_count{driver="meilisearch",'
+            'method="get_user_token",outcome="ok"} 1',
+            response.content.decode()
+        )
+        with override_settings(SEARCH_METRICS_ENABLED=False):
+            self.assertEqual(MetricsView().get(request).status_code, 404)
+        with override_settings(SEARCH_METRICS_TOKEN=None):
+            self.assertEqual(MetricsView().get(request).status_code, 404)
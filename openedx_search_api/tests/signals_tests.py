@@ -0,0 +1,121 @@
+"""
+Unit tests for incremental indexing driven by model signals.
+"""
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, TransactionTestCase
+
+from openedx_search_api import signals
+from openedx_search_api.indexers.incremental import IncrementalIndexBuffer
+
+
+def connect_buffer(test_case, buffer, client):
+    """
+    Connect the signal handlers to a buffer sending its changes to a mocked search engine.
+    """
+    patchers = [
+        mock.patch.object(signals, 'index_buffer', buffer),
+        mock.patch(
+            'openedx_search_api.indexers.incremental.DriverFactory.get_client',
+            return_value=client
+        ),
+    ]
+    for patcher in patchers:
+        patcher.start()
+        test_case.addCleanup(patcher.stop)
+    signals.connect_incremental_indexing()
+    test_case.addCleanup(signals.disconnect_incremental_indexing)
+    test_case.addCleanup(buffer.flush)
+
+
+class IncrementalIndexingTestCase(TestCase):
+    """
+    Test case for the signal handlers and IncrementalIndexBuffer.
+    """
+
+    def setUp(self):
+        self.buffer = IncrementalIndexBuffer(flush_interval=3600, max_batch_size=100)
+        self.client = mock.Mock()
+        connect_buffer(self, self.buffer, self.client)
+
+    def test_repeated_saves_are_coalesced(self):
+        """
+        Many saves of one row turn into a single document upsert.
+        """
+        with self.captureOnCommitCallbacks(execute=True):
+            user = get_user_model().objects.create_user(username='user', password='testpass')
+        for i in range(50):
+            with self.captureOnCommitCallbacks(execute=True):
+                user.first_name = f'name{i}'
+                user.save()
+        self.assertEqual(len(self.buffer), 1)
+        self.buffer.flush()
+        add_documents = self.client.index.return_value.add_documents
+        add_documents.assert_called_once()
+        documents = add_documents.call_args.args[0]
+        self.assertEqual(len(documents), 1)
+        self.assertEqual(documents[0]['first_name'], 'name49')
+
+    def test_deletes_are_sent_in_one_call(self):
+        """
+        Deleted rows are removed with one delete_documents call and cancel pending upserts.
+        """
+        with self.captureOnCommitCallbacks(execute=True):
+            users = [
+                get_user_model().objects.create_user(username=f'user{i}', password='testpass')
+                for i in range(3)
+            ]
+        pks = sorted(user.pk for user in users)
+        with self.captureOnCommitCallbacks(execute=True):
+            for user in users:
+                user.delete()
+        self.buffer.flush()
+        index = self.client.index.return_value
+        index.add_documents.assert_not_called()
+        index.delete_documents.assert_called_once_with(pks)
+
+    def test_changes_are_not_queued_before_commit(self):
+        """
+        Rolled back changes never reach the buffer.
+        """
+        with self.captureOnCommitCallbacks(execute=False):
+            get_user_model().objects.create_user(username='user', password='testpass')
+        self.assertEqual(len(self.buffer), 0)
+
+
+class BackgroundFlushTestCase(TransactionTestCase):
+    """
+    Test case for the flushes IncrementalIndexBuffer runs in a background thread.
+    """
+
+    def setUp(self):
+        self.buffer = IncrementalIndexBuffer(flush_interval=3600, max_batch_size=2)
+        self.client = mock.Mock()
+        connect_buffer(self, self.buffer, self.client)
+
+    def test_size_based_flush(self):
+        """
+        The buffer flushes on its own once max_batch_size changes are pending.
+        """
+        get_user_model().objects.create_user(username='user1', password='testpass')
+        get_user_model().objects.create_user(username='user2', password='testpass')
+        self.buffer.join(timeout=5)
+        self.assertEqual(len(self.buffer), 0)
+        self.assertEqual(len(self.client.index.return_value.add_documents.call_args.args[0]), 2)
+
+    def test_failed_flush_keeps_changes(self):
+        """
+        A failing search engine neither breaks the saving request nor loses the changes.
+        """
+        add_documents = self.client.index.return_value.add_documents
+        add_documents.side_effect = ConnectionError('search engine unreachable')
+        with self.assertLogs('openedx_search_api.indexers.incremental', 'ERROR'):
+            get_user_model().objects.create_user(username='user1', password='testpass')
+            get_user_model().objects.create_user(username='user2', password='testpass')
+            self.buffer.join(timeout=5)
+        self.assertEqual(len(self.buffer), 2)
+        add_documents.side_effect = None
+        self.buffer.flush()
+        self.assertEqual(len(self.buffer), 0)
+        self.assertEqual(len(add_documents.call_args.args[0]), 2)
@@ -0,0 +1,331 @@
+"""
+Unit tests for tenant token signing in the MeiliSearchEngine driver.
+"""
+from datetime import datetime, timedelta, timezone
+from io import StringIO
+from unittest import mock
+
+import httpx
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError
+from django.test import override_settings
+
+from openedx_search_api.cache import token_cache
+from openedx_search_api.drivers.meilisearch import MeiliSearchEngine, fingerprint_search_rules
+from openedx_search_api.management.commands.prewarm_search_tokens import Command as PrewarmCommand
+from openedx_search_api.models import SearchApiKeyModel, SearchEngineToken
+from openedx_search_api.tests.cache_tests import EngineTestCase, make_engine
+
+OLD_KEY = {'uid': 'c471bd40-303b-48bc-bb80-4602baff2675', 'key': 'old-key'}
+NEW_KEY = {
+    'uid': 'd571bd40-303b-48bc-bb80-4602baff2675',
+    'key': 'new-key',
+    'active_from': '2024-01-01T00:00:00Z',
+}
+
+
+@override_settings(MEILISEARCH_KEY_MODE='shared', MEILISEARCH_PARENT_KEYS=[OLD_KEY])
+class SharedKeyTestCase(EngineTestCase):
+    """
+    Test case for signing tenant tokens with shared parent keys.
+    """
+
+    def test_token_is_signed_without_engine_call(self):
+        """
+        Shared mode signs with the parent key and never creates a per-user engine key.
+        """
+        make_engine(self.request, self.client).get_user_token({'user_content': {}})
+        self.client.create_key.assert_not_called()
+        self.assertFalse(SearchApiKeyModel.objects.exists())
+        self.assertEqual(
+            self.client.generate_tenant_token.call_args.kwargs['api_key_uid'], OLD_KEY['uid']
+        )
+        self.assertEqual(SearchEngineToken.objects.get().api_key_uid, OLD_KEY['uid'])
+
+    def test_rotation_re_signs_lazily(self):
+        """
+        Once a new parent key is active, stored tokens of the previous key are re-signed.
+        """
+        rules = {'user_content': {}}
+        first = make_engine(self.request, self.client).get_user_token(rules)
+        with override_settings(MEILISEARCH_PARENT_KEYS=[NEW_KEY, OLD_KEY]):
+            second = make_engine(self.request, self.client).get_user_token(rules)
+        self.assertEqual(
+            self.client.generate_tenant_token.call_args.kwargs['api_key_uid'], NEW_KEY['uid']
+        )
+        self.assertEqual(SearchEngineToken.objects.get().api_key_uid, NEW_KEY['uid'])
+        self.assertEqual(self.client.generate_tenant_token.call_count, 2)
+        self.assertNotEqual(first['token'], second['token'])
+
+    def test_token_never_outlives_parent_key(self):
+        """
+        Token expiry is capped to the expiry of the signing parent key.
+        """
+        expires_at = datetime.now(tz=timezone.utc) + timedelta(days=1)
+        with override_settings(MEILISEARCH_PARENT_KEYS=[{**OLD_KEY, 'expires_at': expires_at}]):
+            response = make_engine(self.request, self.client).get_user_token({'user_content': {}})
+        self.assertEqual(response['expires_at'], expires_at)
+
+
+class SearchRulesTestCase(EngineTestCase):
+    """
+    Test case for compiled search rules and rule change detection.
+    """
+
+    def test_rules_are_memoized(self):
+        """
+        Rendering the same dynamic rules twice returns the same precomputed object.
+        """
+        engine = make_engine(self.request, self.client)
+        rules = engine.get_search_rules(['ORG: edX'])
+        self.assertIs(engine.get_search_rules(['ORG: edX']), rules)
+        self.assertEqual(rules['user_content'], {'filter': 'IS_STAFF: false AND ORG: edX'})
+        self.assertEqual(rules.fingerprint, fingerprint_search_rules(dict(rules)))
+        self.assertNotEqual(engine.get_search_rules().fingerprint, rules.fingerprint)
+
+    def test_rules_follow_settings_changes(self):
+        """
+        Overriding INDEX_CONFIGURATIONS recompiles the rules.
+        """
+        with override_settings(INDEX_CONFIGURATIONS={'other': {'search_rules': ['ORG: edX']}}):
+            rules = make_engine(self.request, self.client).get_search_rules()
+        self.assertEqual(rules, {'other': {'filter': 'ORG: edX'}})
+
+    def test_token_is_re_signed_when_rules_change(self):
+        """
+        A stored token is only reused for the rules it was issued with.
+        """
+        engine = make_engine(self.request, self.client)
+        engine.get_user_token(engine.get_search_rules())
+        token_cache.clear()
+        cache.clear()
+        engine.get_user_token(engine.get_search_rules())
+        self.assertEqual(self.client.generate_tenant_token.call_count, 1)
+        response = engine.get_user_token(engine.get_search_rules(['ORG: edX']))
+        self.assertEqual(self.client.generate_tenant_token.call_count, 2)
+        self.assertIn('ORG: edX', response['token'])
+        self.assertEqual(
+            SearchEngineToken.objects.get().rules_fingerprint,
+            engine.get_search_rules(['ORG: edX']).fingerprint
+        )
+
+
+class AsyncTokenTestCase(EngineTestCase):
+    """
+    Test case for issuing tenant tokens through the async code path.
+    """
+
+    @staticmethod
+    def handle_create_key(request):
+        """
+        Answer POST /keys like Meilisearch does.
+        """
+        now = datetime.now(tz=timezone.utc)
+        return httpx.Response(201, json={
+            'uid': OLD_KEY['uid'], 'key': OLD_KEY['key'], 'name': None, 'description': 'key',
+            'actions': ['search'], 'indexes': ['*'],
+            'expiresAt': (now + timedelta(days=7)).isoformat(),
+            'createdAt': now.isoformat(), 'updatedAt': now.isoformat(),
+        }) if request.url.path == '/keys' else httpx.Response(404)
+
+    async def test_token_is_issued_with_async_client(self):
+        """
+        Per user keys are created with the async HTTP client and stored with the async ORM.
+        """
+        engine = make_engine(self.request, self.client)
+        engine._async_client = httpx.AsyncClient(  # pylint: disable=protected-access
+            base_url='http://localhost:7700',
+            transport=httpx.MockTransport(self.handle_create_key)
+        )
+        response = await engine.aget_user_token({'user_content': {}})
+        self.client.create_key.assert_not_called()
+        self.assertEqual(response['token'], f"token-{OLD_KEY['uid']}-{{'user_content': {{}}}}")
+        self.assertEqual(
+            (await SearchApiKeyModel.objects.aget(user=self.user)).uid, OLD_KEY['uid']
+        )
+        token = await SearchEngineToken.objects.aget(user=self.user)
+        self.assertEqual(token.api_key_uid, OLD_KEY['uid'])
+        self.assertEqual(await engine.aget_user_token({'user_content': {}}), response)
+        self.assertEqual(self.client.generate_tenant_token.call_count, 1)
+
+
+class PrewarmTokensTestCase(EngineTestCase):
+    """
+    Test case for the prewarm_search_tokens management command.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.users = [self.user] + [
+            get_user_model().objects.create_user(username=f'learner{index}')
+            for index in range(4)
+        ]
+        patcher = mock.patch.object(
+            MeiliSearchEngine, 'get_instance',
+            side_effect=lambda request: make_engine(request, self.client)
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def prewarm(self, *args):
+        """
+        Run the command and return its output.
+        """
+        out = StringIO()
+        call_command('prewarm_search_tokens', '--chunk-size', '2', *args, stdout=out)
+        return out.getvalue()
+
+    def test_tokens_are_created_in_bulk(self):
+        """
+        Every selected user gets a stored token and api key without per-user upserts.
+        """
+        with mock.patch.object(SearchEngineToken.objects, 'update_or_create') as upsert:
+            output = self.prewarm('-f', 'username__startswith=learner')
+        upsert.assert_not_called()
+        self.assertIn('pre-warmed 4 user(s), signed 4 token(s)', output)
+        self.assertIn('users/sec', output)
+        self.assertEqual(
+            set(SearchEngineToken.objects.values_list('user_id', flat=True)),
+            {user.id for user in self.users[1:]}
+        )
+        self.assertEqual(SearchApiKeyModel.objects.count(), 4)
+
+    def test_reusable_tokens_are_kept(self):
+        """
+        A second run only re-signs tokens which are about to expire.
+        """
+        self.prewarm()
+        SearchEngineToken.objects.filter(user=self.user).update(
+            expires_at=datetime.now(tz=timezone.utc) + timedelta(hours=1)
+        )
+        self.assertIn('signed 1 token(s)', self.prewarm())
+        self.assertEqual(self.client.create_key.call_count, 5)
+        self.assertGreater(
+            SearchEngineToken.objects.get(user=self.user).expires_at,
+            datetime.now(tz=timezone.utc) + timedelta(days=1)
+        )
+        self.assertIn('signed 5 token(s)', self.prewarm('--force'))
+        self.assertEqual(make_engine(self.request, self.client).get_user_token(
+            make_engine(self.request, self.client).get_search_rules()
+        )['token'], SearchEngineToken.objects.get(user=self.user).token)
+
+
+    def test_rows_written_concurrently_are_overwritten(self):
+        """
+        Rows stored by a token request after the chunk was read do not abort the run.
+        """
+        self.prewarm()
+        with mock.patch.object(
+                SearchEngineToken.objects, 'in_bulk', return_value={}
+        ), mock.patch.object(SearchApiKeyModel.objects, 'in_bulk', return_value={}):
+            self.assertIn('signed 5 token(s)', self.prewarm())
+        self.assertEqual(SearchEngineToken.objects.count(), 5)
+        self.assertEqual(SearchApiKeyModel.objects.count(), 5)
+
+    def test_created_keys_are_revoked_when_writing_fails(self):
+        """
+        Engine keys of a chunk which could not be stored are not left behind.
+        """
+        with mock.patch.object(
+                SearchEngineToken.objects, 'bulk_create', side_effect=IntegrityError('conflict')
+        ), self.assertRaises(IntegrityError):
+            self.prewarm()
+        self.assertEqual(SearchApiKeyModel.objects.count(), 0)
+        self.assertEqual(self.client.delete_key.call_count, 2)
+
+    def test_created_keys_are_revoked_when_signing_fails(self):
+        """
+        Engine keys of a chunk are revoked when another user of the chunk can not be signed.
+        """
+        sign = PrewarmCommand.sign
+
+        def failing_sign(user, *args):
+            if user == self.users[1]:
+                raise ConnectionError('engine down')
+            return sign(user, *args)
+
+        with mock.patch.object(PrewarmCommand, 'sign', side_effect=failing_sign), \
+                self.assertRaises(ConnectionError):
+            self.prewarm('--workers', '1')
+        self.assertFalse(SearchEngineToken.objects.exists())
+        self.client.delete_key.assert_called_once_with(
+            self.client.create_key.return_value.uid
+        )
+
+    def test_cached_tokens_of_every_signed_user_are_invalidated(self):
+        """
+        Cached responses are dropped for users whose rows were created by the chunk as well.
+        """
+        with mock.patch.object(token_cache, 'invalidate') as invalidate:
+            self.prewarm()
+        self.assertEqual(
+            sorted(call.args[0] for call in invalidate.call_args_list),
+            sorted(user.id for user in self.users)
+        )
+
+
+class PurgeCredentialsTestCase(EngineTestCase):
+    """
+    Test case for the purge_search_credentials management command.
+    """
+
+    def setUp(self):
+        super().setUp()
+        now = datetime.now(tz=timezone.utc)
+        expiries = [now - timedelta(days=1)] * 3 + [now + timedelta(days=1)]
+        for index, expires_at in enumerate(expiries):
+            user = get_user_model().objects.create_user(username=f'learner{index}')
+            SearchEngineToken.objects.create(
+                user=user, token='token', token_type='Bearer', expires_at=expires_at,
+                search_engine='meilisearch', index_search_rules={}
+            )
+            SearchApiKeyModel.objects.create(
+                user=user, uid=f'key-{index}', actions=['*'], indexes=['*'], key='key',
+                expires_at=expires_at, created_at=now, updated_at=now
+            )
+        patcher = mock.patch.object(
+            MeiliSearchEngine, 'get_instance',
+            side_effect=lambda request: make_engine(request, self.client)
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def purge(self, *args):
+        """
+        Run the command and return its output.
+        """
+        out = StringIO()
+        call_command('purge_search_credentials', '--chunk-size', '2', *args, stdout=out)
+        return out.getvalue()
+
+    def test_expired_credentials_are_purged(self):
+        """
+        Expired rows are deleted in chunks and their engine keys revoked.
+        """
+        self.assertIn('purged 3 token(s) and 3 api key(s)', self.purge())
+        self.assertEqual(
+            sorted(call.args[0] for call in self.client.delete_key.call_args_list),
+            ['key-0', 'key-1', 'key-2']
+        )
+        self.assertEqual(SearchEngineToken.objects.count(), 1)
+        self.assertEqual(list(SearchApiKeyModel.objects.values_list('uid', flat=True)), ['key-3'])
+
+    def test_failed_revocations_are_kept(self):
+        """
+        Rows of keys the engine failed to revoke stay for the next run.
+        """
+        self.client.delete_key.side_effect = lambda uid: uid == 'key-1' and 1 / 0
+        self.assertIn('2 api key(s), 1 key revocation(s) failed', self.purge())
+        self.assertEqual(
+            sorted(SearchApiKeyModel.objects.values_list('uid', flat=True)), ['key-1', 'key-3']
+        )
+
+    def test_dry_run_keeps_everything(self):
+        """
+        A dry run only reports the expired credentials.
+        """
+        self.assertIn('would purge 3 token(s) and 3 api key(s)', self.purge('--dry-run'))
+        self.client.delete_key.assert_not_called()
+        self.assertEqual(SearchApiKeyModel.objects.count(), 4)
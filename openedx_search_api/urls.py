@@ -14,10 +14,17 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
 from django.urls import path
 
-from .views import AuthTokenView
+from .views import AsyncAuthTokenView, AuthTokenView, MetricsView, SearchView
 
 urlpatterns = [
-    path('token/', AuthTokenView.as_view()),
+    path(
+        'token/',
+        AsyncAuthTokenView.as_view()
+        if getattr(settings, 'SEARCH_ASYNC_TOKEN_VIEW', False) else AuthTokenView.as_view()
+    ),
+    path('search/indexes/<str:index_uid>/search', SearchView.as_view()),
+    path('metrics/', MetricsView.as_view()),
 ]
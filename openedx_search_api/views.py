@@ -2,11 +2,26 @@
 Views for the openedx_search_api application.
 """
 
+import hmac
+import json
+
+from django.conf import settings
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.http import JsonResponse
+from django.contrib.auth.views import redirect_to_login
+from django.http import HttpResponse, JsonResponse
+from django.utils.decorators import method_decorator
+from django.views.decorators.csrf import csrf_exempt
 from django.views.generic import View
 
-from .drivers import DriverFactory
+from .drivers import DriverFactory, SearchError
+from .metrics import (
+    TOKEN_DB_QUERIES,
+    TOKEN_REQUESTS,
+    TOKEN_STAGES,
+    counting_queries,
+    is_enabled,
+    registry
+)
 
 
 class AuthTokenView(LoginRequiredMixin, View):
@@ -20,8 +35,154 @@ class AuthTokenView(LoginRequiredMixin, View):
         :param request: The HTTP request object.
         :return: JsonResponse containing the token.
         """
+        if not is_enabled():
+            return self.get_token(request)
+        with TOKEN_REQUESTS.time('sync'), counting_queries() as queries:
+            response = self.get_token(request)
+        TOKEN_DB_QUERIES.observe(queries.count, 'sync')
+        return response
+
+    @staticmethod
+    def get_token(request):
+        """
+        Returns the token response, timing every stage.
+
+        :param request: The HTTP request object.
+        :return: JsonResponse containing the token.
+        """
+        with TOKEN_STAGES.time('get_client'):
+            client = DriverFactory.get_client(request)
+        with TOKEN_STAGES.time('get_search_rules'):
+            search_rules = client.get_search_rules()
+        with TOKEN_STAGES.time('get_user_token'):
+            token = client.get_user_token(search_rules)
+        with TOKEN_STAGES.time('render'):
+            return JsonResponse(token)
+
+
+class AsyncAuthTokenView(View):
+    """
+    Async variant of AuthTokenView for ASGI deployments.
+
+    Database lookups use the async ORM and search engine calls an async HTTP client, so a
+    single worker serves many concurrent token requests without a thread per request.
+    """
+    async def get(self, request):
+        """
+        Handle GET requests to generate a user token with search rules.
+
+        :param request: The HTTP request object.
+        :return: JsonResponse containing the token.
+        """
+        if hasattr(request, 'auser'):
+            request.user = await request.auser()
+        if not request.user.is_authenticated:
+            return redirect_to_login(request.get_full_path())
+        with TOKEN_REQUESTS.time('async'), counting_queries() as queries:
+            with TOKEN_STAGES.time('get_client'):
+                client = DriverFactory.get_client(request)
+            with TOKEN_STAGES.time('get_search_rules'):
+                search_rules = client.get_search_rules()
+            with TOKEN_STAGES.time('get_user_token'):
+                token = await client.aget_user_token(search_rules)
+            with TOKEN_STAGES.time('render'):
+                response = JsonResponse(token)
+        TOKEN_DB_QUERIES.observe(queries.count, 'async')
+        return response
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class SearchView(View):
+    """
+    Search endpoint of drivers whose engine is not queried directly by browsers.
+
+    It answers the Meilisearch search route, so the url returned with the token can be used
+    as the host of a Meilisearch client. The bearer token replaces the session.
+    """
+    LIST_PARAMETERS = ('attributesToRetrieve', 'sort')
+
+    def get(self, request, index_uid):
+        """
+        Handle GET searches, parameters being sent in the query string.
+
+        :param request: The HTTP request object.
+        :param index_uid: Name of the searched index.
+        :return: JsonResponse containing the search results.
+        """
+        params = request.GET.dict()
+        for name in self.LIST_PARAMETERS:
+            if params.get(name):
+                params[name] = params[name].split(',')
+        return self.search(request, index_uid, params)
+
+    def post(self, request, index_uid):
+        """
+        Handle POST searches, parameters being sent as a JSON object.
+
+        :param request: The HTTP request object.
+        :param index_uid: Name of the searched index.
+        :return: JsonResponse containing the search results.
+        """
+        try:
+            params = json.loads(request.body or b'{}')
+        except ValueError:
+            params = None
+        if not isinstance(params, dict):
+            return self.error(
+                SearchError('The search parameters must be a JSON object.', 'bad_request')
+            )
+        return self.search(request, index_uid, params)
+
+    @staticmethod
+    def error(err):
+        """
+        Returns response of a search error in the Meilisearch format
+        :param err:
+        :return:
+        """
+        return JsonResponse(
+            {'message': err.message, 'code': err.code, 'type': 'invalid_request', 'link': ''},
+            status=err.status_code
+        )
+
+    def search(self, request, index_uid, params):
+        """
+        Search with the driver on behalf of the bearer of the token.
+        """
+        authorization = request.headers.get('Authorization', '')
+        token = authorization[7:].strip() if authorization.startswith('Bearer ') else ''
         client = DriverFactory.get_client(request)
-        search_rules = client.get_search_rules()
-        token = client.get_user_token(search_rules)
+        try:
+            return JsonResponse(client.search(token, index_uid, params))
+        except NotImplementedError:
+            return self.error(SearchError(
+                'Searches are not served by the configured search engine.', 'not_found', 404
+            ))
+        except SearchError as err:
+            return self.error(err)
+
+
+class MetricsView(View):
+    """
+    Metrics of the process in the Prometheus text exposition format.
 
-        return JsonResponse(token)
+    Scrapers must send SEARCH_METRICS_TOKEN as a bearer token, the view is not served while
+    the token is not set.
+    """
+    def get(self, request):
+        """
+        Handle GET requests of the metrics scraper.
+
+        :param request: The HTTP request object.
+        :return: HttpResponse containing the metrics.
+        """
+        token = getattr(settings, 'SEARCH_METRICS_TOKEN', None)
+        if not is_enabled() or not token:
+            return HttpResponse(status=404)
+        if not hmac.compare_digest(
+                request.headers.get('Authorization', '').encode(), f'Bearer {token}'.encode()
+        ):
+            return HttpResponse(status=401)
+        return HttpResponse(
+            registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8'
+        )
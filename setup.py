@@ -35,6 +35,9 @@ setup(
         'openedx_search_api.migrations',
     ],
     install_requires=load_requirements('requirements/base.txt'),
+    extras_require={
+        'orjson': ['orjson'],
+    },
     url='https://github.com/qasimgulzar/django-search',
     license='',
     author='qasimgulzar',